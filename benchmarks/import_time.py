@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark how long certbot's plugin discovery spends importing this plugin.
+
+Certbot imports the entry point of every installed plugin on every run, so
+this imports the ``certbot.plugins`` entry point declared in setup.py in
+fresh interpreters, after certbot itself (which certbot has always loaded by
+then), and reports the import time and the modules the import pulls in as
+JSON, e.g.::
+
+    python benchmarks/import_time.py --repeat 20 --output import.json
+"""
+import argparse
+import json
+import os
+import platform
+import re
+import statistics
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+SRC = os.path.join(HERE, '..', 'src')
+
+# Run in a fresh interpreter for each sample: a module is only imported once.
+PROBE = '''
+import json, sys, time
+import certbot.plugins.dns_common
+before = set(sys.modules)
+start = time.perf_counter()
+module = __import__({module!r}, fromlist=['_'])
+getattr(module, {attr!r})
+seconds = time.perf_counter() - start
+print(json.dumps({{'seconds': seconds, 'modules': sorted(set(sys.modules) - before)}}))
+'''
+
+
+def entry_point():
+    """Return the ``(module, attribute)`` of the certbot plugin entry point in setup.py."""
+    with open(os.path.join(HERE, '..', 'setup.py')) as f:
+        match = re.search(r"'certbot\.plugins':\s*\[\s*'[^=']+=\s*([\w.]+):(\w+)'", f.read())
+    if match is None:
+        raise RuntimeError('No certbot.plugins entry point in setup.py')
+    return match.group(1), match.group(2)
+
+
+def sample(module, attr):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join([SRC] + [p for p in [env.get('PYTHONPATH')] if p])
+    output = subprocess.run([sys.executable, '-c', PROBE.format(module=module, attr=attr)],
+                            env=env, check=True, stdout=subprocess.PIPE,
+                            universal_newlines=True).stdout
+    return json.loads(output)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--repeat', type=int, default=10,
+                        help='number of fresh interpreters to time (default: %(default)s)')
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    module, attr = entry_point()
+    # The first run also writes the bytecode caches; don't count it.
+    samples = [sample(module, attr) for _ in range(args.repeat + 1)][1:]
+    seconds = [s['seconds'] for s in samples]
+
+    report = {
+        'benchmark': 'import_time',
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'entry_point': '{0}:{1}'.format(module, attr),
+        'parameters': {'repeat': args.repeat},
+        'results': {
+            'median_seconds': round(statistics.median(seconds), 6),
+            'min_seconds': round(min(seconds), 6),
+            'max_seconds': round(max(seconds), 6),
+            'modules_imported': samples[-1]['modules'],
+        },
+    }
+    text = json.dumps(report, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
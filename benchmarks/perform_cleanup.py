@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Benchmark the Joker authenticator's perform and cleanup path.
+
+Runs `Authenticator.perform` followed by `Authenticator.cleanup` for
+increasing numbers of challenges against a local fake Joker endpoint and
+reports wall-clock time, API requests, HTTP connections and peak Python
+memory for each size as JSON, e.g.::
+
+    python benchmarks/perform_cleanup.py --latency 0.05 --output bench.json
+
+``--transport http2`` runs the same sizes over one multiplexed HTTP/2
+connection to a cleartext HTTP/2 fake (needs the ``http2`` extra).
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+import types
+from unittest import mock
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+# pylint: disable=wrong-import-position
+from certbot import errors
+
+import certbot_dns_joker
+from certbot_dns_joker import dns_joker
+from certbot_dns_joker import fake
+from certbot_dns_joker import registry
+from certbot_dns_joker import simulate
+from certbot_dns_joker import transport
+from certbot_dns_joker.fake import FakeJokerH2Server
+from certbot_dns_joker.fake import FakeJokerServer
+
+ZONE = 'example.com'
+
+
+def _authenticator(credentials, server, args):
+    config = types.SimpleNamespace(**dict(
+        simulate.plugin_defaults(),
+        dns_joker_credentials=credentials,
+        dns_joker_propagation_seconds=0,
+        dns_joker_pool_size=args.pool_size,
+        dns_joker_concurrency=args.concurrency,
+        dns_joker_retries=args.retries,
+        dns_joker_retry_backoff=0.05,
+        dns_joker_zone_cache_ttl=0,
+        dns_joker_rate_limit=args.client_rate_limit,
+        dns_joker_rate_burst=args.client_rate_burst,
+        dns_joker_endpoint=server.endpoint,
+        dns_joker_preflight_cache_seconds=0,
+        work_dir=os.path.dirname(credentials)))
+    auth = dns_joker.Authenticator(config, 'dns-joker')
+    if args.transport == 'memory':
+        auth.transport_factory = lambda endpoint, pool_size: transport.MemoryTransport(
+            server.joker)
+    elif args.transport == 'http2':
+        auth.transport_factory = lambda endpoint, pool_size: transport.HTTP2Transport(
+            endpoint, pool_size, prior_knowledge=True)
+    return auth
+
+
+def _challenges(size):
+    # _Challenge | pylint: disable=protected-access
+    return [fake._Challenge('host{0}.{1}'.format(i, ZONE), 'token{0}'.format(i))
+            for i in range(size)]
+
+
+def peak_memory(size, server, credentials, args):
+    """
+    Return the peak Python memory allocated by perform+cleanup of `size`
+    challenges.  This is a separate pass because tracing allocations slows
+    everything down.
+    """
+    challenges = _challenges(size)
+    registry.REGISTRY.close()
+    auth = _authenticator(credentials, server, args)
+    tracemalloc.start()
+    try:
+        auth.perform(challenges)
+        auth.cleanup(challenges)
+    except errors.PluginError:
+        pass
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak
+
+
+def run(size, server, credentials, args):
+    """Time perform+cleanup of `size` challenges and return the measurements."""
+    challenges = _challenges(size)
+    # Start every size with cold connections, as a separate certbot run would.
+    registry.REGISTRY.close()
+    auth = _authenticator(credentials, server, args)
+    server.reset_counters()
+
+    error = None
+    start = time.perf_counter()
+    try:
+        auth.perform(challenges)
+    except errors.PluginError as e:
+        error = str(e)
+    performed = time.perf_counter()
+    clients = list(auth._clients.values())  # pylint: disable=protected-access
+    stats = [client.connection_stats() for client in clients]
+    try:
+        auth.cleanup(challenges)
+    except errors.PluginError as e:
+        error = error or str(e)
+    end = time.perf_counter()
+
+    return {
+        'challenges': size,
+        'perform_seconds': round(performed - start, 6),
+        'cleanup_seconds': round(end - performed, 6),
+        'total_seconds': round(end - start, 6),
+        'challenges_per_second': round(size / (end - start), 3),
+        'api_requests': server.joker.requests,
+        'peak_server_concurrency': server.joker.peak_concurrency,
+        'api_errors': server.joker.errors,
+        'rate_limited': server.joker.rate_limited,
+        'server_connections': server.connections,
+        'client_connections_opened_during_perform': sum(opened for opened, _ in stats),
+        'client_connections_reused_during_perform': sum(reused for _, reused in stats),
+        'error': error,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--sizes', default='1,10,100,1000',
+                        help='comma-separated numbers of challenges (default: %(default)s)')
+    parser.add_argument('--latency', type=float, default=0.01,
+                        help='seconds the fake endpoint waits per request (default: %(default)s)')
+    parser.add_argument('--jitter', type=float, default=0.0,
+                        help='random extra seconds per request (default: %(default)s)')
+    parser.add_argument('--error-rate', type=float, default=0.0,
+                        help='fraction of requests failing with dnserr (default: %(default)s)')
+    parser.add_argument('--rate-limit', type=float, default=0.0,
+                        help='requests per second before the endpoint answers 503 '
+                             '(default: no limit)')
+    parser.add_argument('--client-rate-limit', type=float, default=0,
+                        help="the plugin's own requests per second limit (default: no limit)")
+    parser.add_argument('--client-rate-burst', type=int, default=5)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--pool-size', type=int, default=10)
+    parser.add_argument('--retries', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--transport', choices=['http', 'http2', 'memory'], default='http',
+                        help='reach the fake endpoint over local HTTP/1.1 or HTTP/2, or call '
+                             'it in-process (default: %(default)s)')
+    parser.add_argument('--no-memory', action='store_true',
+                        help="skip the pass that measures peak memory")
+    parser.add_argument('--output', help='write the JSON results here instead of stdout')
+    args = parser.parse_args(argv)
+
+    server_class = FakeJokerH2Server if args.transport == 'http2' else FakeJokerServer
+    server = server_class(latency=args.latency, jitter=args.jitter,
+                          error_rate=args.error_rate, rate_limit=args.rate_limit,
+                          seed=args.seed).start()
+    results = []
+    with tempfile.TemporaryDirectory() as tempdir:
+        credentials = os.path.join(tempdir, 'credentials.ini')
+        with open(os.open(credentials, os.O_WRONLY | os.O_CREAT, 0o600), 'w') as f:
+            f.write('dns_joker_username = user\ndns_joker_password = pass\n'
+                    'dns_joker_domain = {0}\n'.format(ZONE))
+        # perform() announces the (zero second) propagation wait.
+        with mock.patch.object(dns_joker.display_util, 'notify'):
+            for size in [int(s) for s in args.sizes.split(',')]:
+                result = run(size, server, credentials, args)
+                if not args.no_memory:
+                    result['peak_memory_bytes'] = peak_memory(size, server, credentials, args)
+                results.append(result)
+    server.stop()
+
+    report = {
+        'benchmark': 'perform_cleanup',
+        'version': certbot_dns_joker.__version__,
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'parameters': {k: v for k, v in vars(args).items() if k != 'output'},
+        'results': results,
+    }
+    text = json.dumps(report, indent=2) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
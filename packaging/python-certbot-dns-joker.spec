@@ -28,6 +28,7 @@ BuildArch:      noarch
 BuildRequires:  python3-acme >= 2.1.0
 BuildRequires:  python3-certbot >= 2.1.0
 BuildRequires:  python3-devel
+BuildRequires:  python3-dns >= 2.0
 BuildRequires:  python3-requests
 BuildRequires:  python3-setuptools >= 53.0.0
 
@@ -88,6 +89,8 @@ pwd && ls -l
 %license LICENSE.txt
 %doc README.md
 %doc CHANGELOG.md
+%{_bindir}/certbot-dns-joker-cleanup-orphans
+%{_bindir}/certbot-dns-joker-simulate
 %{python3_sitelib}/certbot_dns_joker
 %{python3_sitelib}/certbot_dns_joker-%{version}-py%{python3_version}.egg-info
 
@@ -82,6 +82,7 @@ CLASSIFIERS = [
 INSTALL_REQUIRES = [
     f'acme>={VERSION},<3',
     f'certbot>={VERSION},<3',
+    'dnspython>=2.0',
     'requests',
     'setuptools',
     'zope.interface',
@@ -99,6 +100,14 @@ elif 'bdist_wheel' in sys.argv[1:]:
 elif sys.version_info < (3,3):
     TESTS_REQUIRE.append('mock')
 
+ASYNC_EXTRAS = [
+    'aiohttp>=3.7',
+]
+
+HTTP2_EXTRAS = [
+    'httpx[http2]>=0.23',
+]
+
 DOCS_EXTRAS = [
     'Sphinx>=1.0',  # autodoc_member_order = 'bysource', autodoc_default_flags
     'sphinx_rtd_theme',
@@ -124,12 +133,18 @@ setup(
     include_package_data=True,
     install_requires=INSTALL_REQUIRES,
     extras_require={
+        'async': ASYNC_EXTRAS,
         'docs': DOCS_EXTRAS,
+        'http2': HTTP2_EXTRAS,
     },
     entry_points={
         'certbot.plugins': [
             'dns-joker = certbot_dns_joker.dns_joker:Authenticator',
         ],
+        'console_scripts': [
+            'certbot-dns-joker-cleanup-orphans = certbot_dns_joker.orphans:main',
+            'certbot-dns-joker-simulate = certbot_dns_joker.simulate:main',
+        ],
     },
     tests_require=TESTS_REQUIRE,
     test_suite='certbot_dns_joker',
@@ -14,6 +14,23 @@ Named Arguments
                                           to propagate before asking the ACME
                                           server to verify the DNS record.
                                           (Default: 120)
+``--dns-joker-propagation-check``         Poll DNS and continue as soon as the
+                                          TXT records are visible, waiting at
+                                          most the propagation seconds.
+``--dns-joker-propagation-interval``      Seconds between DNS polls.
+                                          (Default: 5)
+``--dns-joker-adaptive-propagation``      Wait for each zone as long as it has
+                                          usually taken, as learned by polling
+                                          DNS, at most the propagation seconds.
+``--dns-joker-propagation-percentile``    Percentile of the observed times to
+                                          wait for. (Default: 95)
+``--dns-joker-nameservers``               Nameservers to poll instead of the
+                                          zone's authoritative nameservers.
+``--dns-joker-resolvers``                 Resolvers to poll in addition to the
+                                          nameservers.
+``--dns-joker-propagation-policy``        ``all`` to wait until every server
+                                          serves the records, ``quorum`` for
+                                          most of them. (Default: all)
 ========================================  =====================================
 
 
@@ -34,6 +51,21 @@ https://configobj.readthedocs.io/en/latest/configobj.html
    username = USERNAME
    password = PASSWORD
 
+Credentials for several zones can be given in sections named after each zone.
+A name uses the credentials of the longest zone that contains it.
+
+.. code-block:: ini
+   :name: zones.ini
+   :caption: Example credentials file for several zones:
+
+   [example.com]
+   username = USERNAME1
+   password = PASSWORD1
+
+   [example.org]
+   username = USERNAME2
+   password = PASSWORD2
+
 The path to this file can be provided interactively or using the
 ``--dns-joker-credentials`` command-line argument. Certbot records the path
 to this file for use during renewal, but does not store the file's contents.
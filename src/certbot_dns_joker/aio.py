@@ -0,0 +1,137 @@
+"""An asyncio client for the Joker DynDNS API."""
+import asyncio
+import logging
+
+import aiohttp
+
+from certbot import errors
+
+from certbot_dns_joker import api
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncJokerClient(api.JokerClientBase):
+    """
+    Sets TXT records through the Joker DynDNS API without blocking the event
+    loop.
+
+    It has the same `add_txt_record`/`del_txt_record` semantics, retry
+    policy and errors as the synchronous client certbot uses, but the methods
+    are coroutines.  At most `concurrency` requests are in flight at once,
+    over a single keep-alive connection pool, so thousands of record changes
+    can be scheduled from one event loop.
+
+    Like the synchronous client it takes an optional `limiter`
+    (`ratelimit.RateLimiter`), `state` (`state.RecordState`) and `journal`
+    (`journal.Journal`); their file operations run on the loop's default
+    executor, and rate-limit waits are `asyncio.sleep` calls.
+
+    Use it as an async context manager, or call `close` when done.  This
+    requires the ``async`` extra (aiohttp).
+    """
+
+    def __init__(self, username, password, domain, ttl, endpoint=api.JOKER_ENDPOINT,
+                 concurrency=10, retry=None, hook=None, limiter=None, state=None, journal=None):
+        super(AsyncJokerClient, self).__init__(username, password, domain, ttl, endpoint, retry,
+                                               hook)
+        self.concurrency = concurrency
+        self.limiter = limiter
+        self.state = state
+        self.journal = journal
+        # Made in the running loop: before Python 3.10 an asyncio primitive
+        # binds to the loop current when it is created.
+        self._semaphore = None
+        self._session = None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+    async def add_txt_record(self, cert_domain, record_name, record_content):
+        label, data = self._request_data(record_name, record_content)
+        # Journal a value before writing it, as the synchronous client does.
+        if self.journal is not None and record_content:
+            await _blocking(self.journal.publish, self, label, record_content)
+        await self._set(label, data, record_content)
+        if self.journal is not None and not record_content:
+            await _blocking(self.journal.remove, self, label)
+
+    async def del_txt_record(self, domain, record_name, record_content):
+        await self.add_txt_record(domain, record_name, '')
+
+    async def _set(self, label, data, record_content):
+        if self.state is None:
+            await self._post(label, data)
+            return
+
+        key = (self.endpoint, self.username, self.domain)
+        if await _blocking(self.state.get, key, label) == record_content:
+            logger.debug('%s TXT record for %s is already %r; not updating',
+                         label, self.domain, record_content)
+            return
+        try:
+            await self._post(label, data)
+        except errors.PluginError:
+            await _blocking(self.state.forget, key, label)
+            raise
+        await _blocking(self.state.set, key, label, record_content)
+
+    async def _post(self, label, data):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+        async with self._semaphore:
+            await self._post_unlimited(label, data)
+
+    async def _post_unlimited(self, label, data):
+        if self._session is None:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.concurrency),
+                timeout=aiohttp.ClientTimeout(total=self.retry.timeout))
+        start = self.retry.clock()
+        size = api.form_size(data)
+        attempt = 0
+        while True:
+            attempt += 1
+            await self._acquire()
+            sent = self.retry.clock()
+            try:
+                async with self._session.post(self.endpoint, data=data) as r:
+                    text = await r.text()
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                status, error, transient, text = None, str(e) or type(e).__name__, True, ''
+            else:
+                status = r.status
+                if status < 300:
+                    self._record_attempt(label, attempt, sent, status, size=(size, len(text)))
+                    return
+                error, transient = self._failure(status, text)
+            self._record_attempt(label, attempt, sent, status, error, size=(size, len(text)))
+
+            delay = self._retry_delay(attempt, start, transient)
+            if delay is None:
+                self._handle_http_error(error, label, self.domain)
+            await asyncio.sleep(delay)
+
+    async def _acquire(self):
+        if self.limiter is None:
+            return
+        buckets = [('account', self.username), ('zone', self.domain)]
+        while True:
+            wait = await _blocking(self.limiter.try_acquire, buckets)
+            if wait <= 0:
+                return
+            logger.debug('Rate limit reached for %s; waiting %.3fs', buckets, wait)
+            await asyncio.sleep(wait)
+
+
+async def _blocking(func, *args):
+    """Run `func`, which does file I/O, without blocking the event loop."""
+    return await asyncio.get_running_loop().run_in_executor(None, func, *args)
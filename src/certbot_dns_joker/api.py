@@ -0,0 +1,154 @@
+"""
+The parts of the Joker DynDNS API that every client shares: building
+/nic/replace requests, interpreting their results and retrying.
+"""
+import logging
+import random
+import time
+import urllib.parse
+
+from certbot import errors
+
+from certbot_dns_joker import metrics
+
+logger = logging.getLogger(__name__)
+
+JOKER_ENDPOINT = 'https://svc.joker.com/nic/replace'
+
+
+def form_size(data):
+    """Return the size in bytes of `data` sent as a form."""
+    return len(urllib.parse.urlencode(data))
+
+
+class RetryPolicy(object):
+    """
+    Controls how the Joker clients retry API calls that fail transiently.
+
+    :param int attempts: Maximum number of attempts per call.
+    :param float backoff: Delay before the first retry, doubled for each
+        further retry up to `max_backoff`.
+    :param float jitter: Up to this fraction of the delay is added at random
+        so that parallel clients don't retry in lockstep.
+    :param float timeout: Per-request timeout passed to `requests`.
+    :param float deadline: No retry is started if it would begin more than
+        this many seconds after the first attempt.
+    """
+
+    def __init__(self, attempts=1, backoff=1.0, max_backoff=30.0, jitter=0.5,
+                 timeout=None, deadline=None, clock=time.monotonic, sleep=time.sleep):
+        self.attempts = max(attempts, 1)
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.jitter = jitter
+        self.timeout = timeout
+        self.deadline = deadline
+        self.clock = clock
+        self.sleep = sleep
+
+    def delay(self, attempt):
+        """Return the number of seconds to wait after failed attempt number `attempt`."""
+        delay = min(self.max_backoff, self.backoff * 2 ** (attempt - 1))
+        return delay + random.uniform(0, delay * self.jitter)
+
+
+class JokerClientBase(object):
+    """
+    What the synchronous and asynchronous Joker clients have in common:
+    building /nic/replace requests and interpreting their results.
+    """
+
+    # These are the error codes documented at https://help.dyn.com/remote-access-api/return-codes/
+    error = {
+       'badauth'  : 'Bad authorization (username or password)',
+       'badsys'   : 'The system parameter given was not valid',
+
+       'notfqdn'  : 'A Fully-Qualified Domain Name was not provided',
+       'nohost'   : 'The hostname specified does not exist in the database',
+       '!yours'   : 'The hostname specified exists, but not under the username currently being used',
+       '!donator' : 'The offline setting was set, when the user is not a donator',
+       '!active'  : 'The hostname specified is in a Custom DNS domain which has not yet been activated.',
+       'abuse'    : 'The hostname specified is blocked for abuse; you should receive an email notification '
+                     'which provides an unblock request link.  More info can be found on '
+                     'https://www.dyndns.com/support/abuse.html',
+
+       'numhost'  : 'System error: Too many or too few hosts found. Contact support@dyndns.org',
+       'dnserr'   : 'System error: DNS error encountered. Contact support@dyndns.org',
+
+       'nochg'    : 'No update required; unnecessary attempts to change to the current address are considered abusive',
+    }
+
+    # Error codes that indicate a problem on Joker's side that may go away
+    # if we try again.  Everything else (badauth, nohost, !yours, ...) needs
+    # the operator to fix something, so retrying would only waste time.
+    retryable = frozenset(['dnserr'])
+
+    def __init__(self, username, password, domain, ttl, endpoint=JOKER_ENDPOINT, retry=None,
+                 hook=None):
+        self.endpoint = endpoint
+        self.username = username
+        self.password = password
+        self.domain = domain
+        self.ttl = ttl
+        self.retry = retry or RetryPolicy()
+        self.hook = hook or metrics.Hook()
+
+    def label(self, record_name):
+        """Return the label of `record_name` within this client's zone."""
+        # Joker adds the domain to the end of the label of the TXT record that
+        # it creates, but the record_name that certbot passed us already has
+        # it so we need to remove it before calling the Joker API.
+        dotdomain = '.' + self.domain
+        if record_name.endswith(dotdomain):
+            record_name = record_name[0:-len(dotdomain)]
+        return record_name
+
+    def _request_data(self, record_name, record_content):
+        """Return the ``(label, form data)`` for setting `record_name` to `record_content`."""
+        # Documentation for the Joker TXT record API is here:
+        # https://joker.com/faq/content/6/496/en/let_s-encrypt-support.html
+        record_name = self.label(record_name)
+        return record_name, {
+            'username': self.username,
+            'password': self.password,
+            'zone': self.domain,
+            'label': record_name,
+            'type': 'TXT',
+            'value': record_content,
+            'ttl': self.ttl,
+        }
+
+    def _failure(self, status_code, text):
+        """Return ``(error, transient)`` for an unsuccessful response."""
+        error = text.strip()
+        return error, status_code >= 500 or error in self.retryable
+
+    def _retry_delay(self, attempt, start, transient):
+        """Return the delay before the next attempt, or None if we should give up."""
+        retry = self.retry
+        delay = retry.delay(attempt)
+        if (not transient or attempt >= retry.attempts or
+                (retry.deadline is not None and retry.clock() + delay - start > retry.deadline)):
+            return None
+        return delay
+
+    def _record_attempt(self, label, attempt, sent, status, error=None, size=(0, 0)):
+        elapsed = self.retry.clock() - sent
+        if error is None:
+            result = 'good'
+        else:
+            result = error if status is not None else 'connection-error'
+        self.hook.api_call(self.domain, label, attempt, elapsed, status, result,
+                           sent=size[0], received=size[1])
+        if error is None:
+            logger.debug('Set %s TXT record for %s (attempt %d, %.3fs)',
+                         label, self.domain, attempt, elapsed)
+        else:
+            logger.debug('Setting %s TXT record for %s failed (attempt %d, %.3fs): %s',
+                         label, self.domain, attempt, elapsed, error)
+
+    def _handle_http_error(self, error, record_name, domain_name):
+        hint = self.error.get(error)
+        raise errors.PluginError('Error setting {0} TXT record for {1}: {2}.{3}'
+                                 .format(record_name, domain_name, error,
+                                         ' ({0})'.format(hint) if hint else ''))
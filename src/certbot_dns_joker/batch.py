@@ -0,0 +1,174 @@
+"""Drive the challenges for many certificates through one Authenticator."""
+import logging
+import queue
+import threading
+import time
+
+from certbot import errors
+
+from certbot_dns_joker.dns_joker import achall_domain
+from certbot_dns_joker.dns_joker import several_values
+
+logger = logging.getLogger(__name__)
+
+
+class BatchRunner(object):
+    """
+    Publishes, validates and cleans up the dns-01 challenges of many
+    certificates in batches, using a single `Authenticator`.
+
+    Each certificate's challenges are queued with `submit`.  `run_batch`
+    takes everything queued, publishes all of the TXT records in one
+    `Authenticator.perform` call (so there is only one propagation wait),
+    passes the responses to `respond`, and removes all of the records in one
+    `Authenticator.cleanup` call.  `serve_forever` does that in a loop.
+
+    Joker holds one TXT value per name, so two certificates that need the
+    same validation name are never put in the same batch; the later one
+    waits for the next batch.  A certificate that needs several values for
+    one name by itself, such as one for both example.com and
+    *.example.com, is refused by `submit`.
+
+    If publishing a batch fails, the records that were written are removed
+    and the batch is retried in halves, down to single certificates, so
+    that one bad certificate (say, for a zone whose credentials are wrong)
+    fails on its own.  The runner then carries on with the next batch.
+
+    There is no command that runs this as a daemon: `respond` has to answer
+    ACME challenges for orders the caller owns, which certbot's command
+    line doesn't offer.  Run `serve_forever` on a thread of the program
+    that places the orders.
+
+    :param authenticator: A prepared `certbot_dns_joker.dns_joker.Authenticator`.
+    :param respond: Called as ``respond(achalls, responses)`` for each
+        certificate once its records are published; this is where the
+        caller answers the ACME challenges.  An exception fails only that
+        certificate.
+    :param int max_batch: Maximum number of certificates per batch.
+    """
+
+    def __init__(self, authenticator, respond, max_batch=None, clock=time.monotonic):
+        self.authenticator = authenticator
+        self.respond = respond
+        self.max_batch = max_batch
+        self._clock = clock
+        self._queue = queue.Queue()
+        self._held = []
+        self._stop = threading.Event()
+        self._started = None
+        self.certificates = 0
+        self.failures = 0
+
+    def submit(self, achalls):
+        """
+        Queue the challenges for one certificate.
+
+        :raises errors.PluginError: if the certificate needs several TXT
+            values for one name.
+        """
+        achalls = list(achalls)
+        crowded = several_values(achalls)
+        if crowded:
+            raise errors.PluginError(
+                'The Joker DynDNS API keeps only one TXT value per name, but the certificate '
+                'for {0} needs several for {1}.  Request these names in separate '
+                'certificates.'.format(', '.join(_domains(achalls)), ', '.join(crowded)))
+        self._queue.put(achalls)
+
+    def stop(self):
+        """Make `serve_forever` return after the current batch."""
+        self._stop.set()
+
+    @property
+    def certificates_per_minute(self):
+        """Certificates completed per minute since the first batch started."""
+        if self._started is None:
+            return 0.0
+        elapsed = self._clock() - self._started
+        return self.certificates * 60.0 / elapsed if elapsed > 0 else 0.0
+
+    def serve_forever(self, poll_interval=1.0):
+        """Run batches as certificates are submitted until `stop` is called."""
+        while not self._stop.is_set():
+            if not self._held:
+                try:
+                    self._held.append(self._queue.get(timeout=poll_interval))
+                except queue.Empty:
+                    continue
+            self.run_batch()
+
+    def run_batch(self):
+        """
+        Run one batch of the queued certificates.
+
+        :returns: The number of certificates in the batch.
+        """
+        batch = self._take_batch()
+        if not batch:
+            return 0
+        if self._started is None:
+            self._started = self._clock()
+
+        start = self._clock()
+        self._run(batch)
+        logger.info('Batch of %d certificates took %.1fs (%.1f certificates per minute overall)',
+                    len(batch), self._clock() - start, self.certificates_per_minute)
+        return len(batch)
+
+    def _run(self, batch):
+        achalls = [achall for cert in batch for achall in cert]
+        published = False
+        try:
+            responses = self.authenticator.perform(achalls)
+        except Exception:  # pylint: disable=broad-except
+            if len(batch) > 1:
+                logger.warning('Publishing the records for a batch of %d certificates failed; '
+                               'retrying them in smaller batches', len(batch), exc_info=True)
+            else:
+                logger.exception('Validation failed for %s: its records could not be '
+                                 'published', _domains(batch[0]))
+                self.failures += 1
+        else:
+            published = True
+            offset = 0
+            for cert in batch:
+                try:
+                    self.respond(cert, responses[offset:offset + len(cert)])
+                except Exception:  # pylint: disable=broad-except
+                    logger.exception('Validation failed for %s', _domains(cert))
+                    self.failures += 1
+                else:
+                    self.certificates += 1
+                offset += len(cert)
+        try:
+            # Removes only the records that perform wrote.
+            self.authenticator.cleanup(achalls)
+        except Exception:  # pylint: disable=broad-except
+            logger.exception('Removing the records for a batch of %d certificates failed',
+                             len(batch))
+        if not published and len(batch) > 1:
+            half = len(batch) // 2
+            self._run(batch[:half])
+            self._run(batch[half:])
+
+    def _take_batch(self):
+        pending = self._held
+        while True:
+            try:
+                pending.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+
+        batch, self._held, names = [], [], set()
+        for cert in pending:
+            cert_names = {a.validation_domain_name(achall_domain(a)) for a in cert}
+            if (self.max_batch and len(batch) >= self.max_batch) or cert_names & names:
+                self._held.append(cert)
+            else:
+                batch.append(cert)
+                names |= cert_names
+        return batch
+
+
+def _domains(cert):
+    return sorted({achall_domain(a) for a in cert})
@@ -0,0 +1,65 @@
+"""Credentials files that list several Joker zones."""
+from certbot import errors
+
+
+class ZoneCredentials(object):
+    """
+    Maps Joker zones to the DynDNS credentials for each of them.
+
+    Lookups find the longest configured zone that is a suffix of the name,
+    walking the name's labels, so their cost depends on the length of the
+    name and not on the number of zones.
+    """
+
+    def __init__(self):
+        self._zones = {}
+
+    def __len__(self):
+        return len(self._zones)
+
+    def zones(self):
+        """Return the configured zones."""
+        return sorted(self._zones)
+
+    def add(self, zone, username, password):
+        self._zones[zone.rstrip('.').lower()] = (username, password)
+
+    def lookup(self, name):
+        """
+        Return ``(zone, username, password)`` for the longest configured zone
+        containing `name`, or None if no zone contains it.
+        """
+        labels = name.rstrip('.').lower().split('.')
+        for i in range(len(labels)):
+            zone = '.'.join(labels[i:])
+            found = self._zones.get(zone)
+            if found:
+                return (zone,) + found
+        return None
+
+    @classmethod
+    def from_credentials(cls, credentials):
+        """
+        Build the map from the sections of a
+        `certbot.plugins.dns_common.CredentialsConfiguration`.  Each section
+        is named after a zone and holds the same ``username`` and
+        ``password`` keys as a single-zone file.
+
+        :raises errors.PluginError: If a section is missing a key.
+        """
+        index = cls()
+        confobj = credentials.confobj
+        messages = []
+        for zone in confobj.sections:
+            section = confobj[zone]
+            values = [section.get(credentials.mapper(var)) for var in ('username', 'password')]
+            for var, value in zip(('username', 'password'), values):
+                if not value:
+                    messages.append('Property "{0}" not set in section [{1}].'
+                                    .format(credentials.mapper(var), zone))
+            index.add(zone, *values)
+        if messages:
+            raise errors.PluginError('Missing {0} in credentials configuration file {1}:\n * {2}'
+                                     .format('property' if len(messages) == 1 else 'properties',
+                                             confobj.filename, '\n * '.join(messages)))
+        return index
@@ -0,0 +1,44 @@
+"""Deletes that cleanup couldn't finish in time, to be retried by the next run."""
+import time
+
+from certbot_dns_joker import storage
+
+
+class DeferredDeletes(object):
+    """
+    A queue of TXT records to blank, kept in a locked JSON file shared by
+    every certbot process on the host.
+
+    Each entry remembers the values the run wrote, so that a record that
+    has been written again since (by a later run for the same name) is not
+    blanked under that run's feet.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+
+    def add(self, client, label, values):
+        """Queue blanking `label` in `client`'s zone, which holds one of `values`."""
+        key = _key(client.endpoint, client.username, client.domain, label)
+        with storage.LockedJSON(self.path) as queue:
+            entry = queue.setdefault(key, {
+                'endpoint': client.endpoint, 'username': client.username,
+                'zone': client.domain, 'label': label, 'values': [], 'since': self._clock(),
+            })
+            entry['values'] = sorted(set(entry['values']) | set(values))
+
+    def entries(self):
+        """Return the queued entries, as dicts."""
+        with storage.LockedJSON(self.path) as queue:
+            return list(queue.values())
+
+    def done(self, entry):
+        """Remove `entry` from the queue."""
+        with storage.LockedJSON(self.path) as queue:
+            queue.pop(_key(entry['endpoint'], entry['username'], entry['zone'], entry['label']),
+                      None)
+
+
+def _key(endpoint, username, zone, label):
+    return ' '.join([endpoint, username, zone, label])
@@ -1,15 +1,31 @@
 """DNS Authenticator for DNS servers with the Joker extension to the DynDNS API."""
+import collections
+import concurrent.futures
 import logging
-
-import requests
+import math
+import threading
+import time
 
 from certbot import errors
 from certbot import interfaces
+from certbot.compat import os
+from certbot.display import util as display_util
 from certbot.plugins import dns_common
 
+from certbot_dns_joker import api
+from certbot_dns_joker import credentials
+from certbot_dns_joker import metrics
+from certbot_dns_joker.api import JOKER_ENDPOINT
+from certbot_dns_joker.api import RetryPolicy
+
+# Certbot imports every installed plugin on every run, even a `certbot renew`
+# with nothing to renew, so what is only needed once challenges are handled
+# (requests, dnspython, the state files...) is imported where it is used.
+
 logger = logging.getLogger(__name__)
 
-JOKER_ENDPOINT = 'https://svc.joker.com/nic/replace'
+# The label the pre-flight check blanks.  Nothing should ever be stored there.
+PREFLIGHT_LABEL = '_certbot-dns-joker-preflight'
 
 
 class Authenticator(dns_common.DNSAuthenticator):
@@ -20,113 +36,820 @@ class Authenticator(dns_common.DNSAuthenticator):
 
     description = 'Obtain certificates using a DNS TXT record (if you are using Joker for DNS).'
     ttl = 60
+    endpoint = JOKER_ENDPOINT
+    # Called as ``transport_factory(endpoint, pool_size)`` to build each
+    # client's transport, or None for HTTP.  Load tests replace it, e.g. to
+    # return a `transport.MemoryTransport`.
+    transport_factory = None
 
     def __init__(self, *args, **kwargs):
         super(Authenticator, self).__init__(*args, **kwargs)
         self.credentials = None
+        self.zone_credentials = None
+        self._written = {}
+        self._clients = {}
+        self._lock = threading.Lock()
+        self._zones = None
+        self._cnames = None
+        self._targets = {}
+        self._retry = None
+        self._limiter = None
+        self._record_state = None
+        self._history = None
+        if self.conf('endpoint'):
+            self.endpoint = self.conf('endpoint')
+        hooks = []
+        if self.conf('metrics-file'):
+            from certbot_dns_joker import registry
+            path = self.conf('metrics-file')
+            # One collector per file for the whole process, so that under
+            # `certbot renew` each lineage adds to the totals rather than
+            # overwriting the previous lineage's file.
+            hooks.append(registry.REGISTRY.metrics(
+                path, lambda: metrics.Metrics(_JokerClient.error, path=path)))
+        if self.conf('trace-file'):
+            from certbot_dns_joker import tracing
+            hooks.append(tracing.Tracer(self.conf('trace-file'),
+                                        sample_rate=self.conf('trace-sample-rate')))
+        self.hook = metrics.combine(hooks)
 
     @classmethod
     def add_parser_arguments(cls, add):  # pylint: disable=arguments-differ
         super(Authenticator, cls).add_parser_arguments(add, default_propagation_seconds=120)
         add('credentials', help='Joker credentials INI file.')
+        add('propagation-check', action='store_true', default=False,
+            help='Poll DNS until the TXT records are visible instead of always waiting '
+                 'for the full propagation delay, which becomes an upper bound.')
+        add('propagation-interval', type=int, default=5,
+            help='Seconds between DNS polls when --dns-joker-propagation-check is set.')
+        add('nameservers', default=None,
+            help='Comma-separated host[:port] list of nameservers to poll instead of the '
+                 'zone\'s authoritative nameservers.')
+        add('resolvers', default=None,
+            help='Comma-separated host[:port] list of resolvers to poll in addition to the '
+                 'nameservers.')
+        add('propagation-policy', choices=['all', 'quorum'], default='all',
+            help='When polling DNS, wait until every server serves the TXT records (all) '
+                 'or until more than half of them do (quorum).')
+        add('adaptive-propagation', action='store_true', default=False,
+            help='Wait for each zone as long as it has usually taken to serve new TXT '
+                 'records, learned by polling DNS, instead of the full propagation delay, '
+                 'which becomes an upper bound.')
+        add('propagation-percentile', type=float, default=95,
+            help='Percentile of the observed propagation times that '
+                 '--dns-joker-adaptive-propagation waits for.')
+        add('follow-cnames', action='store_true', default=False,
+            help='If a _acme-challenge name is a CNAME, write its TXT record where the CNAME '
+                 'points, e.g. into a single zone that all challenges are delegated to.  Only '
+                 'that zone\'s credentials are then needed.')
+        add('pool-size', type=int, default=10,
+            help='Maximum number of keep-alive connections to the Joker API.')
+        add('http2', action='store_true', default=False,
+            help='Send parallel updates as HTTP/2 streams over one connection where the '
+                 'endpoint supports it, falling back to HTTP/1.1.  Needs the http2 extra.')
+        add('concurrency', type=int, default=4,
+            help='Maximum number of TXT records to update in parallel.  Updates to the '
+                 'same record name are always made in order.')
+        add('retries', type=int, default=3,
+            help='Maximum number of attempts for each Joker API call.  Connection errors, '
+                 'timeouts, 5xx responses and "dnserr" are retried.')
+        add('retry-backoff', type=float, default=1.0,
+            help='Seconds to wait before the first retry; doubles on each further retry.')
+        add('retry-jitter', type=float, default=0.5,
+            help='Random extra fraction of the backoff added to each retry delay.')
+        add('timeout', type=float, default=30,
+            help='Seconds to wait for each Joker API response.')
+        add('deadline', type=float, default=120,
+            help='Seconds after which a Joker API call is no longer retried.')
+        add('cleanup-deadline', type=float, default=30,
+            help='Seconds after which cleanup stops waiting for TXT records to be removed; '
+                 'cleanup returns within about this long.  Removals that fail or are still '
+                 'running then are abandoned when certbot exits and retried at the start of '
+                 'the next run.')
+        add('zone-cache-ttl', type=int, default=86400,
+            help='Seconds to remember the zone found for a name when the credentials file '
+                 'does not set "domain", and where a CNAME leads with '
+                 '--dns-joker-follow-cnames.')
+        add('rate-limit', type=float, default=0,
+            help='Maximum Joker API requests per second per account, shared by every '
+                 'certbot process on this host.  0 means no limit.')
+        add('zone-rate-limit', type=float, default=0,
+            help='Maximum Joker API requests per second per zone, shared by every certbot '
+                 'process on this host.  0 means no limit.')
+        add('rate-burst', type=int, default=5,
+            help='Number of requests that may be made at once before the rate limits apply.')
+        add('state-max-age', type=int, default=0,
+            help='Remember what was last written to each TXT record for this many seconds '
+                 'and skip writes that would change nothing.  Only use it if nothing but '
+                 'this plugin changes the _acme-challenge records.  0 (the default) never '
+                 'skips writes.')
+        add('preflight', action='store_true', default=False,
+            help='Check the credentials for every zone in the credentials file before '
+                 'certbot requests any challenges, so that a wrong username, password or '
+                 'zone fails the run before it uses up ACME rate limits.  The DynDNS API has '
+                 'no read-only call, so the check blanks the unused label ' + PREFLIGHT_LABEL +
+                 ', which Joker counts as an unchanged update; results are cached with '
+                 '--dns-joker-preflight-cache-seconds to keep such calls rare.')
+        add('preflight-cache-seconds', type=int, default=3600,
+            help='Seconds to remember that credentials passed the pre-flight check.')
+        add('endpoint', default=None,
+            help='URL of the Joker DynDNS /nic/replace endpoint, e.g. a local fake Joker '
+                 'server for testing.  Default: ' + JOKER_ENDPOINT)
+        add('metrics-file', default=None,
+            help='Write API and propagation metrics to this file at the end of each cleanup, '
+                 'as a Prometheus textfile if it ends in .prom and as JSON otherwise.  The '
+                 'totals cover every certificate renewed by the certbot process.')
+        add('trace-file', default=None,
+            help='Append a JSON line for every Joker API call and propagation wait to this '
+                 'file, tagged with IDs that link the events of each challenge.')
+        add('trace-sample-rate', type=float, default=1.0,
+            help='Fraction of challenges to trace with --dns-joker-trace-file.')
 
     def more_info(self):  # pylint: disable=missing-function-docstring
         return 'This plugin configures a DNS TXT record to respond to a dns-01 challenge using ' + \
                'the Joker v2 API.'
 
+    def prepare(self):  # pylint: disable=missing-function-docstring
+        if self.conf('preflight'):
+            self._preflight()
+
+    def _preflight(self):
+        """
+        Check the credentials of every zone that can be known before the
+        challenges are, all in parallel, and raise `errors.PluginError`
+        listing every zone that failed.
+        """
+        from certbot_dns_joker import preflight
+
+        self._setup_credentials()
+        if self.zone_credentials is not None:
+            checked = self.zone_credentials.zones()
+        elif self.credentials.conf('domain'):
+            checked = [self.credentials.conf('domain')]
+        else:
+            logger.debug('The credentials file does not set "domain"; '
+                         'skipping the pre-flight check')
+            return
+
+        cache = preflight.PreflightCache(self._state_path('preflight.json'),
+                                         self.conf('preflight-cache-seconds'))
+        clients = [self._get_joker_client(zone) for zone in checked]
+        clients = [client for client in clients if not cache.passed(client)]
+        if not clients:
+            logger.debug('Joker credentials passed the pre-flight check recently')
+            return
+
+        def check(client):
+            try:
+                client.check_credentials()
+            except errors.PluginError as e:
+                return '{0}: {1}'.format(client.domain, e)
+            cache.add(client)
+            return None
+
+        workers = min(self.conf('concurrency') or 1, len(clients))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            failures = [f for f in executor.map(check, clients) if f is not None]
+        if failures:
+            self._release_clients()
+            raise errors.PluginError('Joker pre-flight check failed for {0}:\n{1}'.format(
+                self.conf('credentials'), '\n'.join(failures)))
+
     def _setup_credentials(self):
+        from certbot_dns_joker import registry
+        path = self.conf('credentials')
+        cached = registry.REGISTRY.credentials(path, self.dest_namespace) if path else None
+        if cached is not None:
+            # Do what _configure_credentials does besides parsing: store an
+            # absolute path for renewal, and warn if the file is readable by
+            # others, as on every use.
+            path = os.path.abspath(os.path.expanduser(path))
+            setattr(self.config, self.dest('credentials'), path)
+            dns_common.validate_file_permissions(path)
+            self.credentials, self.zone_credentials = cached
+            return
         self.credentials = self._configure_credentials(
             'credentials',
             'Joker credentials INI file',
-            {
+            None,
+            self._validate_credentials)
+        registry.REGISTRY.remember_credentials(self.conf('credentials'), self.dest_namespace,
+                                               (self.credentials, self.zone_credentials))
+
+    def _validate_credentials(self, creds):
+        # A file with [zone] sections holds credentials for several zones;
+        # otherwise it holds a single username and password at the top level.
+        if creds.confobj.sections:
+            self.zone_credentials = credentials.ZoneCredentials.from_credentials(creds)
+        else:
+            self.zone_credentials = None
+            creds.require({
                 'username': 'domain-specific Joker dyndns username',
                 'password': 'domain-specific Joker dyndns password',
                 # 'domain': 'top-level domain for credentials',
             })
 
+    def perform(self, achalls):  # pylint: disable=missing-function-docstring
+        # This is dns_common.DNSAuthenticator.perform with the fixed sleep
+        # replaced by _wait_for_propagation.
+        self._setup_credentials()
+
+        self._attempt_cleanup = True
+        self._written = {}
+        # Look CNAMEs up again (or in the cache) for every run: a long-lived
+        # authenticator, as used by batch.BatchRunner, must see changes.
+        self._targets = {}
+
+        groups = self._delegate(_group_by_label(achalls))
+        groups = _single_values(groups)
+        self._drain_deferred(skip=groups)
+        self._run_groups(self._perform, groups)
+        responses = [achall.response(achall.account_key) for achall in achalls]
+
+        with metrics.correlate('propagation', self._correlation_ids()):
+            self._wait_for_propagation()
+
+        return responses
+
     def _perform(self, domain, validation_name, validation):
-        self._get_joker_client(domain).add_txt_record(domain, validation_name, validation)
+        client = self._get_joker_client(domain, validation_name)
+        with metrics.correlate('perform', [metrics.correlation_id(validation_name, validation)]):
+            client.add_txt_record(domain, validation_name, validation)
+        with self._lock:
+            self._written.setdefault((client.domain, validation_name), set()).add(validation)
+
+    def cleanup(self, achalls):  # pylint: disable=missing-function-docstring
+        try:
+            if self._attempt_cleanup:
+                # Blanking a label removes all of its values, so one call per
+                # label is enough, and only labels this run wrote are touched.
+                written = {validation_name for _, validation_name in self._written}
+                groups = self._delegate(_group_by_label(achalls))
+                # Certbot has the certificate by now, so don't keep it waiting
+                # for a slow Joker: what doesn't finish in time is deferred.
+                self._use_retry_policy(self._cleanup_retry_policy())
+                failed = self._run_groups(self._cleanup, collections.OrderedDict(
+                    (validation_name, group[:1]) for validation_name, group in groups.items()
+                    if validation_name in written), deadline=self.conf('cleanup-deadline'))
+                for group in failed:
+                    self._defer(*group[0])
+                self._written = {}
+                # Keep the journal down to the records still outstanding.
+                self._journal().compact()
+        finally:
+            self._release_clients()
+            self._retry = None
+            self.hook.flush()
 
     def _cleanup(self, domain, validation_name, validation):
-        self._get_joker_client(domain).del_txt_record(domain, validation_name, validation)
+        client = self._get_joker_client(domain, validation_name)
+        # Blanking the label removes every value this run wrote to it.
+        with metrics.correlate('cleanup', self._correlation_ids(client.domain, validation_name)):
+            client.del_txt_record(domain, validation_name, validation)
+
+    def _correlation_ids(self, zone=None, validation_name=None):
+        """Return the correlation IDs of the challenges written, optionally to one name."""
+        return sorted(metrics.correlation_id(name, value)
+                      for (written_zone, name), values in self._written.items()
+                      if zone is None or (written_zone, name) == (zone, validation_name)
+                      for value in values)
+
+    def _defer(self, domain, validation_name, unused_validation):
+        try:
+            client = self._get_joker_client(domain, validation_name)
+        except errors.PluginError as e:
+            logger.warning('Unable to defer removing %s: %s', validation_name, e)
+            return
+        label = client.label(validation_name)
+        values = self._written.get((client.domain, validation_name), ())
+        logger.info('Removing the %s TXT record for %s is deferred to the next run',
+                    label, client.domain)
+        self._deferred().add(client, label, values)
+
+    def _drain_deferred(self, skip=()):
+        """
+        Retry the removals deferred by earlier runs, within
+        --dns-joker-cleanup-deadline.  Those that fail again stay queued.
+
+        Records named in `skip` are about to be written by this run, which
+        removes them again in its own cleanup.  They are dropped from the
+        queue rather than blanked, so that a late removal can't wipe the
+        new challenge.
+        """
+        skip = {name.lower() for name in skip}
+        queue = self._deferred()
+        entries = queue.entries()
+        if not entries:
+            return
+        outstanding = dict(((e.endpoint, e.username, e.zone, e.label), e.value)
+                           for e in self._journal().outstanding())
+        groups = collections.OrderedDict()
+        for entry in entries:
+            value = outstanding.get((entry['endpoint'], entry['username'], entry['zone'],
+                                     entry['label']))
+            if value not in entry['values']:
+                # Removed since, or written again for a newer challenge.
+                queue.done(entry)
+                continue
+            name = '{0}.{1}'.format(entry['label'], entry['zone'])
+            if name.lower() in skip:
+                logger.debug('%s is about to be rewritten; not removing it', name)
+                queue.done(entry)
+                continue
+            groups[name] = [(entry['zone'], name, entry)]
+        if not groups:
+            return
+
+        logger.info('Removing %d TXT record(s) left by earlier runs', len(groups))
+        self._use_retry_policy(self._cleanup_retry_policy())
+        try:
+            self._run_groups(self._drain, groups, deadline=self.conf('cleanup-deadline'))
+        finally:
+            self._use_retry_policy(self._retry_policy())
+
+    def _drain(self, domain, name, entry):
+        try:
+            client = self._get_joker_client(domain, name)
+        except errors.PluginError:
+            client = None
+        if client is None or (client.endpoint, client.username, client.domain) != (
+                entry['endpoint'], entry['username'], entry['zone']):
+            logger.debug('No credentials for the deferred removal of %s; leaving it', name)
+            return
+        with metrics.correlate('deferred-cleanup', [metrics.correlation_id(name, value)
+                                                    for value in entry['values']]):
+            client.del_txt_record(domain, name, None)
+        self._deferred().done(entry)
+
+    def _delegate(self, groups):
+        """
+        With --dns-joker-follow-cnames, replace each validation name in
+        `groups` that is a CNAME by the name the CNAME chain leads to, which
+        is where the TXT records must be written.
+        """
+        if not self.conf('follow-cnames') or not groups:
+            return groups
+        # Cleanup reuses what perform found, including that a name isn't a CNAME.
+        pending = [name for name in groups if name not in self._targets]
+        if pending:
+            cache = self._cname_cache()
+            workers = min(self.conf('concurrency') or 1, len(pending))
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                self._targets.update(zip(pending, executor.map(cache.get, pending)))
+
+        delegated = collections.OrderedDict()
+        sources = {}
+        for validation_name, group in groups.items():
+            target = self._targets[validation_name]
+            if not target or target == validation_name.rstrip('.').lower():
+                target = validation_name
+            else:
+                logger.debug('%s is delegated to %s', validation_name, target)
+            sources.setdefault(target, []).append(validation_name)
+            merged = delegated.setdefault(target, [])
+            for domain, _, validation in group:
+                if validation not in [v for _, _, v in merged]:
+                    merged.append((domain, target, validation))
+
+        shared = [(target, names) for target, names in sources.items()
+                  if len(names) > 1 and len(delegated[target]) > 1]
+        if shared:
+            raise errors.PluginError(
+                'The Joker DynDNS API keeps only one TXT value per name, but {0}.  Point each '
+                'of them at a target of its own.'.format('; '.join(
+                    '{0} are all CNAMEs to {1}'.format(', '.join(names), target)
+                    for target, names in shared)))
+        return delegated
+
+    def _get_joker_client(self, default_domain, validation_name=None):
+        if self.zone_credentials is not None:
+            found = self.zone_credentials.lookup(validation_name or default_domain)
+            if found is None:
+                raise errors.PluginError('No zone in {0} contains {1}'.format(
+                    self.conf('credentials'), validation_name or default_domain))
+            domain, username, password = found
+        else:
+            username = self.credentials.conf('username')
+            password = self.credentials.conf('password')
+            domain = self.credentials.conf('domain')
+            if not domain and validation_name:
+                domain = self._zone_cache().zone_for(validation_name)
+            if not domain:
+                domain = default_domain
+        # One client (and so one connection pool) per zone for the whole run.
+        key = (username, domain, self.endpoint)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is None:
+                client = _JokerClient(username, password, domain, self.ttl,
+                                      endpoint=self.endpoint,
+                                      pool_size=self.conf('pool-size'),
+                                      retry=self._retry or self._retry_policy(),
+                                      hook=self.hook,
+                                      limiter=self._rate_limiter(),
+                                      state=self._state(),
+                                      journal=self._journal(),
+                                      transport=self._transport(username, domain))
+                self._clients[key] = client
+        return client
+
+    def _run_groups(self, func, groups, deadline=None):
+        """
+        Call ``func(domain, validation_name, validation)`` for each challenge
+        in `groups`, as returned by `_group_by_label`.
+
+        Groups run in parallel on up to --dns-joker-concurrency threads; the
+        challenges within a group run one after another in order.
+
+        Without a `deadline` the first error is raised.  With one, see
+        `_run_groups_until`.
+        """
+        def run_group(group):
+            for args in group:
+                func(*args)
+
+        workers = min(self.conf('concurrency') or 1, len(groups))
+        if deadline is not None:
+            return _run_groups_until(run_group, groups, max(workers, 1), deadline)
+        if workers <= 1:
+            for group in groups.values():
+                run_group(group)
+            return []
+
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers)
+        futures = [executor.submit(run_group, group) for group in groups.values()]
+        executor.shutdown()
+        for future in futures:
+            future.result()
+        return []
+
+    def _zone_cache(self):
+        from certbot_dns_joker import zones
+        with self._lock:
+            if self._zones is None:
+                self._zones = zones.ZoneCache(self._state_path('zones.json'),
+                                              self.conf('zone-cache-ttl'))
+            return self._zones
+
+    def _cname_cache(self):
+        from certbot_dns_joker import zones
+        with self._lock:
+            if self._cnames is None:
+                # Names that aren't CNAMEs are cached too, as themselves, but
+                # only briefly.
+                self._cnames = zones.NameCache(self._state_path('cnames.json'),
+                                               self.conf('zone-cache-ttl'),
+                                               zones.follow_cnames,
+                                               negative_ttl=zones.NEGATIVE_TTL)
+            return self._cnames
+
+    def _rate_limiter(self):
+        if self._limiter is None and (self.conf('rate-limit') or self.conf('zone-rate-limit')):
+            from certbot_dns_joker import ratelimit
+            burst = self.conf('rate-burst')
+            self._limiter = ratelimit.RateLimiter(self._state_path('ratelimit.json'), {
+                'account': (self.conf('rate-limit'), burst),
+                'zone': (self.conf('zone-rate-limit'), burst),
+            })
+        return self._limiter
+
+    def _state(self):
+        if self._record_state is None and self.conf('state-max-age'):
+            from certbot_dns_joker import state
+            self._record_state = state.RecordState(self._state_path('records.json'),
+                                                   self.conf('state-max-age'))
+        return self._record_state
+
+    def _transport(self, username, domain):
+        # Transports outlive the run: later lineages of a `certbot renew`
+        # reuse their connections, and they are closed when certbot exits.
+        from certbot_dns_joker import registry
+        from certbot_dns_joker import transport
+        factory = self.transport_factory or (
+            lambda endpoint, pool_size: transport.for_endpoint(endpoint, pool_size,
+                                                               http2=self.conf('http2')))
+        return registry.REGISTRY.transport(
+            self.conf('credentials'),
+            (self.endpoint, username, domain, self.conf('pool-size'), self.conf('http2')),
+            lambda: factory(self.endpoint, self.conf('pool-size')))
+
+    def _deferred(self):
+        from certbot_dns_joker import deferred
+        return deferred.DeferredDeletes(self._state_path('deferred.json'))
+
+    def _journal(self):
+        from certbot_dns_joker import journal
+        return journal.Journal(self._state_path('journal.jsonl'))
+
+    def _state_path(self, name):
+        return os.path.join(self.config.work_dir, 'dns-joker', name)
 
-    def _get_joker_client(self, default_domain):
-        username = self.credentials.conf('username')
-        password = self.credentials.conf('password')
-        domain = self.credentials.conf('domain')
-        if not domain:
-            domain = default_domain
-        return _JokerClient(username, password, domain, self.ttl)
+    def _retry_policy(self):
+        return RetryPolicy(attempts=self.conf('retries'),
+                           backoff=self.conf('retry-backoff'),
+                           jitter=self.conf('retry-jitter'),
+                           timeout=self.conf('timeout'),
+                           deadline=self.conf('deadline'))
 
+    def _cleanup_retry_policy(self):
+        """The retry policy for removals, which must end by --dns-joker-cleanup-deadline."""
+        policy = self._retry_policy()
+        deadline = self.conf('cleanup-deadline')
+        if deadline:
+            policy.timeout = min(policy.timeout or deadline, deadline)
+            policy.deadline = min(policy.deadline or deadline, deadline)
+        return policy
 
-class _JokerClient(object):
+    def _use_retry_policy(self, policy):
+        """Make `policy` the retry policy of every client, old and new."""
+        with self._lock:
+            self._retry = policy
+            for client in self._clients.values():
+                client.retry = policy
+
+    def _release_clients(self):
+        for client in self._clients.values():
+            opened, reused = client.connection_stats()
+            logger.debug('Joker API connections for %s: %d opened, %d reused',
+                         client.domain, opened, reused)
+        # The transports stay open for the next lineage; see _transport.
+        self._clients = {}
+
+    def _wait_for_propagation(self):
+        seconds = self.conf('propagation-seconds')
+        adaptive = self.conf('adaptive-propagation') and self._written
+        if adaptive:
+            seconds = self._adaptive_wait(seconds)
+        start = time.monotonic()
+        if (self.conf('propagation-check') or adaptive) and self._written:
+            from certbot_dns_joker import propagation
+            if self.conf('propagation-check'):
+                display_util.notify('Waiting up to %d seconds for DNS changes to propagate'
+                                    % seconds)
+            else:
+                display_util.notify('Waiting %d seconds for DNS changes to propagate' % seconds)
+            checker = propagation.PropagationChecker(
+                nameservers=_split_list(self.conf('nameservers')),
+                resolvers=_split_list(self.conf('resolvers')),
+                interval=self.conf('propagation-interval'),
+                policy=self.conf('propagation-policy'))
+            verified = checker.wait(self._written, seconds)
+            self._learn_propagation(checker.visible_after)
+            if not verified:
+                logger.warning('DNS changes were not visible after %d seconds; continuing anyway',
+                               seconds)
+            elif not self.conf('propagation-check'):
+                # Polling only measured the propagation; wait as long as planned.
+                time.sleep(max(seconds - (time.monotonic() - start), 0))
+        else:
+            display_util.notify('Waiting %d seconds for DNS changes to propagate' % seconds)
+            time.sleep(seconds)
+            verified = None
+        self.hook.propagation_wait(time.monotonic() - start, verified)
+
+    def _adaptive_wait(self, bound):
+        """
+        Return the wait learned for the zones written in this run: the
+        --dns-joker-propagation-percentile of the slowest zone's history,
+        plus one polling interval, and at most `bound`.
+        """
+        percentile = self.conf('propagation-percentile')
+        estimates = {}
+        for zone in sorted({zone for zone, _ in self._written}):
+            estimates[zone] = self._propagation_history().estimate(zone, percentile)
+            if estimates[zone] is None:
+                logger.debug('Not enough propagation history for %s; waiting %d seconds',
+                             zone, bound)
+                return bound
+        seconds = min(bound, int(math.ceil(max(estimates.values()))) +
+                      self.conf('propagation-interval'))
+        logger.debug('Learned propagation times: %s; waiting %d seconds', estimates, seconds)
+        return seconds
+
+    def _learn_propagation(self, visible_after):
+        # A zone that was never seen counts as the configured upper bound.
+        bound = self.conf('propagation-seconds')
+        self._propagation_history().record({zone: visible_after.get(zone, bound)
+                                            for zone, _ in self._written})
+
+    def _propagation_history(self):
+        if self._history is None:
+            from certbot_dns_joker import history
+            self._history = history.PropagationHistory(self._state_path('propagation.json'))
+        return self._history
+
+
+def _group_by_label(achalls):
+    """
+    Group challenges by validation name, dropping duplicate values.
+
+    :returns: `collections.OrderedDict` mapping each validation name to a
+        list of ``(domain, validation_name, validation)`` tuples.
+    """
+    groups = collections.OrderedDict()
+    for achall in achalls:
+        domain = achall_domain(achall)
+        validation_name = achall.validation_domain_name(domain)
+        validation = achall.validation(achall.account_key)
+        group = groups.setdefault(validation_name, [])
+        if validation not in [v for _, _, v in group]:
+            group.append((domain, validation_name, validation))
+    return groups
+
+
+def several_values(achalls):
+    """
+    Return the validation names of `achalls`, annotated challenges, that
+    would need several TXT values at once, which Joker can't hold.
+    """
+    return [name for name, group in _group_by_label(achalls).items() if len(group) > 1]
+
+
+def _single_values(groups):
+    """
+    Return `groups` with only the first value for each validation name, and
+    warn about the names that needed more.
+
+    /nic/replace replaces every TXT value of a label with a single one, so
+    only one of the challenges for such a name can pass.  That happens with
+    a certificate for both example.com and *.example.com.  The CA keeps the
+    authorization that passed, so running certbot again completes the
+    certificate with the remaining challenge alone.
+    """
+    single = collections.OrderedDict()
+    for name, group in groups.items():
+        if len(group) > 1:
+            logger.warning(
+                'The Joker DynDNS API keeps only one TXT value per name, but %s needs %d '
+                'values at once (for %s).  Only the challenge for %s can pass this time; '
+                'run certbot again to complete the certificate, as the CA reuses the '
+                'authorization that passed.', name, len(group),
+                ', '.join(sorted({d for d, _, _ in group})), group[0][0])
+        single[name] = group[:1]
+    return single
+
+
+def achall_domain(achall):
+    """Return the domain that `achall`, an annotated challenge, is for."""
+    # Certbot 4 replaced AnnotatedChallenge.domain with identifier.value.
+    identifier = getattr(achall, 'identifier', None)
+    return identifier.value if identifier is not None else achall.domain
+
+
+def _run_groups_until(run_group, groups, workers, deadline):
+    """
+    Call `run_group` for each of `groups` on `workers` daemon threads, and
+    return the groups that failed or were not finished `deadline` seconds
+    later.  Errors are logged rather than raised.
+
+    Groups that haven't started by then never start.  Those still running
+    carry on in the background, but on daemon threads, so certbot doesn't
+    wait for them when it exits.  Stopping them then is safe: state files
+    are replaced atomically and journal lines are appended with one write.
+    """
+    pending = collections.deque(groups.values())
+    results = {}
+    finished = threading.Condition()
+    stop = threading.Event()
+
+    def worker():
+        while True:
+            with finished:
+                if stop.is_set() or not pending:
+                    return
+                group = pending.popleft()
+            try:
+                run_group(group)
+                error = None
+            except Exception as e:  # pylint: disable=broad-except
+                error = e
+            with finished:
+                results[id(group)] = error
+                finished.notify_all()
+
+    for _ in range(workers):
+        threading.Thread(target=worker, daemon=True).start()
+    end = time.monotonic() + deadline
+    with finished:
+        while len(results) < len(groups):
+            remaining = end - time.monotonic()
+            if remaining <= 0:
+                break
+            finished.wait(remaining)
+        stop.set()
+        results = dict(results)
+
+    failed = []
+    for group in groups.values():
+        if id(group) not in results:
+            logger.warning('Updating %s did not finish within %s seconds', group[0][1], deadline)
+            failed.append(group)
+        elif results[id(group)] is not None:
+            logger.warning('%s', results[id(group)])
+            failed.append(group)
+    return failed
+
+
+def _split_list(value):
+    return [item.strip() for item in value.split(',') if item.strip()] if value else []
+
+
+class _JokerClient(api.JokerClientBase):
     """
     Encapsulates all communication with the Joker.
     """
 
-    # These are the error codes documented at https://help.dyn.com/remote-access-api/return-codes/
-    error = {
-       'badauth'  : 'Bad authorization (username or password)',
-       'badsys'   : 'The system parameter given was not valid',
-
-       'notfqdn'  : 'A Fully-Qualified Domain Name was not provided',
-       'nohost'   : 'The hostname specified does not exist in the database',
-       '!yours'   : 'The hostname specified exists, but not under the username currently being used',
-       '!donator' : 'The offline setting was set, when the user is not a donator',
-       '!active'  : 'The hostname specified is in a Custom DNS domain which has not yet been activated.',
-       'abuse'    : 'The hostname specified is blocked for abuse; you should receive an email notification '
-                     'which provides an unblock request link.  More info can be found on '
-                     'https://www.dyndns.com/support/abuse.html',
-
-       'numhost'  : 'System error: Too many or too few hosts found. Contact support@dyndns.org',
-       'dnserr'   : 'System error: DNS error encountered. Contact support@dyndns.org',
-
-       'nochg'    : 'No update required; unnecessary attempts to change to the current address are considered abusive',
-    }
-
-    def __init__(self, username, password, domain, ttl, endpoint=JOKER_ENDPOINT):
-        self.endpoint = endpoint
-        self.username = username
-        self.password = password
-        self.domain = domain
-        self.ttl = ttl
-        self.session = requests.Session()
+    def __init__(self, username, password, domain, ttl, endpoint=JOKER_ENDPOINT, pool_size=None,
+                 retry=None, hook=None, limiter=None, state=None, journal=None, transport=None):
+        super(_JokerClient, self).__init__(username, password, domain, ttl, endpoint, retry, hook)
+        from certbot_dns_joker import transport as transports
+        self.limiter = limiter
+        self.state = state
+        self.journal = journal
+        self.transport = transport or transports.HTTPTransport(endpoint, pool_size)
+
+    @property
+    def session(self):
+        """The `requests.Session` of an HTTP transport."""
+        return self.transport.session
+
+    def connection_stats(self):
+        """
+        Return ``(opened, reused)``: the number of connections opened to the
+        endpoint and the number of requests that reused one of them.
+        """
+        return self.transport.connection_stats()
+
+    def close(self):
+        self.transport.close()
 
     def add_txt_record(self, cert_domain, record_name, record_content):
-        # Documentation for the Joker TXT record API is here:
-        # https://joker.com/faq/content/6/496/en/let_s-encrypt-support.html
-
-        # print(f'ADD domain:{cert_domain} record_name:{record_name} endpoint:{self.endpoint}')
-
-        # Joker adds the domain to the end of the label of the TXT record that
-        # it creates, but the record_name that certbot passed us already has
-        # it so we need to remove it before calling the Joker API.
-        dotdomain = '.' + self.domain
-        if record_name.endswith(dotdomain):
-            record_name = record_name[0:-len(dotdomain)]
-
-        r = self.session.post(
-            self.endpoint,
-            data = {
-                'username': self.username,
-                'password': self.password,
-                'zone': self.domain,
-                'label': record_name,
-                'type': 'TXT',
-                'value': record_content,
-                'ttl': self.ttl,
-            })
+        label, data = self._request_data(record_name, record_content)
+        # Journal a value before writing it, so that even a write that is
+        # interrupted half-way is cleaned up later.
+        if self.journal is not None and record_content:
+            self.journal.publish(self, label, record_content)
+        self._set(label, data, record_content)
+        if self.journal is not None and not record_content:
+            self.journal.remove(self, label)
 
-        # print(f'ADD {r} {r.text}\n  REQ URL: {r.request.url}\n  REQ BODY: {r.request.body}\n')
+    def _set(self, label, data, record_content):
+        if self.state is None:
+            self._post(label, data)
+            return
 
-        if r.status_code >= 300:
-            self._handle_http_error(r.text, record_name, self.domain)
+        key = (self.endpoint, self.username, self.domain)
+        if self.state.get(key, label) == record_content:
+            logger.debug('%s TXT record for %s is already %r; not updating',
+                         label, self.domain, record_content)
+            return
+        try:
+            self._post(label, data)
+        except errors.PluginError:
+            self.state.forget(key, label)
+            raise
+        self.state.set(key, label, record_content)
 
     def del_txt_record(self, domain, record_name, record_content):
         self.add_txt_record(domain, record_name, '')
 
-    def _handle_http_error(self, error, record_name, domain_name):
-        hint = self.error.get(error)
-        raise errors.PluginError('Error setting {0} TXT record for {1}: {2}.{3}'
-                                 .format(record_name, domain_name, error,
-                                         ' ({0})'.format(hint) if hint else ''))
+    def check_credentials(self):
+        """
+        Make a harmless API call that fails with `errors.PluginError` if the
+        username, password or zone is wrong: blank `PREFLIGHT_LABEL`.
+
+        Joker's DynDNS API has no call that only checks credentials, so this
+        is an update, and one that changes nothing: Joker counts repeated
+        ``nochg`` updates as abuse.  Callers should cache successful checks,
+        as `Authenticator` does with `preflight.PreflightCache`.
+        """
+        # This deliberately bypasses the record state: the point is to talk
+        # to Joker even if the label is known to be blank already.
+        label, data = self._request_data(PREFLIGHT_LABEL, '')
+        self._post(label, data)
+
+    def _post(self, label, data):
+        from certbot_dns_joker import transport
+        start = self.retry.clock()
+        size = api.form_size(data)
+        attempt = 0
+        while True:
+            attempt += 1
+            if self.limiter is not None:
+                self.limiter.acquire([('account', self.username), ('zone', self.domain)])
+            sent = self.retry.clock()
+            try:
+                status, text = self.transport.post(data, timeout=self.retry.timeout)
+            except transport.TransportError as e:
+                status, error, transient, text = None, str(e), True, ''
+            else:
+                if status < 300:
+                    self._record_attempt(label, attempt, sent, status, size=(size, len(text)))
+                    return
+                error, transient = self._failure(status, text)
+            self._record_attempt(label, attempt, sent, status, error, size=(size, len(text)))
+
+            delay = self._retry_delay(attempt, start, transient)
+            if delay is None:
+                self._handle_http_error(error, label, self.domain)
+            self.retry.sleep(delay)
@@ -0,0 +1,432 @@
+"""
+A local stand-in for Joker, for tests, load tests and capacity planning.
+
+`FakeJoker` keeps the zone state and implements ``/nic/replace``, with
+optional latency, transient errors and a rate limit.  It can be reached
+in-process through `transport.MemoryTransport`, over HTTP/1.1 through
+`FakeJokerServer` or cleartext HTTP/2 through `FakeJokerH2Server`, and its
+TXT records can be queried over DNS through
+`FakeDNSServer`, e.g. by ``--dns-joker-nameservers``.
+
+``python -m certbot_dns_joker.fake`` runs the HTTP and DNS servers::
+
+    python -m certbot_dns_joker.fake --port 8080 --dns-port 5353 --latency 0.05
+"""
+import argparse
+import http.server
+import random
+import socket
+import sys
+import threading
+import time
+import types
+import urllib.parse
+
+import dns.exception
+import dns.flags
+import dns.message
+import dns.rcode
+import dns.rdatatype
+import dns.rrset
+
+
+class FakeJoker(object):
+    """
+    The zone state and behaviour of the fake.
+
+    Each ``(zone, label)`` holds at most one TXT value, which /nic/replace
+    replaces, or removes when the value is blank.
+
+    :param float latency: Seconds to wait before answering each request.
+    :param float jitter: Up to this many extra seconds are added at random.
+    :param float error_rate: Fraction of requests answered with ``dnserr``.
+    :param float rate_limit: Requests per second above which requests are
+        answered with a 503; 0 means no limit.
+    :param dict accounts: Maps each username to a ``(password, zones)``
+        tuple.  If set, other credentials get ``badauth`` and other zones
+        ``nohost``; otherwise everything is accepted.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, rate_limit=0.0, accounts=None,
+                 seed=None, sleep=time.sleep):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.rate_limit = rate_limit
+        self.accounts = accounts
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.records = {}
+        self._sleep = sleep
+        self._window = []
+        self.active = 0
+        self.reset_counters()
+
+    def reset_counters(self):
+        with self.lock:
+            self.requests = 0
+            self.errors = 0
+            self.rate_limited = 0
+            self.peak_concurrency = self.active
+
+    def respond(self, data):
+        """Return the ``(status, text)`` for a /nic/replace request with form `data`."""
+        with self.lock:
+            self.active += 1
+            self.peak_concurrency = max(self.peak_concurrency, self.active)
+        try:
+            return self._respond(data)
+        finally:
+            with self.lock:
+                self.active -= 1
+
+    def _respond(self, data):
+        def field(name):
+            return data.get(name, [''])[0]
+
+        with self.lock:
+            self.requests += 1
+            now = time.monotonic()
+            if self.rate_limit:
+                self._window = [t for t in self._window if now - t < 1.0]
+                if len(self._window) >= self.rate_limit:
+                    self.rate_limited += 1
+                    return 503, 'rate limited'
+                self._window.append(now)
+            if self.error_rate and self.random.random() < self.error_rate:
+                self.errors += 1
+                return 400, 'dnserr'
+            delay = self.latency + self.random.uniform(0, self.jitter)
+        self._sleep(delay)
+
+        zone = field('zone').lower()
+        if self.accounts is not None:
+            password, zones = self.accounts.get(field('username'), (None, ()))
+            if password is None or password != field('password'):
+                return 400, 'badauth'
+            if zone not in zones:
+                return 400, 'nohost'
+        key = (zone, field('label').lower())
+        value = field('value')
+        with self.lock:
+            if value:
+                self.records[key] = value
+            else:
+                self.records.pop(key, None)
+        return 200, 'good'
+
+    def txt(self, name):
+        """Return the TXT values published for the fully qualified `name`."""
+        name = name.rstrip('.').lower()
+        with self.lock:
+            return [value for (zone, label), value in self.records.items()
+                    if '{0}.{1}'.format(label, zone) == name]
+
+    def serves(self, name):
+        """Whether `name` is in one of the fake's zones."""
+        name = name.rstrip('.').lower()
+        if self.accounts is None:
+            return True
+        return any(name == zone or name.endswith('.' + zone)
+                   for _, zones in self.accounts.values() for zone in zones)
+
+
+class FakeJokerServer(http.server.ThreadingHTTPServer):
+    """
+    A threaded HTTP/1.1 server answering /nic/replace from a `FakeJoker`.
+
+    :param FakeJoker joker: The fake to serve; one is made from `kwargs` if
+        it is not given.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, joker=None, host='127.0.0.1', port=0, **kwargs):
+        super(FakeJokerServer, self).__init__((host, port), _Handler)
+        self.joker = joker or FakeJoker(**kwargs)
+        self._thread = None
+        self.reset_counters()
+
+    @property
+    def endpoint(self):
+        return 'http://{0}:{1}/nic/replace'.format(*self.server_address[:2])
+
+    def reset_counters(self):
+        self.joker.reset_counters()
+        self.connections = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def process_request(self, request, client_address):
+        with self.joker.lock:
+            self.connections += 1
+        super(FakeJokerServer, self).process_request(request, client_address)
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are separate writes; don't let Nagle hold the body back.
+    disable_nagle_algorithm = True
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0))).decode()
+        if urllib.parse.urlsplit(self.path).path != '/nic/replace':
+            status, text = 404, 'not found'
+        else:
+            status, text = self.server.joker.respond(
+                urllib.parse.parse_qs(body, keep_blank_values=True))
+        text = text.encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'text/plain')
+        self.send_header('Content-Length', str(len(text)))
+        self.end_headers()
+        self.wfile.write(text)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class FakeJokerH2Server(object):
+    """
+    A server answering /nic/replace from a `FakeJoker` over cleartext
+    HTTP/2 with prior knowledge (h2c), for `transport.HTTP2Transport`.
+
+    Each connection is read by one thread and each request is answered on a
+    thread of its own, so the streams of a connection are served
+    concurrently.  This requires the ``h2`` package (the ``http2`` extra).
+    """
+
+    def __init__(self, joker=None, host='127.0.0.1', port=0, **kwargs):
+        self.joker = joker or FakeJoker(**kwargs)
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.sock.bind((host, port))
+        self.sock.listen(64)
+        self.sock.settimeout(0.1)
+        self.server_address = self.sock.getsockname()
+        self._stop = threading.Event()
+        self._thread = None
+        self.reset_counters()
+
+    @property
+    def endpoint(self):
+        return 'http://{0}:{1}/nic/replace'.format(*self.server_address[:2])
+
+    def reset_counters(self):
+        self.joker.reset_counters()
+        self.connections = 0
+
+    def start(self):
+        self._thread = threading.Thread(target=self._accept, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sock.close()
+
+    def _accept(self):
+        while not self._stop.is_set():
+            try:
+                conn, _ = self.sock.accept()
+            except socket.timeout:
+                continue
+            with self.joker.lock:
+                self.connections += 1
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _serve(self, conn):
+        import h2.config
+        import h2.connection
+        import h2.events
+        import h2.exceptions
+
+        connection = h2.connection.H2Connection(
+            config=h2.config.H2Configuration(client_side=False))
+        lock = threading.Lock()
+        requests = {}
+        conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        try:
+            with lock:
+                connection.initiate_connection()
+                conn.sendall(connection.data_to_send())
+            while not self._stop.is_set():
+                data = conn.recv(65535)
+                if not data:
+                    break
+                with lock:
+                    events = connection.receive_data(data)
+                    for event in events:
+                        if isinstance(event, h2.events.RequestReceived):
+                            requests[event.stream_id] = (dict(event.headers).get(b':path'), [])
+                        elif isinstance(event, h2.events.DataReceived):
+                            requests[event.stream_id][1].append(event.data)
+                            connection.acknowledge_received_data(
+                                event.flow_controlled_length, event.stream_id)
+                        elif isinstance(event, h2.events.StreamEnded):
+                            path, body = requests.pop(event.stream_id)
+                            threading.Thread(
+                                target=self._respond, daemon=True,
+                                args=(conn, connection, lock, event.stream_id, path,
+                                      b''.join(body))).start()
+                        elif isinstance(event, h2.events.ConnectionTerminated):
+                            return
+                    conn.sendall(connection.data_to_send())
+        except (OSError, h2.exceptions.ProtocolError):
+            pass
+        finally:
+            conn.close()
+
+    def _respond(self, conn, connection, lock, stream_id, path, body):
+        if urllib.parse.urlsplit((path or b'').decode()).path != '/nic/replace':
+            status, text = 404, 'not found'
+        else:
+            status, text = self.joker.respond(
+                urllib.parse.parse_qs(body.decode(), keep_blank_values=True))
+        text = text.encode()
+        with lock:
+            try:
+                connection.send_headers(stream_id, [
+                    (':status', str(status)),
+                    ('content-type', 'text/plain'),
+                    ('content-length', str(len(text))),
+                ])
+                connection.send_data(stream_id, text, end_stream=True)
+                conn.sendall(connection.data_to_send())
+            except Exception:  # pylint: disable=broad-except
+                # The client went away.
+                pass
+
+
+class FakeDNSServer(object):
+    """
+    An authoritative UDP DNS server answering TXT queries from a `FakeJoker`.
+
+    :ivar str address: ``host:port``, as taken by ``--dns-joker-nameservers``.
+    """
+
+    def __init__(self, joker, host='127.0.0.1', port=0):
+        self.joker = joker
+        self.queries = 0
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind((host, port))
+        self.sock.settimeout(0.1)
+        self.address = '{0}:{1}'.format(*self.sock.getsockname()[:2])
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                wire, peer = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            try:
+                query = dns.message.from_wire(wire)
+            except dns.exception.DNSException:
+                continue
+            self.queries += 1
+            self.sock.sendto(self.answer(query).to_wire(), peer)
+
+    def answer(self, query):
+        """Return the response to the `dns.message.Message` `query`."""
+        response = dns.message.make_response(query)
+        question = query.question[0]
+        name = question.name.to_text()
+        if not self.joker.serves(name):
+            response.set_rcode(dns.rcode.REFUSED)
+            return response
+        response.flags |= dns.flags.AA
+        values = self.joker.txt(name)
+        if question.rdtype == dns.rdatatype.TXT and values:
+            response.answer.append(dns.rrset.from_text_list(
+                name, 60, 'IN', 'TXT', ['"{0}"'.format(v) for v in values]))
+        return response
+
+
+class _Challenge(object):
+    """
+    Just enough of an AnnotatedChallenge for perform and cleanup.  Only for
+    the simulator and the benchmark; not part of the public API.
+    """
+
+    def __init__(self, domain, validation):
+        self.identifier = types.SimpleNamespace(value=domain)
+        self.account_key = None
+        self._validation = validation
+
+    def validation_domain_name(self, domain):
+        return '_acme-challenge.' + domain
+
+    def validation(self, unused_account_key):
+        return self._validation
+
+    def response(self, unused_account_key):
+        return None
+
+
+def _account(spec):
+    username, password, zones = spec.split(':', 2)
+    return username, (password, {zone.lower() for zone in zones.split(',')})
+
+
+def main(argv=None):
+    """Run the fake's HTTP and DNS servers until interrupted."""
+    parser = argparse.ArgumentParser(description='Run a local fake Joker endpoint.')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=0,
+                        help='HTTP port for /nic/replace (default: any free port)')
+    parser.add_argument('--http2', action='store_true',
+                        help='serve /nic/replace over cleartext HTTP/2 instead of HTTP/1.1')
+    parser.add_argument('--dns-port', type=int, default=0,
+                        help='UDP port for DNS (default: any free port)')
+    parser.add_argument('--latency', type=float, default=0.0)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit', type=float, default=0.0)
+    parser.add_argument('--account', action='append', type=_account, metavar='USER:PASS:ZONES',
+                        help='accept only these credentials for these comma-separated zones; '
+                             'may be repeated (default: accept anything)')
+    args = parser.parse_args(argv)
+
+    joker = FakeJoker(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                      rate_limit=args.rate_limit,
+                      accounts=dict(args.account) if args.account else None)
+    server_class = FakeJokerH2Server if args.http2 else FakeJokerServer
+    server = server_class(joker, host=args.host, port=args.port).start()
+    dns_server = FakeDNSServer(joker, host=args.host, port=args.dns_port).start()
+    print('endpoint: {0}\nnameserver: {1}'.format(server.endpoint, dns_server.address))
+    sys.stdout.flush()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.stop()
+        dns_server.stop()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
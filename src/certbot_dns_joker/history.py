@@ -0,0 +1,77 @@
+"""Remember how long each zone took to serve new TXT records."""
+import math
+import threading
+import time
+
+from certbot_dns_joker import storage
+
+# Keep this many observations per zone, and none older than MAX_AGE seconds.
+MAX_SAMPLES = 50
+MAX_AGE = 30 * 86400
+# Don't trust a percentile of fewer observations than this.
+MIN_SAMPLES = 5
+
+
+class PropagationHistory(object):
+    """
+    Observed propagation delays per zone, kept in a JSON file, from which
+    `estimate` picks a wait: a high percentile of the recent observations.
+
+    An observation is the number of seconds between the end of the writes
+    and the moment the zone's records were visible on every polled server.
+    When they never became visible, record the configured upper bound
+    instead, so that a zone that gets slower pushes its estimate up rather
+    than being learned from waits that were already too short.
+
+    New observations are merged into the file while it is locked (see
+    `storage.LockedJSON`), so concurrent certbot processes keep each
+    other's.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._samples = None
+
+    def record(self, observations):
+        """Add the observations in `observations`, a dict mapping zones to seconds."""
+        if not observations:
+            return
+        with self._lock:
+            with storage.LockedJSON(self.path) as stored:
+                samples = self._fresh(stored)
+                now = self._clock()
+                for zone, seconds in observations.items():
+                    kept = samples.setdefault(zone, [])
+                    kept.append([now, round(seconds, 3)])
+                    del kept[:-MAX_SAMPLES]
+                stored.clear()
+                stored.update(samples)
+            self._samples = samples
+
+    def estimate(self, zone, percentile):
+        """
+        Return the `percentile` (0-100) of the recent observations for
+        `zone`, or None if there are fewer than `MIN_SAMPLES` of them.
+        """
+        with self._lock:
+            seconds = sorted(s for _, s in self._load().get(zone, []))
+        if len(seconds) < MIN_SAMPLES:
+            return None
+        rank = max(int(math.ceil(percentile / 100.0 * len(seconds))), 1)
+        return seconds[min(rank, len(seconds)) - 1]
+
+    def _load(self):
+        if self._samples is None:
+            self._samples = self._fresh(storage.load_json(self.path, {}))
+        return self._samples
+
+    def _fresh(self, stored):
+        cutoff = self._clock() - MAX_AGE
+        samples = {}
+        for zone, kept in stored.items():
+            fresh = [s for s in kept if s[0] >= cutoff]
+            if fresh:
+                samples[zone] = fresh
+        return samples
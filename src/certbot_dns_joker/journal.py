@@ -0,0 +1,115 @@
+"""An append-only journal of the TXT records the plugin publishes and removes."""
+import collections
+import contextlib
+import json
+import logging
+import os
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+from certbot_dns_joker import storage
+
+logger = logging.getLogger(__name__)
+
+# What identifies a record: the same label can be published through several
+# endpoints or accounts.
+Entry = collections.namedtuple('Entry', 'endpoint username zone label value time')
+
+
+class Journal(object):
+    """
+    One JSON line per event, appended by `_JokerClient`: ``publish`` before
+    a TXT value is written and ``remove`` after its label is blanked.  A
+    record whose last event is ``publish`` is outstanding; if certbot is
+    killed between perform and cleanup, ``certbot-dns-joker-cleanup-orphans``
+    finds it here and removes it.
+
+    Every append and compaction holds an exclusive ``flock`` on a separate
+    ``.lock`` file, so concurrent certbot processes can share one journal.
+    Each line is appended with a single write and fsync'd, so a process
+    that dies, or a daemon thread stopped at exit, never leaves half a
+    line; a torn line left by a crashed machine is skipped.  Compaction
+    replaces the file atomically.
+    """
+
+    def __init__(self, path, clock=time.time):
+        self.path = path
+        self._clock = clock
+
+    def publish(self, client, label, value):
+        """Record that `client` is about to write `value` to `label`."""
+        self._append('publish', client, label, value)
+
+    def remove(self, client, label):
+        """Record that `client` has blanked `label`."""
+        self._append('remove', client, label, '')
+
+    def _append(self, event, client, label, value):
+        line = json.dumps({'event': event, 'endpoint': client.endpoint,
+                           'username': client.username, 'zone': client.domain,
+                           'label': label, 'value': value, 'time': self._clock()},
+                          sort_keys=True) + '\n'
+        with self._locked(exclusive=True):
+            fd = os.open(self.path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o600)
+            try:
+                end = os.lseek(fd, 0, os.SEEK_END)
+                if end:
+                    # Don't glue this line onto a torn one.
+                    os.lseek(fd, end - 1, os.SEEK_SET)
+                    if os.read(fd, 1) != b'\n':
+                        line = '\n' + line
+                os.write(fd, line.encode('utf-8'))
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+
+    def outstanding(self):
+        """Return an `Entry` for each record that was published and not removed since."""
+        with self._locked(exclusive=False):
+            return list(self._read().values())
+
+    def compact(self):
+        """Drop everything but the outstanding records, and return them."""
+        with self._locked(exclusive=True):
+            entries = self._read()
+            storage.save_text(self.path, ''.join(
+                json.dumps(dict(entry._asdict(), event='publish'), sort_keys=True) + '\n'
+                for entry in entries.values()))
+        return list(entries.values())
+
+    def _read(self):
+        try:
+            with open(self.path) as f:
+                return self._replay(f)
+        except FileNotFoundError:
+            return collections.OrderedDict()
+
+    def _replay(self, f):
+        entries = collections.OrderedDict()
+        for number, line in enumerate(f, 1):
+            try:
+                event = json.loads(line)
+                key = (event['endpoint'], event['username'], event['zone'], event['label'])
+            except (ValueError, KeyError, TypeError):
+                logger.warning('Ignoring bad line %d in %s', number, self.path)
+                continue
+            entries.pop(key, None)
+            if event.get('event') == 'publish':
+                entries[key] = Entry(*key, value=event.get('value'), time=event.get('time'))
+        return entries
+
+    @contextlib.contextmanager
+    def _locked(self, exclusive):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            if fcntl is not None:
+                fcntl.flock(fd, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+            yield
+        finally:
+            # Closing the file releases the lock.
+            os.close(fd)
@@ -0,0 +1,234 @@
+"""Hooks for observing Joker API calls, and a hook that collects metrics."""
+import contextlib
+import hashlib
+import json
+import threading
+
+from certbot_dns_joker import storage
+
+# Upper bounds, in seconds, of the histogram buckets.
+API_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PROPAGATION_BUCKETS = (1, 5, 10, 30, 60, 120, 300, 600)
+
+_context = threading.local()
+
+
+def correlation_id(validation_name, validation):
+    """
+    Return the ID shared by every event about one challenge: the TXT record
+    `validation_name` holding `validation`.
+    """
+    return hashlib.sha256('{0} {1}'.format(validation_name, validation).encode()) \
+        .hexdigest()[:16]
+
+
+@contextlib.contextmanager
+def correlate(phase, ids):
+    """
+    Attribute the events reported by the current thread inside the block to
+    the challenges with correlation `ids`, during `phase` (``perform``,
+    ``propagation``, ``cleanup``...).
+    """
+    previous = getattr(_context, 'value', None)
+    _context.value = (phase, tuple(ids))
+    try:
+        yield
+    finally:
+        _context.value = previous
+
+
+def correlation():
+    """Return the ``(phase, ids)`` of the enclosing `correlate` block, or ``(None, ())``."""
+    return getattr(_context, 'value', None) or (None, ())
+
+
+class Hook(object):
+    """
+    Receives events from `_JokerClient` and the `Authenticator`.
+
+    The methods do nothing; subclass and override the ones you need.  The
+    challenges an event belongs to are given by `correlation`.
+    """
+
+    def api_call(self, zone, label, attempt, seconds, status, result, sent=0, received=0):
+        """
+        Called after every HTTP attempt against the Joker API.
+
+        :param str zone: The zone being updated.
+        :param str label: The label within the zone.
+        :param int attempt: 1 for the first attempt, 2 for the first retry...
+        :param float seconds: How long the attempt took.
+        :param int status: The HTTP status, or None if there was no response.
+        :param str result: ``good``, the error code Joker returned, or
+            ``connection-error`` if there was no response.
+        :param int sent: The size of the request body, in bytes.
+        :param int received: The size of the response body, in characters.
+        """
+
+    def propagation_wait(self, seconds, verified):
+        """
+        Called after waiting for DNS propagation.
+
+        :param float seconds: How long the wait took.
+        :param verified: True if the records were seen on every server, False
+            if polling gave up, or None if the wait was a fixed delay.
+        """
+
+    def flush(self):
+        """Called at the end of the run to write out anything collected."""
+
+
+class Hooks(Hook):
+    """Passes every event on to each of `hooks`."""
+
+    def __init__(self, hooks):
+        self.hooks = list(hooks)
+
+    def api_call(self, *args, **kwargs):
+        for hook in self.hooks:
+            hook.api_call(*args, **kwargs)
+
+    def propagation_wait(self, seconds, verified):
+        for hook in self.hooks:
+            hook.propagation_wait(seconds, verified)
+
+    def flush(self):
+        for hook in self.hooks:
+            hook.flush()
+
+
+def combine(hooks):
+    """Return one hook that passes events on to each of `hooks`."""
+    hooks = list(hooks)
+    if not hooks:
+        return Hook()
+    if len(hooks) == 1:
+        return hooks[0]
+    return Hooks(hooks)
+
+
+class _Histogram(object):
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        return {
+            'buckets': dict(zip([str(b) for b in self.buckets], self.counts)),
+            'count': self.count,
+            'sum': round(self.sum, 6),
+        }
+
+    def prometheus(self, name, help_text):
+        lines = ['# HELP {0} {1}'.format(name, help_text),
+                 '# TYPE {0} histogram'.format(name)]
+        for bound, count in zip(self.buckets, self.counts):
+            lines.append('{0}_bucket{{le="{1}"}} {2}'.format(name, bound, count))
+        lines.append('{0}_bucket{{le="+Inf"}} {1}'.format(name, self.count))
+        lines.append('{0}_sum {1}'.format(name, round(self.sum, 6)))
+        lines.append('{0}_count {1}'.format(name, self.count))
+        return lines
+
+
+class Metrics(Hook):
+    """
+    Collects API latency histograms, result and retry counters, and
+    propagation wait times, and exports them as JSON or as a Prometheus
+    textfile.  The plugin keeps one per file for the whole process (see
+    `registry.Registry.metrics`).
+
+    Results are counted by the codes in `_JokerClient.error`; anything else
+    Joker returns is counted as ``other`` to keep the number of series small.
+    If `path` is given, `flush` writes the metrics there.
+    """
+
+    def __init__(self, known_results=(), path=None):
+        self.path = path
+        self._lock = threading.Lock()
+        self._known = set(known_results) | {'good', 'connection-error'}
+        self.api_latency = _Histogram(API_BUCKETS)
+        self.propagation = _Histogram(PROPAGATION_BUCKETS)
+        self.results = {}
+        self.statuses = {}
+        self.retries = 0
+        self.propagation_timeouts = 0
+
+    def api_call(self, zone, label, attempt, seconds, status, result, sent=0, received=0):
+        result = result if result in self._known else 'other'
+        status = str(status) if status is not None else 'none'
+        with self._lock:
+            self.api_latency.observe(seconds)
+            self.results[result] = self.results.get(result, 0) + 1
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+            if attempt > 1:
+                self.retries += 1
+
+    def propagation_wait(self, seconds, verified):
+        with self._lock:
+            self.propagation.observe(seconds)
+            if verified is False:
+                self.propagation_timeouts += 1
+
+    def flush(self):
+        if self.path:
+            self.write(self.path)
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'api_request_seconds': self.api_latency.as_dict(),
+                'api_results': dict(self.results),
+                'api_statuses': dict(self.statuses),
+                'api_retries': self.retries,
+                'propagation_wait_seconds': self.propagation.as_dict(),
+                'propagation_incomplete': self.propagation_timeouts,
+            }
+
+    def prometheus(self):
+        """Return the metrics in the Prometheus text exposition format."""
+        prefix = 'certbot_dns_joker_'
+        with self._lock:
+            lines = self.api_latency.prometheus(
+                prefix + 'api_request_seconds', 'Duration of Joker API requests.')
+            lines += ['# HELP {0}api_results_total Joker API results by code.'.format(prefix),
+                      '# TYPE {0}api_results_total counter'.format(prefix)]
+            lines += ['{0}api_results_total{{result="{1}"}} {2}'.format(prefix, k, v)
+                      for k, v in sorted(self.results.items())]
+            lines += ['# HELP {0}api_responses_total Joker API responses by HTTP status.'
+                      .format(prefix),
+                      '# TYPE {0}api_responses_total counter'.format(prefix)]
+            lines += ['{0}api_responses_total{{status="{1}"}} {2}'.format(prefix, k, v)
+                      for k, v in sorted(self.statuses.items())]
+            lines += ['# HELP {0}api_retries_total Joker API requests that were retries.'
+                      .format(prefix),
+                      '# TYPE {0}api_retries_total counter'.format(prefix),
+                      '{0}api_retries_total {1}'.format(prefix, self.retries)]
+            lines += self.propagation.prometheus(
+                prefix + 'propagation_wait_seconds', 'Time spent waiting for DNS propagation.')
+            lines += ['# HELP {0}propagation_incomplete_total Propagation waits that ended '
+                      'before the records were seen.'.format(prefix),
+                      '# TYPE {0}propagation_incomplete_total counter'.format(prefix),
+                      '{0}propagation_incomplete_total {1}'.format(prefix,
+                                                                   self.propagation_timeouts)]
+        return '\n'.join(lines) + '\n'
+
+    def write(self, path):
+        """
+        Write the metrics to `path`: in the Prometheus textfile format if it
+        ends in ``.prom``, otherwise as JSON.
+        """
+        if path.endswith('.prom'):
+            text = self.prometheus()
+        else:
+            text = json.dumps(self.as_dict(), indent=2, sort_keys=True) + '\n'
+        storage.save_text(path, text, mode=0o644)
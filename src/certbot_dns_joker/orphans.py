@@ -0,0 +1,173 @@
+"""
+Remove TXT records that an interrupted certbot run published but never
+cleaned up, as listed in the plugin's journal.
+"""
+import argparse
+import concurrent.futures
+import logging
+import os
+import sys
+import time
+
+from certbot import errors
+from certbot.plugins import dns_common
+
+from certbot_dns_joker import credentials
+from certbot_dns_joker import dns_joker
+from certbot_dns_joker import journal
+from certbot_dns_joker import state
+
+logger = logging.getLogger(__name__)
+
+# certbot's default --work-dir.
+WORK_DIR = '/var/lib/letsencrypt'
+
+# Records published more recently than this are left alone by default: they
+# most likely belong to a certbot run that is still waiting for validation.
+MIN_AGE = 3600
+
+
+class OrphanCleaner(object):
+    """
+    Blanks every outstanding record in a journal whose zone and username
+    match the credentials file, up to `concurrency` at a time, with one
+    client (and so one connection pool) per zone.
+
+    :param str work_dir: certbot's work directory, which holds the journal.
+    :param str credentials_path: A Joker credentials INI file, as given to
+        ``--dns-joker-credentials``.
+    :param int min_age: Seconds since a record was published before it is
+        considered orphaned.
+    :param int state_max_age: Like ``--dns-joker-state-max-age``: if not 0,
+        skip blanking records that the record state says are blank already.
+    """
+
+    def __init__(self, work_dir, credentials_path, concurrency=4, retry=None, min_age=MIN_AGE,
+                 state_max_age=0, clock=time.time):
+        self.directory = os.path.join(work_dir, 'dns-joker')
+        self.journal = journal.Journal(os.path.join(self.directory, 'journal.jsonl'))
+        self.state = None
+        if state_max_age:
+            self.state = state.RecordState(os.path.join(self.directory, 'records.json'),
+                                           state_max_age)
+        self.concurrency = concurrency
+        self.min_age = min_age
+        self._clock = clock
+        self.retry = retry or dns_joker.RetryPolicy(attempts=3)
+        self._credentials = dns_common.CredentialsConfiguration(
+            credentials_path, lambda var: 'dns_joker_' + var)
+        if self._credentials.confobj.sections:
+            self._zones = credentials.ZoneCredentials.from_credentials(self._credentials)
+        else:
+            self._zones = None
+        self._clients = {}
+
+    def password(self, entry):
+        """Return the password for `entry`'s zone and username, or None if there is none."""
+        if self._zones is not None:
+            found = self._zones.lookup(entry.zone)
+            if found is not None and found[:2] == (entry.zone, entry.username):
+                return found[2]
+            return None
+        creds = self._credentials
+        if (creds.conf('username') == entry.username and
+                creds.conf('domain') in (None, '', entry.zone)):
+            return creds.conf('password')
+        return None
+
+    def run(self, dry_run=False):
+        """
+        Remove the outstanding records.
+
+        :returns: ``(removed, failed, skipped)``: lists of `journal.Entry`.
+            Skipped entries have no matching credentials or were published
+            less than `min_age` seconds ago.
+        """
+        cutoff = self._clock() - self.min_age
+        skipped, pending = [], []
+        for entry in self.journal.outstanding():
+            if self.password(entry) is None:
+                logger.warning('No credentials for %s in zone %s (user %s); leaving it',
+                               entry.label, entry.zone, entry.username)
+                skipped.append(entry)
+            elif entry.time is not None and entry.time > cutoff:
+                logger.info('%s in zone %s was published %d seconds ago and may still be '
+                            'in use; leaving it', entry.label, entry.zone,
+                            self._clock() - entry.time)
+                skipped.append(entry)
+            else:
+                pending.append(entry)
+        if dry_run or not pending:
+            return pending if dry_run else [], [], skipped
+
+        removed, failed = [], []
+        workers = min(self.concurrency or 1, len(pending))
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [(entry, executor.submit(self._remove, entry)) for entry in pending]
+            for entry, future in futures:
+                try:
+                    future.result()
+                except errors.PluginError as e:
+                    logger.warning('%s', e)
+                    failed.append(entry)
+                else:
+                    removed.append(entry)
+        for client in self._clients.values():
+            client.close()
+        self._clients = {}
+        self.journal.compact()
+        return removed, failed, skipped
+
+    def _remove(self, entry):
+        key = (entry.endpoint, entry.username, entry.zone)
+        client = self._clients.get(key)
+        if client is None:
+            client = dns_joker._JokerClient(  # pylint: disable=protected-access
+                entry.username, self.password(entry), entry.zone, dns_joker.Authenticator.ttl,
+                endpoint=entry.endpoint, pool_size=self.concurrency, retry=self.retry,
+                state=self.state, journal=self.journal)
+            self._clients[key] = client
+        client.del_txt_record(entry.zone, '{0}.{1}'.format(entry.label, entry.zone), None)
+
+
+def main(argv=None):
+    """The ``certbot-dns-joker-cleanup-orphans`` command."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().replace('\n', ' '))
+    parser.add_argument('--credentials', required=True,
+                        help='Joker credentials INI file, as given to --dns-joker-credentials.')
+    parser.add_argument('--work-dir', default=WORK_DIR,
+                        help="certbot's working directory (default: %(default)s)")
+    parser.add_argument('--concurrency', type=int, default=4,
+                        help='maximum number of records to remove in parallel '
+                             '(default: %(default)s)')
+    parser.add_argument('--min-age', type=int, default=MIN_AGE,
+                        help='only remove records published at least this many seconds ago, '
+                             'so that those of a certbot run still in progress are kept '
+                             '(default: %(default)s)')
+    parser.add_argument('--state-max-age', type=int, default=0,
+                        help='trust the record state of the last this many seconds, as with '
+                             '--dns-joker-state-max-age, to skip records known to be blank '
+                             '(default: %(default)s, never skip)')
+    parser.add_argument('--dry-run', action='store_true',
+                        help='list the orphaned records without removing them')
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+
+    try:
+        cleaner = OrphanCleaner(args.work_dir, args.credentials, args.concurrency,
+                                min_age=args.min_age, state_max_age=args.state_max_age)
+        removed, failed, skipped = cleaner.run(dry_run=args.dry_run)
+    except errors.Error as e:
+        sys.stderr.write('{0}\n'.format(e))
+        return 2
+
+    verb = 'Would remove' if args.dry_run else 'Removed'
+    for entry in removed:
+        print('{0} {1} TXT record in {2}'.format(verb, entry.label, entry.zone))
+    print('{0} {1} orphaned TXT record(s); {2} failed, {3} skipped'.format(
+        verb, len(removed), len(failed), len(skipped)))
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
@@ -0,0 +1,74 @@
+"""Remember which Joker credentials recently passed the pre-flight check."""
+import binascii
+import hashlib
+import hmac
+import os
+import threading
+import time
+
+from certbot_dns_joker import storage
+
+
+class PreflightCache(object):
+    """
+    The credentials that passed the pre-flight check in the last `ttl`
+    seconds, kept in a JSON file so that back-to-back renewals don't repeat
+    the check.  Changing a password changes the key, so new credentials are
+    always checked.  Passes are merged into the file while it is locked, so
+    concurrent certbot processes keep each other's.
+
+    The file must not help anyone guess a password, so credentials are
+    keyed by an HMAC under a random secret kept next to it, readable only
+    by its owner, rather than by a plain digest that a leaked file could be
+    brute-forced against.
+    """
+
+    def __init__(self, path, ttl, clock=time.time):
+        self.path = path
+        self.ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._secret = None
+        self._passed = {k: v for k, v in storage.load_json(path, {}).items()
+                        if v > clock() - ttl}
+
+    def passed(self, client):
+        """Whether `client`'s credentials passed the check recently."""
+        with self._lock:
+            return self._key(client) in self._passed
+
+    def add(self, client):
+        """Record that `client`'s credentials passed the check."""
+        with self._lock:
+            key, now = self._key(client), self._clock()
+            if self.ttl <= 0:
+                self._passed[key] = now
+                return
+            with storage.LockedJSON(self.path) as stored:
+                passed = {k: v for k, v in stored.items() if v > now - self.ttl}
+                passed[key] = now
+                stored.clear()
+                stored.update(passed)
+            self._passed = passed
+
+    def _key(self, client):
+        material = '\0'.join([client.endpoint, client.domain, client.username, client.password])
+        return hmac.new(self._load_secret(), material.encode('utf-8'),
+                        hashlib.sha256).hexdigest()
+
+    def _load_secret(self):
+        if self._secret is None and self.ttl <= 0:
+            # Nothing is saved, so the secret needn't outlive the process.
+            self._secret = os.urandom(32)
+        if self._secret is None:
+            path = os.path.splitext(self.path)[0] + '.key'
+            try:
+                with open(path) as f:
+                    self._secret = binascii.unhexlify(f.read().strip())
+            except (OSError, ValueError):
+                # If two processes race here, the last secret written wins and
+                # the other's entries are merely checked again next time.
+                storage.save_text(path, binascii.hexlify(os.urandom(32)).decode('ascii'))
+                with open(path) as f:
+                    self._secret = binascii.unhexlify(f.read().strip())
+        return self._secret
@@ -0,0 +1,251 @@
+"""Check whether TXT records written through Joker are visible in DNS."""
+import collections
+import concurrent.futures
+import logging
+import select
+import socket
+import time
+
+import dns.entropy
+import dns.exception
+import dns.flags
+import dns.message
+import dns.rdatatype
+import dns.resolver
+
+logger = logging.getLogger(__name__)
+
+# What `PropagationChecker` waits for: every server serving every record, or
+# more than half of the servers polled for each record.
+ALL = 'all'
+QUORUM = 'quorum'
+POLICIES = (ALL, QUORUM)
+
+
+def parse_server(spec):
+    """
+    Split a ``host[:port]`` (or ``[ipv6]:port``) string into an
+    ``(address, port)`` tuple.  The port defaults to 53.
+    """
+    spec = spec.strip()
+    host, sep, port = spec.rpartition(':')
+    if sep and port.isdigit() and (':' not in host or host.startswith('[')):
+        return host.strip('[]'), int(port)
+    return spec.strip('[]'), 53
+
+
+class PropagationChecker(object):
+    """
+    Polls DNS servers until the expected TXT records are visible.
+
+    By default the servers polled for a record are the authoritative
+    nameservers of the zone the record was written to.  `nameservers`
+    replaces that lookup with a fixed list, and `resolvers` adds servers
+    that are polled in addition to the nameservers.
+
+    Each poll round sends one UDP query per server and pending name from
+    non-blocking sockets, to all servers in parallel (see `query_all`); a
+    server that doesn't answer in time counts as not serving the record
+    that round.  With the `ALL` policy a record is visible once
+    every server serves all of its values, so a lagging secondary can't
+    fail the ACME validation; with `QUORUM` a majority of them is enough.
+    """
+
+    def __init__(self, nameservers=None, resolvers=None, interval=5, query_timeout=3,
+                 policy=ALL, max_in_flight=32, clock=time.monotonic, sleep=time.sleep):
+        if policy not in POLICIES:
+            raise ValueError('Unknown propagation policy {0!r}'.format(policy))
+        self.nameservers = [parse_server(s) for s in nameservers or []]
+        self.resolvers = [parse_server(s) for s in resolvers or []]
+        self.interval = interval
+        self.query_timeout = query_timeout
+        self.max_in_flight = max_in_flight
+        self.policy = policy
+        self._clock = clock
+        self._sleep = sleep
+        self._zone_servers = {}
+        self.visible_after = {}
+
+    def wait(self, records, max_wait):
+        """
+        Wait until every record is visible or `max_wait` seconds have passed.
+
+        :param dict records: Maps ``(zone, validation_name)`` to the set of
+            TXT values expected at `validation_name`.
+        :param int max_wait: Upper bound on the time spent waiting.
+        :returns: True if every record became visible.  Afterwards
+            `visible_after` maps each zone whose records all became visible
+            to the number of seconds that took.
+        """
+        start = self._clock()
+        deadline = start + max_wait
+        pending = dict(records)
+        self.visible_after = {}
+        self._find_servers({zone for zone, _ in records})
+        while True:
+            # A name is asked of each server once per round, however many
+            # records share it.
+            answers = self.query_all({(server, name) for zone, name in pending
+                                      for server in self.servers(zone)})
+            for key in list(pending):
+                zone, name = key
+                servers = self.servers(zone)
+                serving = [server for server in servers
+                           if pending[key] <= answers[(server, name)]]
+                if servers and self._visible(len(serving), len(servers)):
+                    logger.debug('TXT record %s is visible on %s', name, serving)
+                    del pending[key]
+            waiting = {zone for zone, _ in pending}
+            for zone, _ in records:
+                if zone not in waiting and zone not in self.visible_after:
+                    self.visible_after[zone] = self._clock() - start
+            if not pending:
+                return True
+            remaining = deadline - self._clock()
+            if remaining <= 0:
+                logger.debug('Still waiting for %s', sorted(name for _, name in pending))
+                return False
+            self._sleep(min(self.interval, remaining))
+
+    def _visible(self, serving, servers):
+        if self.policy == QUORUM:
+            return serving * 2 > servers
+        return serving == servers
+
+    def servers(self, zone):
+        """Return the ``(address, port)`` tuples to poll for records in `zone`."""
+        if zone not in self._zone_servers:
+            servers = self.nameservers or self._authoritative_servers(zone)
+            self._zone_servers[zone] = servers + self.resolvers
+        return self._zone_servers[zone]
+
+    def _find_servers(self, zones):
+        """Look up the nameservers of `zones` in parallel."""
+        zones = [zone for zone in zones if zone not in self._zone_servers]
+        if len(zones) < 2 or self.nameservers:
+            return
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(len(zones), 8)) as executor:
+            for zone, servers in zip(zones, executor.map(self._authoritative_servers, zones)):
+                self._zone_servers[zone] = servers + self.resolvers
+
+    def query(self, server, name):
+        """Return the set of TXT values `server` serves for `name`."""
+        return self.query_all([(server, name)])[(server, name)]
+
+    def query_all(self, queries):
+        """
+        Send a TXT query for each ``(server, name)`` in `queries` and return
+        a dict mapping each of them to the set of values served.
+
+        The servers are queried in parallel, with up to `max_in_flight`
+        queries outstanding per server; replies are read while sending, and
+        each reply makes room for the next query, so a large number of names
+        neither floods a server nor overflows the socket's receive buffer.
+        A server that leaves a query unanswered for `query_timeout` seconds
+        is not asked anything else this round.  Queries that fail or get no
+        answer map to an empty set.
+        """
+        answers = {query: set() for query in queries}
+        queued = collections.OrderedDict()
+        for server, name in sorted(answers):
+            queued.setdefault(server, collections.deque()).append(name)
+        in_flight = dict.fromkeys(queued, 0)
+        sockets = {}
+        outstanding = {}
+        try:
+            while queued or outstanding:
+                for server in list(queued):
+                    while queued[server] and in_flight[server] < self.max_in_flight:
+                        name = queued[server].popleft()
+                        if self._send(sockets, outstanding, server, name):
+                            in_flight[server] += 1
+                        # Read what has arrived so far before sending more.
+                        for sock in sockets.values():
+                            self._receive(sock, outstanding, answers, in_flight)
+                    if not queued[server]:
+                        del queued[server]
+
+                now = time.monotonic()
+                for key, (_, (server, name), sent) in list(outstanding.items()):
+                    if now - sent >= self.query_timeout:
+                        logger.debug('TXT query for %s to %s:%d timed out',
+                                     name, server[0], server[1])
+                        del outstanding[key]
+                        in_flight[server] -= 1
+                        if queued.pop(server, None):
+                            logger.debug('Not asking %s:%d anything else this round', *server)
+                if not outstanding:
+                    continue
+                timeout = min(sent for _, _, sent in outstanding.values()) \
+                    + self.query_timeout - now
+                readable, _, _ = select.select(list(sockets.values()), [], [], max(timeout, 0))
+                for sock in readable:
+                    self._receive(sock, outstanding, answers, in_flight)
+        finally:
+            for sock in sockets.values():
+                sock.close()
+        return answers
+
+    def _send(self, sockets, outstanding, server, name):
+        """Send the TXT query for `name` to `server`, and return whether that worked."""
+        address, port = server
+        family = socket.AF_INET6 if ':' in address else socket.AF_INET
+        if family not in sockets:
+            sockets[family] = socket.socket(family, socket.SOCK_DGRAM)
+            sockets[family].setblocking(False)
+        request = dns.message.make_query(name, dns.rdatatype.TXT)
+        while (request.id, address, port) in outstanding:
+            request.id = dns.entropy.random_16()
+        if server not in self.resolvers:
+            # Authoritative servers should answer from their own data.
+            request.flags &= ~dns.flags.RD
+        try:
+            sockets[family].sendto(request.to_wire(), (address, port))
+        except OSError as e:
+            logger.debug('TXT query for %s to %s:%d failed: %s', name, address, port, e)
+            return False
+        outstanding[(request.id, address, port)] = (request, (server, name), time.monotonic())
+        return True
+
+    @staticmethod
+    def _receive(sock, outstanding, answers, in_flight):
+        """Read the answers waiting on `sock` into `answers`."""
+        while True:
+            try:
+                wire, peer = sock.recvfrom(65535)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as e:
+                # E.g. an ICMP port unreachable from an earlier query.
+                logger.debug('DNS receive failed: %s', e)
+                continue
+            try:
+                response = dns.message.from_wire(wire)
+            except dns.exception.DNSException:
+                continue
+            entry = outstanding.get((response.id, peer[0], peer[1]))
+            if entry is None or not entry[0].is_response(response):
+                continue
+            del outstanding[(response.id, peer[0], peer[1])]
+            in_flight[entry[1][0]] -= 1
+            values = answers[entry[1]]
+            for rrset in response.answer:
+                if rrset.rdtype == dns.rdatatype.TXT:
+                    for rdata in rrset:
+                        values.add(b''.join(rdata.strings).decode('utf-8', 'replace'))
+
+    def _authoritative_servers(self, zone):
+        try:
+            answer = dns.resolver.resolve(zone, dns.rdatatype.NS)
+        except dns.exception.DNSException as e:
+            logger.warning('Unable to find the nameservers for %s: %s', zone, e)
+            return []
+        servers = []
+        for ns in answer:
+            for rdtype in (dns.rdatatype.A, dns.rdatatype.AAAA):
+                try:
+                    servers += [(a.address, 53) for a in dns.resolver.resolve(ns.target, rdtype)]
+                except dns.exception.DNSException:
+                    pass
+        logger.debug('Nameservers for %s: %s', zone, servers)
+        return servers
@@ -0,0 +1,80 @@
+"""A token-bucket rate limiter shared by every certbot process on a host."""
+import logging
+import threading
+import time
+
+from certbot_dns_joker import storage
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter(object):
+    """
+    Token buckets, one per Joker account and one per zone, kept in a state
+    file so that every process using the same file shares them.
+
+    Each bucket holds up to `burst` tokens and refills at `rate` tokens per
+    second; a request takes one token from each of its buckets, waiting
+    until all of them have one.  The state file is locked with ``flock``
+    while it is read and updated.  (Where ``flock`` isn't available the
+    buckets are only shared between threads of one process.)
+
+    :param str path: The state file.
+    :param dict limits: Maps a bucket kind (``account`` or ``zone``) to a
+        ``(rate, burst)`` tuple.  Kinds that are missing or have a rate of 0
+        are not limited.
+    """
+
+    def __init__(self, path, limits, clock=time.time, sleep=time.sleep):
+        self.path = path
+        self.limits = {kind: (rate, max(burst, 1)) for kind, (rate, burst) in limits.items()
+                       if rate and rate > 0}
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self.waited = 0.0
+
+    def acquire(self, buckets):
+        """
+        Take a token from each of `buckets`, a list of ``(kind, name)``
+        tuples, waiting until that is possible.
+        """
+        buckets = [(kind, name) for kind, name in buckets if kind in self.limits]
+        if not buckets:
+            return
+        while True:
+            wait = self.try_acquire(buckets)
+            if wait <= 0:
+                return
+            logger.debug('Rate limit reached for %s; waiting %.3fs', buckets, wait)
+            self.waited += wait
+            self._sleep(wait)
+
+    def try_acquire(self, buckets):
+        """
+        Take a token from each of `buckets` and return 0, or return how long
+        to wait before they are available without taking any.
+        """
+        buckets = [(kind, name) for kind, name in buckets if kind in self.limits]
+        if not buckets:
+            return 0
+        with self._lock, self._locked_state() as state:
+            now = self._clock()
+            levels = {}
+            wait = 0.0
+            for kind, name in buckets:
+                rate, burst = self.limits[kind]
+                key = '{0}:{1}'.format(kind, name)
+                tokens, updated = state.get(key, (burst, now))
+                tokens = min(burst, tokens + max(now - updated, 0) * rate)
+                levels[key] = tokens
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+            if wait > 0:
+                return wait
+            for key, tokens in levels.items():
+                state[key] = (tokens - 1, now)
+            return 0
+
+    def _locked_state(self):
+        return storage.LockedJSON(self.path)
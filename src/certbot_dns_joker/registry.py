@@ -0,0 +1,104 @@
+"""
+What the plugin keeps for the rest of the process: parsed credentials files,
+warm transports and metrics.
+
+``certbot renew`` makes a new authenticator for every lineage it renews.
+Lineages that use the same credentials file share what an earlier one
+parsed and reuse its keep-alive connections instead of opening new ones,
+and lineages that write the same metrics file add to the same totals.
+"""
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class Registry(object):
+    """
+    Parsed credentials keyed by the file's path and modification stamp,
+    transports keyed by the credentials path they were made for, and metrics
+    keyed by the file they are written to.  When a credentials file changes,
+    its entry and its transports are dropped.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._credentials = {}
+        self._transports = {}
+        self._metrics = {}
+
+    def credentials(self, path, namespace):
+        """
+        Return what `remember_credentials` stored for `path` and the
+        plugin's option `namespace`, or None if nothing is stored or the file
+        changed.
+        """
+        key = (os.path.abspath(path), namespace)
+        with self._lock:
+            entry = self._credentials.get(key)
+            if entry is None:
+                return None
+            if entry[0] != _stamp(key[0]):
+                logger.debug('%s changed; reading it again', path)
+                self._forget(key[0])
+                return None
+            return entry[1]
+
+    def remember_credentials(self, path, namespace, value):
+        """Store `value`, the parsed contents of `path`, until the file changes."""
+        stamp = _stamp(os.path.abspath(path))
+        if stamp is None:
+            return
+        with self._lock:
+            self._credentials[(os.path.abspath(path), namespace)] = (stamp, value)
+
+    def transport(self, path, key, build):
+        """
+        Return the transport stored under the credentials `path` and `key`,
+        storing ``build()`` there first if there is none.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            transports = self._transports.setdefault(path, {})
+            if key not in transports:
+                transports[key] = build()
+            return transports[key]
+
+    def metrics(self, path, build):
+        """
+        Return the metrics written to `path`, storing ``build()`` there first
+        if there are none.
+        """
+        path = os.path.abspath(path)
+        with self._lock:
+            if path not in self._metrics:
+                self._metrics[path] = build()
+            return self._metrics[path]
+
+    def close(self):
+        """Close every transport and forget everything."""
+        with self._lock:
+            for path in list(self._transports):
+                self._forget(path)
+            self._credentials.clear()
+            self._metrics.clear()
+
+    def _forget(self, path):
+        for key in [key for key in self._credentials if key[0] == path]:
+            del self._credentials[key]
+        for transport in self._transports.pop(path, {}).values():
+            transport.close()
+
+
+def _stamp(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+REGISTRY = Registry()
+atexit.register(REGISTRY.close)
@@ -0,0 +1,201 @@
+"""
+Simulate a renewal wave to plan capacity.
+
+Runs the plugin's real perform and cleanup for many certificates across
+many zones against a local `certbot_dns_joker.fake` Joker with a chosen
+latency, error and rate-limit profile, and reports the projected wall-clock
+time, the API calls made and the peak number of concurrent requests.
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import time
+import types
+
+from certbot import errors
+
+from certbot_dns_joker import dns_joker
+from certbot_dns_joker import fake
+from certbot_dns_joker import metrics
+from certbot_dns_joker import transport
+
+
+class _Authenticator(dns_joker.Authenticator):
+    """The real authenticator, except that the simulation adds up the propagation waits."""
+
+    def _wait_for_propagation(self):
+        pass
+
+
+def plugin_defaults(prefix='dns_joker_'):
+    """
+    Return the plugin's option defaults, as certbot would set them on its
+    config for an authenticator whose option names start with `prefix`.
+    """
+    defaults = {}
+
+    def add(name, **kwargs):
+        defaults[prefix + name.replace('-', '_')] = kwargs.get('default')
+    dns_joker.Authenticator.add_parser_arguments(add)
+    return defaults
+
+
+class Simulation(object):
+    """
+    Renews `certificates` certificates, spread round-robin over `zones`
+    zones, each for `names` names, `batch_size` certificates per perform
+    and cleanup, through one authenticator per batch as ``certbot renew``
+    uses one per lineage.
+
+    :param fake.FakeJoker joker: The fake Joker to run against.
+    :param dict options: Plugin options that differ from the defaults,
+        without the ``dns_joker_`` prefix, e.g. ``{'concurrency': 8}``.
+    :param bool http: Reach the fake over local HTTP instead of in-process.
+    """
+
+    def __init__(self, joker, certificates, zones, names=2, batch_size=1, options=None,
+                 http=False):
+        self.joker = joker
+        self.certificates = certificates
+        self.zones = ['zone{0}.example'.format(z) for z in range(zones)]
+        self.names = names
+        self.batch_size = max(batch_size, 1)
+        self.options = dict(options or {})
+        self.http = http
+
+    def run(self):
+        """Run the simulation and return the report as a dict."""
+        server = fake.FakeJokerServer(self.joker).start() if self.http else None
+        try:
+            return self._run(server)
+        finally:
+            if server is not None:
+                server.stop()
+
+    def _run(self, server):
+        hook = metrics.Metrics(dns_joker._JokerClient.error)  # pylint: disable=protected-access
+        self.joker.reset_counters()
+        failed = rate_limit_waits = 0
+        with tempfile.TemporaryDirectory() as work_dir:
+            config = self._config(work_dir, server)
+            start = time.perf_counter()
+            for first in range(0, self.certificates, self.batch_size):
+                auth = _Authenticator(config, 'dns-joker')
+                auth.hook = hook
+                if server is None:
+                    auth.transport_factory = (
+                        lambda endpoint, pool_size: transport.MemoryTransport(self.joker))
+                challenges = [challenge for i in range(first, min(first + self.batch_size,
+                                                                 self.certificates))
+                              for challenge in self._challenges(i)]
+                try:
+                    auth.perform(challenges)
+                    auth.cleanup(challenges)
+                except errors.PluginError as e:
+                    logging.getLogger(__name__).warning('%s', e)
+                    failed += 1
+                if auth._limiter is not None:  # pylint: disable=protected-access
+                    rate_limit_waits += auth._limiter.waited  # pylint: disable=protected-access
+            elapsed = time.perf_counter() - start
+
+        batches = int(math.ceil(self.certificates / float(self.batch_size)))
+        propagation = batches * config.dns_joker_propagation_seconds
+        projected = elapsed + propagation
+        api = hook.as_dict()
+        return {
+            'certificates': self.certificates,
+            'zones': len(self.zones),
+            'names_per_certificate': self.names,
+            'batches': batches,
+            'failed_batches': failed,
+            'api_seconds': round(elapsed, 3),
+            'propagation_seconds': propagation,
+            'projected_seconds': round(projected, 3),
+            'certificates_per_hour': round(self.certificates * 3600 / projected, 1)
+                                     if projected else None,
+            'api_calls': self.joker.requests,
+            'api_results': api['api_results'],
+            'api_retries': api['api_retries'],
+            'server_rate_limited': self.joker.rate_limited,
+            'client_rate_limit_wait_seconds': round(rate_limit_waits, 3),
+            'peak_concurrency': self.joker.peak_concurrency,
+        }
+
+    def _config(self, work_dir, server):
+        credentials = os.path.join(work_dir, 'credentials.ini')
+        with open(os.open(credentials, os.O_WRONLY | os.O_CREAT, 0o600), 'w') as f:
+            for zone in self.zones:
+                f.write('[{0}]\ndns_joker_username = user\ndns_joker_password = pass\n\n'
+                        .format(zone))
+        config = plugin_defaults()
+        config.update(('dns_joker_' + k, v) for k, v in self.options.items())
+        config.update(dns_joker_credentials=credentials,
+                      dns_joker_endpoint=server.endpoint if server else 'memory://',
+                      work_dir=work_dir)
+        return types.SimpleNamespace(**config)
+
+    def _challenges(self, certificate):
+        zone = self.zones[certificate % len(self.zones)]
+        # _Challenge | pylint: disable=protected-access
+        return [fake._Challenge('n{0}.cert{1}.{2}'.format(name, certificate, zone),
+                                'token-{0}-{1}'.format(certificate, name))
+                for name in range(self.names)]
+
+
+def main(argv=None):
+    """The ``certbot-dns-joker-simulate`` command."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    wave = parser.add_argument_group('renewal wave')
+    wave.add_argument('--certificates', type=int, default=100)
+    wave.add_argument('--zones', type=int, default=10)
+    wave.add_argument('--names', type=int, default=2, help='names per certificate')
+    wave.add_argument('--batch-size', type=int, default=1,
+                      help='certificates per perform and cleanup; certbot renew uses 1 '
+                           '(default: %(default)s)')
+    profile = parser.add_argument_group('Joker profile')
+    profile.add_argument('--latency', type=float, default=0.2,
+                         help='seconds per API call (default: %(default)s)')
+    profile.add_argument('--jitter', type=float, default=0.1,
+                         help='random extra seconds per API call (default: %(default)s)')
+    profile.add_argument('--error-rate', type=float, default=0.0,
+                         help='fraction of API calls failing with dnserr')
+    profile.add_argument('--server-rate-limit', type=float, default=0.0,
+                         help='requests per second above which Joker answers 503')
+    profile.add_argument('--seed', type=int, default=0)
+    profile.add_argument('--http', action='store_true',
+                         help='reach the fake over local HTTP instead of in-process')
+    plugin = parser.add_argument_group('plugin options')
+    for name, kind in [('concurrency', int), ('pool-size', int), ('retries', int),
+                       ('retry-backoff', float), ('rate-limit', float),
+                       ('zone-rate-limit', float), ('rate-burst', int),
+                       ('propagation-seconds', int)]:
+        plugin.add_argument('--' + name, type=kind, help='--dns-joker-' + name)
+    parser.add_argument('--output', help='write the JSON report here instead of stdout')
+    args = parser.parse_args(argv)
+    logging.basicConfig(format='%(levelname)s: %(message)s')
+
+    options = {name: getattr(args, name) for name in
+               ['concurrency', 'pool_size', 'retries', 'retry_backoff', 'rate_limit',
+                'zone_rate_limit', 'rate_burst', 'propagation_seconds']
+               if getattr(args, name) is not None}
+    joker = fake.FakeJoker(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                           rate_limit=args.server_rate_limit, seed=args.seed)
+    simulation = Simulation(joker, args.certificates, args.zones, names=args.names,
+                            batch_size=args.batch_size, options=options, http=args.http)
+    report = simulation.run()
+    report['parameters'] = {k: v for k, v in vars(args).items() if k != 'output'}
+    text = json.dumps(report, indent=2, sort_keys=True) + '\n'
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text)
+    else:
+        sys.stdout.write(text)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())  # pragma: no cover
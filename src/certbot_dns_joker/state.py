@@ -0,0 +1,101 @@
+"""Remember the TXT values this plugin last wrote to Joker."""
+import logging
+import os
+import threading
+import time
+
+from certbot_dns_joker import storage
+
+logger = logging.getLogger(__name__)
+
+
+class RecordState(object):
+    """
+    The last value written to each label, kept in a JSON file.
+
+    `_JokerClient` consults it to skip writes that would not change
+    anything: re-adding a value that is already published after a partial
+    failure, or blanking a label that is already blank.  Joker counts such
+    ``nochg`` updates as abuse.
+
+    Labels are kept per ``(endpoint, username, zone)`` key, so that two
+    accounts, or a test and a production endpoint, never share an entry.
+    Every change is merged into the file while it is locked (see
+    `storage.LockedJSON`), so concurrent certbot processes don't undo each
+    other's entries, and the file is read again whenever another process
+    has changed it.  The file is replaced atomically, so a crash never
+    leaves a torn file.  Entries older than `max_age` seconds are dropped:
+    records can be changed outside this plugin, and entries left by a run
+    that crashed half-way can't be trusted forever.
+    """
+
+    def __init__(self, path, max_age, clock=time.time):
+        self.path = path
+        self.max_age = max_age
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._records = None
+        self._stamp = None
+
+    def get(self, key, label):
+        """
+        Return the value last written to `label` under `key`, or None if unknown.
+
+        :param tuple key: ``(endpoint, username, zone)``.
+        """
+        with self._lock:
+            entry = self._load().get(_key(key), {}).get(label)
+            return entry[0] if entry else None
+
+    def set(self, key, label, value):
+        """Record that `value` was written to `label` under `key`."""
+        with self._lock:
+            self._update(key, label, (value, self._clock()))
+
+    def forget(self, key, label):
+        """Forget what `label` under `key` holds, e.g. after a failed write."""
+        with self._lock:
+            self._update(key, label, None)
+
+    def _load(self):
+        stamp = self._file_stamp()
+        if self._records is None or stamp != self._stamp:
+            self._records = self._fresh(storage.load_json(self.path, {}))
+            self._stamp = stamp
+        return self._records
+
+    def _update(self, key, label, entry):
+        with storage.LockedJSON(self.path) as records:
+            fresh = self._fresh(records)
+            labels = fresh.setdefault(_key(key), {})
+            if entry is None:
+                labels.pop(label, None)
+            else:
+                labels[label] = entry
+            fresh = {k: v for k, v in fresh.items() if v}
+            records.clear()
+            records.update(fresh)
+        self._records = fresh
+        self._stamp = self._file_stamp()
+
+    def _fresh(self, records):
+        cutoff = self._clock() - self.max_age
+        fresh = {}
+        for key, labels in records.items():
+            entries = {label: tuple(entry) for label, entry in labels.items()
+                       if entry[1] >= cutoff}
+            if entries:
+                fresh[key] = entries
+        return fresh
+
+    def _file_stamp(self):
+        try:
+            st = os.stat(self.path)
+        except OSError:
+            return None
+        return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+def _key(key):
+    # Endpoints, usernames and zones never contain spaces.
+    return ' '.join(key)
@@ -0,0 +1,101 @@
+"""Small JSON files that the plugin keeps between runs."""
+import json
+import logging
+import os
+import tempfile
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None  # type: ignore
+
+logger = logging.getLogger(__name__)
+
+
+def load_json(path, default):
+    """Return the contents of the JSON file at `path`, or `default` if it is missing or bad."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except (OSError, ValueError) as e:
+        logger.warning('Ignoring unreadable state file %s: %s', path, e)
+        return default
+
+
+def save_json(path, data):
+    """Atomically replace the JSON file at `path` with `data`."""
+    save_text(path, json.dumps(data, sort_keys=True))
+
+
+def save_text(path, text, mode=None):
+    """
+    Atomically replace the file at `path` with `text`.
+
+    The text is written to a temporary file in the same directory, which is
+    then renamed over `path`, so a crash leaves either the old or the new
+    contents but never a partial file.  The file is only readable by its
+    owner unless `mode` says otherwise.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path))
+    try:
+        if mode is not None:
+            os.fchmod(fd, mode)
+        with os.fdopen(fd, 'w') as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+class LockedJSON(dict):
+    """
+    A context manager that holds the JSON file `path` locked while its
+    contents, loaded into this dict, are used, and writes them back on a
+    clean exit.  Processes sharing the file see each other's changes.
+
+    The lock is an ``flock`` on a separate ``.lock`` file, so the data can
+    be written with `save_json`: a crash, even while writing, leaves the
+    old or the new contents.  Unchanged contents are not written back.
+    Where ``flock`` isn't available only the file is shared.
+    """
+
+    def __init__(self, path):
+        super(LockedJSON, self).__init__()
+        self.path = path
+        self._lock_file = None
+        self._loaded = None
+
+    def __enter__(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        fd = os.open(self.path + '.lock', os.O_RDWR | os.O_CREAT, 0o600)
+        self._lock_file = os.fdopen(fd, 'r+')
+        if fcntl is not None:
+            fcntl.flock(self._lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            self.update(load_json(self.path, {}))
+            self._loaded = json.dumps(self, sort_keys=True)
+        except BaseException:
+            self._unlock()
+            raise
+        return self
+
+    def __exit__(self, *exc_info):
+        try:
+            if exc_info[0] is None:
+                text = json.dumps(self, sort_keys=True)
+                if text != self._loaded:
+                    save_text(self.path, text)
+        finally:
+            self._unlock()
+
+    def _unlock(self):
+        # Closing the file releases the lock.
+        self._lock_file.close()
+        self._lock_file = None
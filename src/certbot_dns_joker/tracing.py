@@ -0,0 +1,83 @@
+"""A hook that writes a JSON line for every Joker API call and propagation wait."""
+import json
+import os
+import threading
+import time
+
+from certbot_dns_joker import metrics
+
+
+class Tracer(metrics.Hook):
+    """
+    Appends structured events to `path`, one JSON object per line, so that
+    the log lines of many concurrent renewals can be told apart.
+
+    Every event carries the phase and the correlation IDs of the challenges
+    it belongs to (see `metrics.correlate`), which stay the same through
+    perform, the propagation wait and cleanup.
+
+    Tracing stays off the hot path: events are kept in memory as dicts and
+    only serialized and written, with a single append, when `buffer_size`
+    of them have been collected or the run ends.  With a `sample_rate`
+    below 1 only that fraction of challenges is traced; the choice is made
+    from the correlation ID, so a challenge is traced in every phase or in
+    none.
+    """
+
+    def __init__(self, path, sample_rate=1.0, buffer_size=100, clock=time.time):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.buffer_size = buffer_size
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._buffer = []
+
+    def api_call(self, zone, label, attempt, seconds, status, result, sent=0, received=0):
+        self._emit('api_call', {
+            'zone': zone,
+            'label': label,
+            'attempt': attempt,
+            'seconds': round(seconds, 6),
+            'status': status,
+            'result': result,
+            'bytes_sent': sent,
+            'bytes_received': received,
+        })
+
+    def propagation_wait(self, seconds, verified):
+        self._emit('propagation_wait', {'seconds': round(seconds, 6), 'verified': verified})
+
+    def flush(self):
+        with self._lock:
+            self._flush()
+
+    def _sampled(self, ids):
+        if self.sample_rate >= 1:
+            return True
+        # The IDs are hex digests, so their prefixes are uniformly distributed.
+        return any(int(i[:8], 16) < self.sample_rate * 0x100000000 for i in ids)
+
+    def _emit(self, event, fields):
+        phase, ids = metrics.correlation()
+        if not self._sampled(ids):
+            return
+        fields.update(time=self._clock(), event=event, phase=phase, correlation_ids=list(ids),
+                      pid=os.getpid())
+        with self._lock:
+            self._buffer.append(fields)
+            if len(self._buffer) >= self.buffer_size:
+                self._flush()
+
+    def _flush(self):
+        if not self._buffer:
+            return
+        text = ''.join(json.dumps(event, sort_keys=True) + '\n' for event in self._buffer)
+        self._buffer = []
+        os.makedirs(os.path.dirname(os.path.abspath(self.path)), mode=0o700, exist_ok=True)
+        # One write per flush, so processes tracing to the same file don't
+        # interleave their lines.
+        fd = os.open(self.path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        try:
+            os.write(fd, text.encode('utf-8'))
+        finally:
+            os.close(fd)
@@ -0,0 +1,157 @@
+"""How `_JokerClient` delivers /nic/replace requests."""
+import logging
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class TransportError(Exception):
+    """The request got no response: a connection error or a timeout."""
+
+
+class Transport(object):
+    """
+    Sends /nic/replace form data somewhere and returns the answer.
+
+    `_JokerClient` handles retries, errors and rate limits; a transport
+    only moves one request and its response.
+    """
+
+    def post(self, data, timeout=None):
+        """
+        Send the form `data` and return ``(status, text)``.
+
+        :raises TransportError: If there was no response.
+        """
+        raise NotImplementedError()
+
+    def connection_stats(self):
+        """
+        Return ``(opened, reused)``: the number of connections opened and the
+        number of requests that reused one of them.
+        """
+        return 0, 0
+
+    def close(self):
+        """Release the transport's connections."""
+
+
+class HTTPTransport(Transport):
+    """
+    POSTs to a Joker-compatible HTTP(S) endpoint through a keep-alive
+    `requests.Session` with up to `pool_size` connections.
+    """
+
+    def __init__(self, endpoint, pool_size=None):
+        import requests
+        self.endpoint = endpoint
+        self.session = requests.Session()
+        if pool_size:
+            adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=pool_size)
+            self.session.mount('https://', adapter)
+            self.session.mount('http://', adapter)
+
+    def post(self, data, timeout=None):
+        import requests
+        try:
+            r = self.session.post(self.endpoint, data=data, timeout=timeout)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            raise TransportError(str(e))
+        return r.status_code, r.text
+
+    def connection_stats(self):
+        opened = requests_made = 0
+        for adapter in set(self.session.adapters.values()):
+            poolmanager = getattr(adapter, 'poolmanager', None)
+            if poolmanager is None:
+                continue
+            for key in poolmanager.pools.keys():
+                pool = poolmanager.pools[key]
+                opened += pool.num_connections
+                requests_made += pool.num_requests
+        return opened, max(requests_made - opened, 0)
+
+    def close(self):
+        self.session.close()
+
+
+class HTTP2Transport(Transport):
+    """
+    POSTs through an ``httpx`` client that sends concurrent requests as
+    HTTP/2 streams over a single connection, so one TLS handshake serves a
+    whole batch of updates.
+
+    HTTP/2 is negotiated during the TLS handshake; servers that don't offer
+    it are spoken to over HTTP/1.1 with up to `pool_size` keep-alive
+    connections.  Plain ``http://`` endpoints use HTTP/1.1 unless
+    `prior_knowledge` says the server speaks cleartext HTTP/2, like
+    `certbot_dns_joker.fake.FakeJokerH2Server`.
+
+    This requires the ``http2`` extra (httpx and h2).
+    """
+
+    def __init__(self, endpoint, pool_size=None, prior_knowledge=False):
+        import httpx
+        self.endpoint = endpoint
+        pool_size = pool_size or 10
+        self.client = httpx.Client(
+            http1=not prior_knowledge, http2=True,
+            limits=httpx.Limits(max_connections=pool_size,
+                                max_keepalive_connections=pool_size))
+        self._lock = threading.Lock()
+        self._streams = set()
+        self._requests = 0
+        self.http_versions = {}
+
+    def post(self, data, timeout=None):
+        import httpx
+        try:
+            r = self.client.post(self.endpoint, data=data, timeout=timeout)
+        except httpx.TransportError as e:
+            raise TransportError(str(e) or type(e).__name__)
+        with self._lock:
+            self._requests += 1
+            # Every response on a connection carries that connection's stream.
+            stream = r.extensions.get('network_stream')
+            if stream is not None:
+                self._streams.add(stream)
+            self.http_versions[r.http_version] = self.http_versions.get(r.http_version, 0) + 1
+        return r.status_code, r.text
+
+    def connection_stats(self):
+        with self._lock:
+            return len(self._streams), max(self._requests - len(self._streams), 0)
+
+    def close(self):
+        self.client.close()
+
+
+class MemoryTransport(Transport):
+    """
+    Hands requests straight to a `certbot_dns_joker.fake.FakeJoker` in the
+    same process: no sockets, no HTTP, just the fake's zone state and its
+    latency, error and rate-limit profile.
+    """
+
+    def __init__(self, joker):
+        self.joker = joker
+
+    def post(self, data, timeout=None):
+        return self.joker.respond({key: [str(value)] for key, value in data.items()})
+
+
+def for_endpoint(endpoint, pool_size=None, http2=False):
+    """
+    The default transport factory: HTTP to `endpoint`, over HTTP/2 where
+    possible if `http2` is set and the ``http2`` extra is installed.
+    """
+    if http2:
+        try:
+            import h2  # pylint: disable=unused-import
+            import httpx  # pylint: disable=unused-import
+        except ImportError:
+            logger.warning('HTTP/2 needs the http2 extra (pip install certbot-dns-joker[http2]); '
+                           'using HTTP/1.1')
+        else:
+            return HTTP2Transport(endpoint, pool_size)
+    return HTTPTransport(endpoint, pool_size)
@@ -0,0 +1,111 @@
+"""Find the Joker zone that a DNS name belongs to, and where its CNAMEs lead."""
+import logging
+import threading
+import time
+
+import dns.exception
+import dns.rdatatype
+import dns.resolver
+
+from certbot_dns_joker import storage
+
+logger = logging.getLogger(__name__)
+
+# How long to remember that a name is not a CNAME: a CNAME added later should
+# be followed soon, not only once the whole cache TTL has passed.
+NEGATIVE_TTL = 300
+
+
+def find_zone(name):
+    """
+    Return the zone containing `name` by probing for SOA records with the
+    system resolver, or None if it can't be determined.
+    """
+    try:
+        return dns.resolver.zone_for_name(name).to_text(omit_final_dot=True)
+    except dns.exception.DNSException as e:
+        logger.warning('Unable to find the zone for %s: %s', name, e)
+        return None
+
+
+def follow_cnames(name, max_hops=8):
+    """
+    Return the name at the end of the CNAME chain starting at `name`: `name`
+    itself if it is not a CNAME, or None if the chain can't be looked up.
+    """
+    current = name
+    for _ in range(max_hops):
+        try:
+            answer = dns.resolver.resolve(current, dns.rdatatype.CNAME)
+        except (dns.resolver.NXDOMAIN, dns.resolver.NoAnswer):
+            break
+        except dns.exception.DNSException as e:
+            logger.warning('Unable to look up the CNAME for %s: %s', current, e)
+            return None
+        current = answer[0].target.to_text(omit_final_dot=True)
+    return current
+
+
+class NameCache(object):
+    """
+    A persistent map from DNS names to what `lookup` returns for them.
+
+    Entries are kept in the JSON file `path` for `ttl` seconds, so repeated
+    runs for the same names don't have to query DNS again.  Names for which
+    `lookup` returns None are not remembered, and those it maps to
+    themselves (such as names that are not CNAMEs) only for `negative_ttl`
+    seconds if that is given.  New entries are merged into
+    the file while it is locked, so concurrent certbot processes keep each
+    other's.
+    """
+
+    def __init__(self, path, ttl, lookup, clock=time.time, negative_ttl=None):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._lookup = lookup
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = None
+
+    def get(self, name):
+        """Return ``lookup(name)``, from the cache if possible."""
+        name = name.rstrip('.').lower()
+        with self._lock:
+            if self._entries is None:
+                self._entries = storage.load_json(self.path, {})
+            entry = self._entries.get(name)
+            if entry and entry.get('value') and entry['expires'] > self._clock():
+                return entry['value']
+
+        # Look up outside the lock so that several names can be looked up at once.
+        value = self._lookup(name)
+        if value:
+            logger.debug('%s: %s', name, value)
+            with self._lock:
+                now = self._clock()
+                ttl = self.ttl
+                if value == name and self.negative_ttl is not None:
+                    ttl = min(ttl, self.negative_ttl)
+                entry = {'value': value, 'expires': now + ttl}
+                if ttl > 0:
+                    with storage.LockedJSON(self.path) as stored:
+                        entries = {k: v for k, v in stored.items() if v['expires'] > now}
+                        entries[name] = entry
+                        stored.clear()
+                        stored.update(entries)
+                    self._entries = entries
+                else:
+                    self._entries[name] = entry
+        return value
+
+
+class ZoneCache(NameCache):
+    """A persistent map from DNS names to the zones that contain them."""
+
+    def __init__(self, path, ttl, lookup=find_zone, clock=time.time):
+        super(ZoneCache, self).__init__(path, ttl, lookup, clock)
+
+    def zone_for(self, name):
+        """Return the zone containing `name`, or None if it can't be determined."""
+        return self.get(name)
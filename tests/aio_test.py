@@ -0,0 +1,132 @@
+"""Tests for certbot_dns_joker.aio."""
+
+import asyncio
+import http.server
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+import urllib.parse
+
+try:
+    import aiohttp
+except ImportError:  # pragma: no cover
+    aiohttp = None
+
+from certbot.compat import os
+from certbot.errors import PluginError
+from certbot.plugins.dns_test_common import DOMAIN
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        server = self.server
+        data = urllib.parse.parse_qs(self.rfile.read(int(self.headers['Content-Length'])).decode())
+        with server.lock:
+            server.requests.append(data)
+            server.in_flight += 1
+            server.max_in_flight = max(server.max_in_flight, server.in_flight)
+            status, body = server.responses.pop(0) if server.responses else (200, 'good')
+        time.sleep(0.05)
+        with server.lock:
+            server.in_flight -= 1
+        body = body.encode()
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+@unittest.skipIf(aiohttp is None, 'aiohttp is not installed')
+class AsyncJokerClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self.server.lock = threading.Lock()
+        self.server.requests = []
+        self.server.responses = []
+        self.server.in_flight = self.server.max_in_flight = 0
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+        self.endpoint = 'http://127.0.0.1:{0}/nic/replace'.format(self.server.server_port)
+
+    def _run(self, coro_fn, **kwargs):
+        from certbot_dns_joker.aio import AsyncJokerClient
+        from certbot_dns_joker.dns_joker import RetryPolicy
+
+        async def main():
+            retry = RetryPolicy(attempts=3, backoff=0, jitter=0, timeout=5)
+            async with AsyncJokerClient('user', 'pass', DOMAIN, 60, endpoint=self.endpoint,
+                                        retry=retry, **kwargs) as client:
+                return await coro_fn(client)
+        return asyncio.run(main())
+
+    def test_add_and_del_concurrently(self):
+        names = ['_acme-challenge.host{0}.{1}'.format(i, DOMAIN) for i in range(8)]
+
+        async def run(client):
+            await asyncio.gather(*[client.add_txt_record(DOMAIN, n, 'v') for n in names])
+            await client.del_txt_record(DOMAIN, names[0], 'v')
+        self._run(run, concurrency=3)
+
+        self.assertEqual(9, len(self.server.requests))
+        self.assertEqual(['_acme-challenge.host0'], self.server.requests[-1]['label'])
+        self.assertNotIn('value', self.server.requests[-1])
+        self.assertLessEqual(self.server.max_in_flight, 3)
+        self.assertGreater(self.server.max_in_flight, 1)
+
+    def test_retry_then_fail_fast(self):
+        self.server.responses = [(503, 'busy'), (400, 'dnserr'), (200, 'good'), (400, 'badauth')]
+
+        async def run(client):
+            await client.add_txt_record(DOMAIN, '_acme-challenge.' + DOMAIN, 'v')
+            await client.add_txt_record(DOMAIN, '_acme-challenge.' + DOMAIN, 'v')
+        with self.assertRaises(PluginError) as context:
+            self._run(run)
+        self.assertIn('badauth', str(context.exception))
+        self.assertEqual(4, len(self.server.requests))
+
+    def test_client_made_outside_the_loop(self):
+        from certbot_dns_joker.aio import AsyncJokerClient
+        client = AsyncJokerClient('user', 'pass', DOMAIN, 60, endpoint=self.endpoint,
+                                  concurrency=1)
+        names = ['_acme-challenge.host{0}.{1}'.format(i, DOMAIN) for i in range(3)]
+
+        async def main():
+            async with client:
+                await asyncio.gather(*[client.add_txt_record(DOMAIN, n, 'v') for n in names])
+        asyncio.run(main())
+        self.assertEqual(3, len(self.server.requests))
+        self.assertEqual(1, self.server.max_in_flight)
+
+    def test_state_journal_and_limiter(self):
+        from certbot_dns_joker.journal import Journal
+        from certbot_dns_joker.ratelimit import RateLimiter
+        from certbot_dns_joker.state import RecordState
+        tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tempdir)
+        journal = Journal(os.path.join(tempdir, 'journal.jsonl'))
+        limiter = RateLimiter(os.path.join(tempdir, 'ratelimit.json'), {'zone': (1000, 1)})
+        name = '_acme-challenge.' + DOMAIN
+
+        async def run(client):
+            await client.add_txt_record(DOMAIN, name, 'v')
+            self.assertEqual(['_acme-challenge'], [e.label for e in journal.outstanding()])
+            # Already published, so not written again.
+            await client.add_txt_record(DOMAIN, name, 'v')
+            await client.del_txt_record(DOMAIN, name, 'v')
+        self._run(run, state=RecordState(os.path.join(tempdir, 'records.json'), 60),
+                  journal=journal, limiter=limiter)
+        self.assertEqual(2, len(self.server.requests))
+        self.assertEqual([], journal.outstanding())
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,135 @@
+"""Tests for certbot_dns_joker.batch."""
+
+import types
+import unittest
+import urllib.parse
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+import requests_mock
+
+from certbot.compat import os
+from certbot.plugins import dns_test_common
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+def _achall(domain, validation):
+    achall = mock.MagicMock()
+    achall.identifier.value = domain
+    achall.validation_domain_name.return_value = '_acme-challenge.' + domain
+    achall.validation.return_value = validation
+    return achall
+
+
+@mock.patch('certbot_dns_joker.dns_joker.display_util', mock.MagicMock())
+class BatchRunnerTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(BatchRunnerTest, self).setUp()
+
+        from certbot_dns_joker.dns_joker import Authenticator, JOKER_ENDPOINT
+        from certbot_dns_joker.simulate import plugin_defaults
+
+        path = os.path.join(self.tempdir, 'file.ini')
+        dns_test_common.write({
+            'joker_username': 'fake_username',
+            'joker_password': 'fake_password',
+            'joker_domain': DOMAIN,
+        }, path)
+        config = types.SimpleNamespace(**dict(
+            plugin_defaults('joker_'),
+            joker_credentials=path,
+            joker_propagation_seconds=0,
+            joker_pool_size=2,
+            joker_retries=1,
+            joker_retry_backoff=0,
+            joker_retry_jitter=0,
+            joker_timeout=5,
+            joker_deadline=5,
+            work_dir=self.tempdir))
+        self.auth = Authenticator(config, "joker")
+
+        self.mocker = requests_mock.Mocker()
+        self.endpoint = self.mocker.post(JOKER_ENDPOINT, text='good')
+        self.mocker.start()
+        self.addCleanup(self.mocker.stop)
+
+        self.responded = []
+
+    def _runner(self, **kwargs):
+        from certbot_dns_joker.batch import BatchRunner
+        return BatchRunner(self.auth, lambda achalls, responses:
+                           self.responded.append((achalls, responses)), **kwargs)
+
+    def test_run_batch(self):
+        runner = self._runner()
+        certs = [[_achall(name + DOMAIN, name)] for name in ('a.', 'b.', 'c.')]
+        for cert in certs:
+            runner.submit(cert)
+        with mock.patch.object(self.auth, '_wait_for_propagation') as wait:
+            self.assertEqual(3, runner.run_batch())
+        wait.assert_called_once_with()
+
+        self.assertEqual(certs, [achalls for achalls, _ in self.responded])
+        self.assertEqual(6, self.endpoint.call_count)
+        self.assertEqual(3, runner.certificates)
+        self.assertGreater(runner.certificates_per_minute, 0)
+        self.assertEqual(0, runner.run_batch())
+
+    def test_shared_names_go_in_separate_batches(self):
+        runner = self._runner(max_batch=5)
+        runner.submit([_achall(DOMAIN, 'x')])
+        runner.submit([_achall(DOMAIN, 'y')])
+        runner.submit([_achall('www.' + DOMAIN, 'z')])
+        self.assertEqual(2, runner.run_batch())
+        self.assertEqual(1, runner.run_batch())
+
+    def test_failed_validation_still_cleaned_up(self):
+        from certbot_dns_joker.batch import BatchRunner
+        runner = BatchRunner(self.auth, mock.MagicMock(side_effect=ValueError))
+        runner.submit([_achall(DOMAIN, 'x')])
+        runner.run_batch()
+        self.assertEqual(1, runner.failures)
+        self.assertEqual(2, self.endpoint.call_count)
+        self.assertEqual([['x'], ['']], [urllib.parse.parse_qs(r.text, keep_blank_values=True)['value']
+                                         for r in self.endpoint.request_history])
+
+    def test_failed_certificate_isolated(self):
+        from certbot_dns_joker.dns_joker import JOKER_ENDPOINT
+
+        def reply(request, context):
+            data = urllib.parse.parse_qs(request.text, keep_blank_values=True)
+            if data['label'] == ['_acme-challenge.b'] and data['value'] != ['']:
+                context.status_code = 400
+                return 'badauth'
+            return 'good'
+        endpoint = self.mocker.post(JOKER_ENDPOINT, text=reply)
+        runner = self._runner()
+        certs = [[_achall(name + DOMAIN, name)] for name in ('a.', 'b.', 'c.')]
+        for cert in certs:
+            runner.submit(cert)
+        self.assertEqual(3, runner.run_batch())
+        self.assertEqual((2, 1), (runner.certificates, runner.failures))
+        self.assertEqual([certs[0], certs[2]], [achalls for achalls, _ in self.responded])
+        # Every record that was written was removed again.
+        written = {}
+        for request in endpoint.request_history:
+            data = urllib.parse.parse_qs(request.text, keep_blank_values=True)
+            written[data['label'][0]] = data['value'][0]
+        self.assertEqual({'_acme-challenge.a': '', '_acme-challenge.b': 'b.',
+                          '_acme-challenge.c': ''}, written)
+
+    def test_submit_refuses_several_values_for_one_name(self):
+        from certbot.errors import PluginError
+        runner = self._runner()
+        wildcard = _achall('*.' + DOMAIN, 'b')
+        wildcard.validation_domain_name.return_value = '_acme-challenge.' + DOMAIN
+        with self.assertRaises(PluginError):
+            runner.submit([_achall(DOMAIN, 'a'), wildcard])
+        self.assertEqual(0, runner.run_batch())
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,32 @@
+"""Tests for certbot_dns_joker.credentials."""
+
+import unittest
+
+from certbot.plugins.dns_test_common import DOMAIN
+
+
+class ZoneCredentialsTest(unittest.TestCase):
+
+    def setUp(self):
+        from certbot_dns_joker.credentials import ZoneCredentials
+        self.index = ZoneCredentials()
+        self.index.add(DOMAIN, 'user', 'pass')
+        self.index.add('Sub.' + DOMAIN + '.', 'subuser', 'subpass')
+
+    def test_longest_match(self):
+        self.assertEqual(('sub.' + DOMAIN, 'subuser', 'subpass'),
+                         self.index.lookup('_acme-challenge.www.sub.' + DOMAIN))
+        self.assertEqual((DOMAIN, 'user', 'pass'),
+                         self.index.lookup('_acme-challenge.other.' + DOMAIN + '.'))
+        self.assertEqual((DOMAIN, 'user', 'pass'), self.index.lookup(DOMAIN))
+
+    def test_zones(self):
+        self.assertEqual([DOMAIN, 'sub.' + DOMAIN], self.index.zones())
+
+    def test_no_match(self):
+        self.assertIsNone(self.index.lookup('_acme-challenge.example.org'))
+        self.assertIsNone(self.index.lookup('ub.' + DOMAIN + 'x'))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,44 @@
+"""Tests for certbot_dns_joker.deferred."""
+
+import types
+import unittest
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+def _client(username='user', domain=DOMAIN):
+    return types.SimpleNamespace(endpoint='mock://endpoint', username=username, domain=domain)
+
+
+class DeferredDeletesTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(DeferredDeletesTest, self).setUp()
+        from certbot_dns_joker.deferred import DeferredDeletes
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'deferred.json')
+        self.queue = DeferredDeletes(self.path, clock=lambda: 1000)
+
+    def test_add_merges_values(self):
+        self.queue.add(_client(), '_acme-challenge', ['b'])
+        self.queue.add(_client(), '_acme-challenge', ['a', 'b'])
+        self.queue.add(_client('other'), '_acme-challenge', ['c'])
+        self.assertEqual([('other', ['c']), ('user', ['a', 'b'])],
+                         sorted((e['username'], e['values']) for e in self.queue.entries()))
+
+    def test_done(self):
+        self.queue.add(_client(), '_acme-challenge', ['a'])
+        self.queue.add(_client(), '_acme-challenge.www', ['b'])
+        entry = [e for e in self.queue.entries() if e['label'] == '_acme-challenge'][0]
+        self.queue.done(entry)
+        self.queue.done(entry)
+        self.assertEqual(['_acme-challenge.www'], [e['label'] for e in self.queue.entries()])
+        self.assertEqual(1000, self.queue.entries()[0]['since'])
+
+    def test_empty(self):
+        self.assertEqual([], self.queue.entries())
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -1,5 +1,10 @@
 """Tests for certbot_dns_joker.dns_joker."""
 
+import http.server
+import subprocess
+import sys
+import threading
+import types
 import unittest
 
 try:
@@ -37,8 +42,16 @@ class AuthenticatorTest(test_util.TempDirTestCase,
             'joker_password': FAKE_PASSWORD,
         }, path)
 
-        self.config = mock.MagicMock(joker_credentials=path,
-                                     joker_propagation_seconds=0)  # don't wait during tests
+        from certbot_dns_joker.simulate import plugin_defaults
+        # Every option is set, and misspelt or missing ones raise AttributeError.
+        self.config = types.SimpleNamespace(**dict(
+            plugin_defaults('joker_'),
+            joker_credentials=path,
+            joker_propagation_seconds=0,  # don't wait during tests
+            joker_propagation_interval=1,
+            joker_pool_size=2,
+            joker_zone_cache_ttl=60,
+            work_dir=self.tempdir))
 
         # self.auth = Authenticator(self.config, "certbot_dns_joker:dns_joker")
         self.auth = Authenticator(self.config, "joker")
@@ -64,9 +77,153 @@ class AuthenticatorTest(test_util.TempDirTestCase,
     #     ]
     #     self.assertEqual(expected, self.mock_client.mock_calls)
 
-    def test_cleanup(self):
-        # _attempt_cleanup | pylint: disable=protected-access
-        self.auth._attempt_cleanup = True
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_propagation_check(self, unused_display_util):
+        from certbot_dns_joker.propagation import PropagationChecker
+        self.config.joker_propagation_check = True
+        self.mock_client.domain = DOMAIN
+        with mock.patch.object(PropagationChecker, 'wait', return_value=True) as wait:
+            self.auth.perform([self.achall])
+
+        validation = self.achall.validation(self.achall.account_key)
+        wait.assert_called_once_with({(DOMAIN, "_acme-challenge." + DOMAIN): {validation}}, 0)
+
+    @mock.patch('certbot_dns_joker.dns_joker.time.sleep')
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_adaptive_propagation(self, unused_display_util, sleep):
+        from certbot_dns_joker.history import PropagationHistory
+        from certbot_dns_joker.propagation import PropagationChecker
+        history = PropagationHistory(os.path.join(self.tempdir, 'dns-joker', 'propagation.json'))
+        history.record({DOMAIN: 2.5})
+        self.config.joker_adaptive_propagation = True
+        self.config.joker_propagation_seconds = 100
+        self.mock_client.domain = DOMAIN
+
+        with mock.patch.object(PropagationChecker, 'wait', autospec=True) as patched:
+            patched.side_effect = lambda self, records, max_wait: (
+                setattr(self, 'visible_after', {DOMAIN: 1.5}) or True)
+            # Too little history: the full delay is the bound, but polling learns.
+            for _ in range(4):
+                self.auth.perform([self.achall])
+            self.assertEqual(100, patched.call_args[0][2])
+            self.auth.perform([self.achall])
+            # 2.5 rounded up plus the polling interval.
+            self.assertEqual(4, patched.call_args[0][2])
+        self.assertEqual(1.5, PropagationHistory(history.path).estimate(DOMAIN, 50))
+        self.assertTrue(sleep.called)
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_concurrent(self, unused_display_util):
+        # Both labels must be in add_txt_record at the same time to pass the barrier.
+        barrier = threading.Barrier(2, timeout=5)
+        calls = []
+
+        def add_txt_record(domain, validation_name, validation):
+            barrier.wait()
+            calls.append((validation_name, validation))
+        self.mock_client.add_txt_record.side_effect = add_txt_record
+
+        self.auth.perform([
+            _achall(DOMAIN, 'first'),
+            _achall('www.' + DOMAIN, 'second'),
+        ])
+
+        self.assertEqual([('_acme-challenge.' + DOMAIN, 'first'),
+                          ('_acme-challenge.www.' + DOMAIN, 'second')], sorted(calls))
+
+    def test_get_joker_client_is_cached(self):
+        from certbot_dns_joker.dns_joker import Authenticator
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+        client = Authenticator._get_joker_client(self.auth, DOMAIN)
+        self.assertIs(client, Authenticator._get_joker_client(self.auth, DOMAIN))
+        self.assertIsNot(client, Authenticator._get_joker_client(self.auth, 'other.' + DOMAIN))
+
+        with mock.patch.object(client, 'close') as close:
+            self.auth.cleanup([])
+        close.assert_not_called()
+        # The next run gets a new client with the same warm transport.
+        self.assertIsNot(client, Authenticator._get_joker_client(self.auth, DOMAIN))
+        self.assertIs(client.transport,
+                      Authenticator._get_joker_client(self.auth, DOMAIN).transport)
+
+    def test_credentials_shared_between_authenticators(self):
+        from certbot_dns_joker.dns_joker import Authenticator
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+        other = Authenticator(self.config, "joker")
+        with mock.patch.object(other, '_configure_credentials') as configure, \
+                mock.patch('certbot_dns_joker.dns_joker.dns_common.validate_file_permissions') \
+                as validate:
+            other._setup_credentials()
+        configure.assert_not_called()
+        self.assertIs(self.auth.credentials, other.credentials)
+        # The permissions are still checked every time.
+        validate.assert_called_once_with(os.path.abspath(self.config.joker_credentials))
+
+        # Changing the file invalidates what was parsed from it.
+        dns_test_common.write({'joker_username': 'new', 'joker_password': 'new'},
+                              self.config.joker_credentials)
+        other._setup_credentials()
+        self.assertEqual('new', other.credentials.conf('username'))
+
+    def test_transports_keyed_by_settings(self):
+        from certbot_dns_joker import registry
+        from certbot_dns_joker.dns_joker import Authenticator
+        self.addCleanup(registry.REGISTRY.close)
+        auth = Authenticator(self.config, "joker")
+        auth.transport_factory = lambda endpoint, pool_size: mock.MagicMock(pool_size=pool_size)
+        # _transport | pylint: disable=protected-access
+        first = auth._transport(FAKE_USERNAME, DOMAIN)
+        self.assertIs(first, auth._transport(FAKE_USERNAME, DOMAIN))
+        self.config.joker_pool_size = 20
+        self.assertEqual(20, auth._transport(FAKE_USERNAME, DOMAIN).pool_size)
+        self.config.joker_http2 = True
+        self.assertIsNot(first, auth._transport(FAKE_USERNAME, DOMAIN))
+
+    def test_get_joker_client_detects_zone(self):
+        from certbot_dns_joker.dns_joker import Authenticator
+        from certbot_dns_joker.zones import ZoneCache
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+        with mock.patch.object(ZoneCache, 'zone_for', return_value=DOMAIN) as zone_for:
+            client = Authenticator._get_joker_client(
+                self.auth, 'sub.' + DOMAIN, '_acme-challenge.sub.' + DOMAIN)
+        zone_for.assert_called_once_with('_acme-challenge.sub.' + DOMAIN)
+        self.assertEqual(DOMAIN, client.domain)
+
+    def _write_zone_credentials(self, zones):
+        path = os.path.join(self.tempdir, 'zones.ini')
+        dns_test_common.write(dict(
+            (zone, {'joker_username': username, 'joker_password': password})
+            for zone, (username, password) in zones.items()), path)
+        self.config.joker_credentials = path
+
+    def test_get_joker_client_zone_credentials(self):
+        from certbot_dns_joker.dns_joker import Authenticator
+        self._write_zone_credentials({DOMAIN: ('user', 'pass'),
+                                      'sub.' + DOMAIN: ('subuser', 'subpass')})
+        # _setup_credentials | pylint: disable=protected-access
+        self.auth._setup_credentials()
+        client = Authenticator._get_joker_client(
+            self.auth, 'www.sub.' + DOMAIN, '_acme-challenge.www.sub.' + DOMAIN)
+        self.assertEqual(('sub.' + DOMAIN, 'subuser', 'subpass'),
+                         (client.domain, client.username, client.password))
+
+        with self.assertRaises(PluginError):
+            Authenticator._get_joker_client(self.auth, 'example.org', '_acme-challenge.example.org')
+
+    def test_zone_credentials_missing_password(self):
+        self._write_zone_credentials({DOMAIN: ('user', '')})
+        with self.assertRaises(PluginError):
+            # _setup_credentials | pylint: disable=protected-access
+            self.auth._setup_credentials()
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_cleanup(self, unused_display_util):
+        self.mock_client.domain = DOMAIN
+        self.auth.perform([self.achall])
+        self.mock_client.reset_mock()
         self.auth.cleanup([self.achall])
 
         expected = [
@@ -76,13 +233,333 @@ class AuthenticatorTest(test_util.TempDirTestCase,
         ]
         self.assertEqual(expected, self.mock_client.mock_calls)
 
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_cleanup_coalesced(self, unused_display_util):
+        self.mock_client.domain = DOMAIN
+        achalls = [_achall(DOMAIN, 'a'), _achall(DOMAIN, 'a')]
+        self.auth.perform(achalls)
+        self.assertEqual(1, self.mock_client.add_txt_record.call_count)
+
+        self.auth.cleanup(achalls + [_achall('other.' + DOMAIN, 'c')])
+        self.mock_client.del_txt_record.assert_called_once_with(
+            DOMAIN, "_acme-challenge." + DOMAIN, 'a')
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_several_values_for_one_name(self, unused_display_util):
+        wildcard = _achall('*.' + DOMAIN, 'b')
+        wildcard.validation_domain_name.return_value = '_acme-challenge.' + DOMAIN
+        achalls = [_achall(DOMAIN, 'a'), wildcard]
+        with self.assertLogs('certbot_dns_joker.dns_joker', 'WARNING') as logs:
+            self.assertEqual(2, len(self.auth.perform(achalls)))
+        self.assertIn('_acme-challenge.{0} needs 2 values at once (for *.{0}, {0})'
+                      .format(DOMAIN), logs.output[0])
+        self.mock_client.add_txt_record.assert_called_once_with(
+            DOMAIN, '_acme-challenge.' + DOMAIN, 'a')
+        self.auth.cleanup(achalls)
+        self.mock_client.del_txt_record.assert_called_once_with(
+            DOMAIN, '_acme-challenge.' + DOMAIN, 'a')
+
+    def _preflight_clients(self, failing=(), password='pass'):
+        def get_client(zone):
+            client = mock.MagicMock(domain=zone, username='user', password=password,
+                                    endpoint=MOCK_ENDPOINT)
+            if zone in failing:
+                client.check_credentials.side_effect = PluginError('badauth')
+            clients.append(client)
+            return client
+        clients = []
+        self.auth._get_joker_client.side_effect = get_client
+        return clients
+
+    def test_preflight(self):
+        self._write_zone_credentials({DOMAIN: ('user', 'pass'), 'example.org': ('user', 'pass')})
+        self.config.joker_preflight = True
+        clients = self._preflight_clients()
+        self.auth.prepare()
+        self.assertEqual([DOMAIN, 'example.org'], sorted(c.domain for c in clients))
+        for client in clients:
+            client.check_credentials.assert_called_once_with()
+
+        # Passing credentials are remembered.
+        del clients[:]
+        self.auth.prepare()
+        for client in clients:
+            client.check_credentials.assert_not_called()
+
+    def test_preflight_cache_keys(self):
+        import hashlib
+        from certbot.compat import filesystem
+        self._write_zone_credentials({DOMAIN: ('user', 'pass')})
+        self.config.joker_preflight = True
+        clients = self._preflight_clients()
+        self.auth.prepare()
+        directory = os.path.join(self.config.work_dir, 'dns-joker')
+        with open(os.path.join(directory, 'preflight.json')) as f:
+            cached = f.read()
+        material = '\0'.join([MOCK_ENDPOINT, DOMAIN, 'user', 'pass']).encode('utf-8')
+        self.assertNotIn(hashlib.sha256(material).hexdigest(), cached)
+        self.assertTrue(filesystem.check_mode(os.path.join(directory, 'preflight.key'), 0o600))
+
+        # A new password is checked again.
+        clients = self._preflight_clients(password='new')
+        self.auth.prepare()
+        clients[0].check_credentials.assert_called_once_with()
+
+    def test_preflight_cache_merged(self):
+        from certbot_dns_joker.preflight import PreflightCache
+        path = os.path.join(self.tempdir, 'preflight.json')
+        first, second = PreflightCache(path, 60), PreflightCache(path, 60)
+        clients = [mock.MagicMock(endpoint=MOCK_ENDPOINT, domain=zone, username='user',
+                                  password='pass') for zone in (DOMAIN, 'example.org')]
+        first.add(clients[0])
+        second.add(clients[1])
+        self.assertTrue(all(PreflightCache(path, 60).passed(c) for c in clients))
+
+    def test_preflight_failure(self):
+        self._write_zone_credentials({DOMAIN: ('user', 'pass'), 'example.org': ('user', 'pass')})
+        self.config.joker_preflight = True
+        clients = self._preflight_clients(failing=['example.org'])
+        with self.assertRaises(PluginError) as cm:
+            self.auth.prepare()
+        self.assertIn('example.org: badauth', str(cm.exception))
+        self.assertNotIn(DOMAIN + ':', str(cm.exception))
+
+        # Failures are not remembered.
+        del clients[:]
+        with self.assertRaises(PluginError):
+            self.auth.prepare()
+        self.assertEqual(['example.org'], [c.domain for c in clients
+                                           if c.check_credentials.called])
+
+    def test_preflight_disabled(self):
+        self.auth.prepare()
+        self.auth._get_joker_client.assert_not_called()
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_cleanup_follow_cnames(self, unused_display_util):
+        targets = {'_acme-challenge.' + DOMAIN: 'a.challenges.example.net',
+                   '_acme-challenge.www.' + DOMAIN: 'b.challenges.example.net'}
+        self.config.joker_follow_cnames = True
+        self.mock_client.domain = 'challenges.example.net'
+        achalls = [_achall(DOMAIN, 'x'), _achall('www.' + DOMAIN, 'y'),
+                   _achall('other.' + DOMAIN, 'z')]
+        with mock.patch('certbot_dns_joker.zones.follow_cnames',
+                        side_effect=lambda name: targets.get(name, name)) as find:
+            self.auth.perform(achalls)
+            self.auth.cleanup(achalls)
+        # Each name is resolved once.
+        self.assertEqual(3, find.call_count)
+        self.assertEqual(sorted([
+            mock.call(DOMAIN, 'a.challenges.example.net', 'x'),
+            mock.call('www.' + DOMAIN, 'b.challenges.example.net', 'y'),
+            mock.call('other.' + DOMAIN, '_acme-challenge.other.' + DOMAIN, 'z'),
+        ]), sorted(self.mock_client.add_txt_record.call_args_list))
+        self.assertEqual(
+            {'a.challenges.example.net', 'b.challenges.example.net',
+             '_acme-challenge.other.' + DOMAIN},
+            {c[0][1] for c in self.mock_client.del_txt_record.call_args_list})
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_follow_cnames_cached_across_runs(self, unused_display_util):
+        from certbot_dns_joker.dns_joker import Authenticator
+        self.config.joker_follow_cnames = True
+        self.mock_client.domain = DOMAIN
+        with mock.patch('certbot_dns_joker.zones.follow_cnames',
+                        side_effect=lambda name: name) as find:
+            self.auth.perform([self.achall])
+            auth = Authenticator(self.config, "joker")
+            auth._get_joker_client = self.auth._get_joker_client  # pylint: disable=protected-access
+            auth.perform([self.achall])
+        # That the name isn't a CNAME is remembered too.
+        self.assertEqual(1, find.call_count)
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_follow_cnames_looked_up_per_perform(self, unused_display_util):
+        self.config.joker_follow_cnames = True
+        cache = mock.MagicMock()
+        cache.get.side_effect = ['a.challenges.example.net', 'b.challenges.example.net']
+        with mock.patch.object(self.auth, '_cname_cache', return_value=cache):
+            self.auth.perform([self.achall])
+            self.auth.cleanup([self.achall])
+            self.auth.perform([self.achall])
+        self.assertEqual(['a.challenges.example.net', 'b.challenges.example.net'],
+                         [c[0][1] for c in self.mock_client.add_txt_record.call_args_list])
+        self.assertEqual(['a.challenges.example.net'],
+                         [c[0][1] for c in self.mock_client.del_txt_record.call_args_list])
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_follow_cnames_shared_target(self, unused_display_util):
+        self.config.joker_follow_cnames = True
+        target = 'shared.challenges.example.net'
+        with mock.patch('certbot_dns_joker.zones.follow_cnames', return_value=target):
+            # One value for both names is fine...
+            self.auth.perform([_achall(DOMAIN, 'x'), _achall('www.' + DOMAIN, 'x')])
+            # ...but different values can't share the target.
+            with self.assertRaises(PluginError) as cm:
+                self.auth.perform([_achall(DOMAIN, 'x'), _achall('www.' + DOMAIN, 'y')])
+        self.assertIn('_acme-challenge.{0}, _acme-challenge.www.{0} are all CNAMEs to {1}'
+                      .format(DOMAIN, target), str(cm.exception))
+        self.assertEqual(1, self.mock_client.add_txt_record.call_count)
+
+    def _deferring_client(self):
+        self.mock_client.configure_mock(endpoint=MOCK_ENDPOINT, username=FAKE_USERNAME,
+                                        domain=DOMAIN)
+        self.mock_client.label.return_value = '_acme-challenge'
+        # _deferred | pylint: disable=protected-access
+        return self.auth._deferred()
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_cleanup_defers_failed_delete(self, unused_display_util):
+        queue = self._deferring_client()
+        self.mock_client.del_txt_record.side_effect = PluginError('dnserr')
+        self.auth.perform([self.achall])
+        self.auth.cleanup([self.achall])
+        self.assertEqual([(DOMAIN, '_acme-challenge', [self.achall.validation(self.achall.account_key)])],
+                         [(e['zone'], e['label'], e['values']) for e in queue.entries()])
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_cleanup_deadline(self, unused_display_util):
+        queue = self._deferring_client()
+        self.config.joker_cleanup_deadline = 0.1
+        release = threading.Event()
+        daemon = []
+        def hang(*args):
+            daemon.append(threading.current_thread().daemon)
+            release.wait(5)
+        self.mock_client.del_txt_record.side_effect = hang
+        self.auth.perform([self.achall])
+        try:
+            self.auth.cleanup([self.achall])
+            self.assertEqual(1, len(queue.entries()))
+            # certbot won't wait for the hanging removal when it exits.
+            self.assertEqual([True], daemon)
+        finally:
+            release.set()
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_drains_deferred(self, unused_display_util):
+        queue = self._deferring_client()
+        # _journal | pylint: disable=protected-access
+        self.auth._journal().publish(self.mock_client, '_acme-challenge', 'old')
+        self.auth._journal().publish(self.mock_client, '_acme-challenge.www', 'newer')
+        queue.add(self.mock_client, '_acme-challenge', ['old'])
+        queue.add(self.mock_client, '_acme-challenge.www', ['old'])
+        queue.add(self.mock_client, '_acme-challenge.gone', ['old'])
+
+        self.auth.perform([_achall('other.' + DOMAIN, 'new')])
+        # Only the record still holding the deferred value is blanked.
+        self.mock_client.del_txt_record.assert_called_once_with(
+            DOMAIN, '_acme-challenge.' + DOMAIN, None)
+        self.assertEqual([], queue.entries())
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_drops_deferred_for_rewritten_labels(self, unused_display_util):
+        queue = self._deferring_client()
+        # _journal | pylint: disable=protected-access
+        self.auth._journal().publish(self.mock_client, '_acme-challenge', 'old')
+        queue.add(self.mock_client, '_acme-challenge', ['old'])
+        self.auth.perform([self.achall])
+        # The label is about to be written again, so it isn't blanked first.
+        self.mock_client.del_txt_record.assert_not_called()
+        self.assertEqual([], queue.entries())
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_perform_keeps_failed_deferred(self, unused_display_util):
+        queue = self._deferring_client()
+        self.mock_client.del_txt_record.side_effect = PluginError('dnserr')
+        # _journal | pylint: disable=protected-access
+        self.auth._journal().publish(self.mock_client, '_acme-challenge', 'old')
+        queue.add(self.mock_client, '_acme-challenge', ['old'])
+        self.auth.perform([_achall('www.' + DOMAIN, 'new')])
+        self.assertEqual(1, len(queue.entries()))
+        self.mock_client.add_txt_record.assert_called_once_with(
+            'www.' + DOMAIN, '_acme-challenge.www.' + DOMAIN, 'new')
+
+    @mock.patch('certbot_dns_joker.dns_joker.display_util')
+    def test_correlation(self, unused_display_util):
+        from certbot_dns_joker import metrics
+        self.mock_client.domain = DOMAIN
+        phases = []
+        self.mock_client.add_txt_record.side_effect = \
+            lambda *args: phases.append(metrics.correlation())
+        self.mock_client.del_txt_record.side_effect = \
+            lambda *args: phases.append(metrics.correlation())
+        self.auth.hook = mock.MagicMock()
+        self.auth.hook.propagation_wait.side_effect = \
+            lambda *args: phases.append(metrics.correlation())
+        self.config.joker_concurrency = 1
+        achalls = [_achall(DOMAIN, 'a'), _achall(DOMAIN, 'a'), _achall('www.' + DOMAIN, 'b')]
+        self.auth.perform(achalls)
+        self.auth.cleanup(achalls)
+
+        a = metrics.correlation_id('_acme-challenge.' + DOMAIN, 'a')
+        b = metrics.correlation_id('_acme-challenge.www.' + DOMAIN, 'b')
+        self.assertEqual([('perform', (a,)), ('perform', (b,)),
+                          ('propagation', tuple(sorted([a, b]))),
+                          ('cleanup', (a,)), ('cleanup', (b,))], phases)
+        self.auth.hook.flush.assert_called_once_with()
+
+    def test_trace_file(self):
+        from certbot_dns_joker.dns_joker import Authenticator
+        from certbot_dns_joker.tracing import Tracer
+        self.config.joker_trace_file = os.path.join(self.tempdir, 'trace.jsonl')
+        self.assertIsInstance(Authenticator(self.config, "joker").hook, Tracer)
+        self.config.joker_metrics_file = os.path.join(self.tempdir, 'metrics.json')
+        self.assertEqual(2, len(Authenticator(self.config, "joker").hook.hooks))
+
+    def test_metrics_file_shared_by_lineages(self):
+        import json
+        from certbot_dns_joker import registry
+        from certbot_dns_joker.dns_joker import Authenticator
+        self.addCleanup(registry.REGISTRY.close)
+        path = os.path.join(self.tempdir, 'metrics.json')
+        self.config.joker_metrics_file = path
+        for domain in (DOMAIN, 'example.org'):
+            auth = Authenticator(self.config, "joker")
+            auth.hook.api_call(domain, '_acme-challenge', 1, 0.1, 200, 'good')
+            auth.hook.flush()
+        with open(path) as f:
+            self.assertEqual({'good': 2}, json.load(f)['api_results'])
+
+    def test_cleanup_without_perform(self):
+        # _attempt_cleanup | pylint: disable=protected-access
+        self.auth._attempt_cleanup = True
+        self.auth.cleanup([self.achall])
+        self.assertEqual([], self.mock_client.mock_calls)
+
+
+def _achall(domain, validation):
+    achall = mock.MagicMock()
+    achall.identifier.value = domain
+    achall.validation_domain_name.return_value = '_acme-challenge.' + domain
+    achall.validation.return_value = validation
+    return achall
+
+
+class ImportTest(unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        # Certbot imports every plugin on every run; a fresh interpreter is
+        # needed because the other tests have imported everything already.
+        code = ('import sys, certbot.plugins.dns_common\n'
+                'import certbot_dns_joker.dns_joker\n'
+                'print(" ".join(sorted(sys.modules)))\n')
+        modules = subprocess.run([sys.executable, '-c', code], check=True,
+                                 stdout=subprocess.PIPE, universal_newlines=True,
+                                 env=dict(os.environ, PYTHONPATH=os.pathsep.join(sys.path))
+                                 ).stdout.split()
+        for module in ['dns.resolver', 'certbot_dns_joker.propagation',
+                       'certbot_dns_joker.zones', 'certbot_dns_joker.state']:
+            self.assertNotIn(module, modules)
 
-class JokerClientTest(unittest.TestCase):
+
+class JokerClientTest(test_util.TempDirTestCase):
     record_name = "_acme-challenge." + DOMAIN
     record_content = "bar"
     record_ttl = 42
 
     def setUp(self):
+        super(JokerClientTest, self).setUp()
         from certbot_dns_joker.dns_joker import _JokerClient
 
         self.client = _JokerClient(FAKE_USERNAME, FAKE_PASSWORD, DOMAIN,
@@ -156,6 +633,150 @@ class JokerClientTest(unittest.TestCase):
             DOMAIN, self.record_name, self.record_content
         )
 
+    def _retrying_client(self, attempts=3, deadline=None):
+        from certbot_dns_joker.dns_joker import RetryPolicy
+        self.sleeps = []
+        self.client.retry = RetryPolicy(attempts=attempts, backoff=1, jitter=0,
+                                        deadline=deadline, sleep=self.sleeps.append)
+
+    def test_add_txt_record_retries_transient_errors(self):
+        self._retrying_client()
+        self.adapter.register_uri(requests_mock.ANY, MOCK_ENDPOINT, [
+            {'exc': requests.exceptions.ConnectTimeout},
+            {'text': 'dnserr', 'status_code': 400},
+            {'text': 'good'},
+        ])
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual([1, 2], self.sleeps)
+
+    def test_add_txt_record_retries_exhausted(self):
+        self._retrying_client(attempts=2)
+        self.adapter.register_uri(requests_mock.ANY, MOCK_ENDPOINT,
+                                  text='Service Unavailable', status_code=503)
+        with self.assertRaises(PluginError):
+            self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual([1], self.sleeps)
+
+    def test_add_txt_record_deadline(self):
+        self._retrying_client(attempts=5, deadline=2)
+        self.adapter.register_uri(requests_mock.ANY, MOCK_ENDPOINT,
+                                  text='Service Unavailable', status_code=503)
+        with self.assertRaises(PluginError):
+            self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual([1], self.sleeps)
+
+    def test_add_txt_record_reports_attempts_to_hook(self):
+        self._retrying_client()
+        self.client.hook = mock.MagicMock()
+        self.adapter.register_uri(requests_mock.ANY, MOCK_ENDPOINT, [
+            {'exc': requests.exceptions.ConnectionError},
+            {'text': 'dnserr', 'status_code': 400},
+            {'text': 'good'},
+        ])
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        label = '_acme-challenge'
+        size = len(urllib.parse.urlencode(
+            self.client._request_data(self.record_name, self.record_content)[1]))
+        self.assertEqual([
+            mock.call.api_call(DOMAIN, label, 1, mock.ANY, None, 'connection-error',
+                               sent=size, received=0),
+            mock.call.api_call(DOMAIN, label, 2, mock.ANY, 400, 'dnserr',
+                               sent=size, received=6),
+            mock.call.api_call(DOMAIN, label, 3, mock.ANY, 200, 'good',
+                               sent=size, received=4),
+        ], self.client.hook.mock_calls)
+
+    def test_unchanged_records_not_rewritten(self):
+        from certbot_dns_joker.state import RecordState
+        self.client.state = RecordState(os.path.join(self.tempdir, 'records.json'), 60)
+        self.adapter.register_uri(requests_mock.ANY, MOCK_ENDPOINT, [
+            {'text': 'good'}, {'text': 'good'}, {'text': 'dnserr', 'status_code': 400},
+            {'text': 'good'}])
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.client.del_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.client.del_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual(2, self.adapter.call_count)
+
+        # A failed write leaves the record's contents unknown.
+        with self.assertRaises(PluginError):
+            self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual(4, self.adapter.call_count)
+
+    def test_journal(self):
+        from certbot_dns_joker.journal import Journal
+        self.client.journal = Journal(os.path.join(self.tempdir, 'journal.jsonl'))
+        self._register_response('dnserr')
+        with self.assertRaises(PluginError):
+            self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        # A value is journaled even if writing it fails.
+        self.assertEqual([('_acme-challenge', self.record_content)],
+                         [(e.label, e.value) for e in self.client.journal.outstanding()])
+
+        self._register_response()
+        self.client.del_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual([], self.client.journal.outstanding())
+
+    def test_check_credentials(self):
+        from certbot_dns_joker.dns_joker import PREFLIGHT_LABEL
+        from certbot_dns_joker.state import RecordState
+        self.client.state = RecordState(os.path.join(self.tempdir, 'records.json'), 60)
+        self.client.state.set((MOCK_ENDPOINT, FAKE_USERNAME, DOMAIN), PREFLIGHT_LABEL, '')
+        self._register_response()
+        self.client.check_credentials()
+        data = urllib.parse.parse_qs(self.adapter.last_request.text, keep_blank_values=True)
+        self.assertEqual(([PREFLIGHT_LABEL], ['']), (data['label'], data['value']))
+
+    def test_check_credentials_fails(self):
+        self._register_response('badauth')
+        with self.assertRaises(PluginError):
+            self.client.check_credentials()
+
+    def test_add_txt_record_fails_fast(self):
+        self._retrying_client()
+        for code in ('badauth', 'nohost', '!yours'):
+            self._register_response(response=code)
+            with self.assertRaises(PluginError):
+                self.client.add_txt_record(DOMAIN, self.record_name, self.record_content)
+        self.assertEqual([], self.sleeps)
+
+
+class _JokerHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):  # pylint: disable=invalid-name
+        self.rfile.read(int(self.headers['Content-Length']))
+        body = b'good'
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):  # pylint: disable=arguments-differ
+        pass
+
+
+class JokerClientConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        from certbot_dns_joker.dns_joker import _JokerClient
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _JokerHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        endpoint = 'http://127.0.0.1:{0}/nic/replace'.format(self.server.server_port)
+        self.client = _JokerClient(FAKE_USERNAME, FAKE_PASSWORD, DOMAIN, 42,
+                                   endpoint=endpoint, pool_size=2)
+        self.addCleanup(self.client.close)
+
+    def test_connection_reused(self):
+        for _ in range(3):
+            self.client.add_txt_record(DOMAIN, "_acme-challenge." + DOMAIN, "bar")
+        self.assertEqual((1, 2), self.client.connection_stats())
+
 
 if __name__ == "__main__":
     unittest.main()  # pragma: no cover
@@ -0,0 +1,77 @@
+"""Tests for certbot_dns_joker.fake."""
+
+import unittest
+
+from certbot.errors import PluginError
+from certbot.plugins.dns_test_common import DOMAIN
+
+RECORD_NAME = '_acme-challenge.' + DOMAIN
+
+
+class FakeJokerTest(unittest.TestCase):
+
+    def setUp(self):
+        from certbot_dns_joker.fake import FakeJoker
+        self.joker = FakeJoker(accounts={'user': ('pass', {DOMAIN})})
+
+    def _client(self, password='pass', domain=DOMAIN, joker=None):
+        from certbot_dns_joker.dns_joker import _JokerClient
+        from certbot_dns_joker.transport import MemoryTransport
+        return _JokerClient('user', password, domain, 60,
+                            transport=MemoryTransport(joker or self.joker))
+
+    def test_zone_state(self):
+        client = self._client()
+        client.add_txt_record(DOMAIN, RECORD_NAME, 'a')
+        client.add_txt_record(DOMAIN, '_acme-challenge.www.' + DOMAIN, 'b')
+        self.assertEqual(['a'], self.joker.txt(RECORD_NAME + '.'))
+        client.del_txt_record(DOMAIN, RECORD_NAME, 'a')
+        self.assertEqual([], self.joker.txt(RECORD_NAME))
+        self.assertEqual(3, self.joker.requests)
+
+    def test_accounts(self):
+        with self.assertRaises(PluginError) as cm:
+            self._client(password='wrong').add_txt_record(DOMAIN, RECORD_NAME, 'a')
+        self.assertIn('badauth', str(cm.exception))
+        with self.assertRaises(PluginError) as cm:
+            self._client(domain='example.org').add_txt_record(
+                'example.org', '_acme-challenge.example.org', 'a')
+        self.assertIn('nohost', str(cm.exception))
+
+    def test_rate_limit(self):
+        from certbot_dns_joker.fake import FakeJoker
+        joker = FakeJoker(rate_limit=1)
+        self.assertEqual((200, 'good'), joker.respond({'zone': [DOMAIN], 'label': ['a']}))
+        self.assertEqual(503, joker.respond({'zone': [DOMAIN], 'label': ['a']})[0])
+        self.assertEqual(1, joker.rate_limited)
+
+
+class FakeServersTest(unittest.TestCase):
+
+    def setUp(self):
+        from certbot_dns_joker.fake import FakeDNSServer, FakeJokerServer
+        self.server = FakeJokerServer(accounts={'user': ('pass', {DOMAIN})}).start()
+        self.addCleanup(self.server.stop)
+        self.dns = FakeDNSServer(self.server.joker).start()
+        self.addCleanup(self.dns.stop)
+
+    def test_http_and_dns(self):
+        from certbot_dns_joker.dns_joker import _JokerClient
+        from certbot_dns_joker.propagation import PropagationChecker
+        client = _JokerClient('user', 'pass', DOMAIN, 60, endpoint=self.server.endpoint)
+        self.addCleanup(client.close)
+        client.add_txt_record(DOMAIN, RECORD_NAME, 'token')
+
+        checker = PropagationChecker(nameservers=[self.dns.address], query_timeout=1)
+        self.assertTrue(checker.wait({(DOMAIN, RECORD_NAME): {'token'}}, 0))
+        self.assertEqual((1, 0), client.connection_stats())
+
+    def test_dns_refuses_other_zones(self):
+        import dns.message
+        import dns.rcode
+        query = dns.message.make_query('_acme-challenge.example.org', 'TXT')
+        self.assertEqual(dns.rcode.REFUSED, self.dns.answer(query).rcode())
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
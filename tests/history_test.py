@@ -0,0 +1,57 @@
+"""Tests for certbot_dns_joker.history."""
+
+import unittest
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+class PropagationHistoryTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(PropagationHistoryTest, self).setUp()
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'propagation.json')
+        self.now = 1000000
+
+    def _history(self):
+        from certbot_dns_joker.history import PropagationHistory
+        return PropagationHistory(self.path, clock=lambda: self.now)
+
+    def test_estimate(self):
+        history = self._history()
+        for seconds in [10, 2, 3, 4]:
+            history.record({DOMAIN: seconds, 'example.org': 1})
+        self.assertIsNone(history.estimate(DOMAIN, 95))
+        history.record({DOMAIN: 5})
+
+        reloaded = self._history()
+        self.assertEqual(10, reloaded.estimate(DOMAIN, 95))
+        self.assertEqual(4, reloaded.estimate(DOMAIN, 60))
+        self.assertEqual(2, reloaded.estimate(DOMAIN, 0))
+        self.assertIsNone(reloaded.estimate('example.org', 95))
+
+    def test_old_and_excess_samples_dropped(self):
+        from certbot_dns_joker.history import MAX_AGE, MAX_SAMPLES
+        history = self._history()
+        history.record({DOMAIN: 100})
+        self.now += MAX_AGE + 1
+        history = self._history()
+        for _ in range(MAX_SAMPLES):
+            history.record({DOMAIN: 1})
+        self.assertEqual(1, self._history().estimate(DOMAIN, 100))
+
+    def test_concurrent_writers_merged(self):
+        first, second = self._history(), self._history()
+        self.assertIsNone(first.estimate(DOMAIN, 95))
+        self.assertIsNone(second.estimate(DOMAIN, 95))
+        for seconds in [1, 2, 3]:
+            first.record({DOMAIN: seconds})
+        for seconds in [4, 5]:
+            second.record({DOMAIN: seconds})
+        self.assertEqual(5, self._history().estimate(DOMAIN, 100))
+        self.assertEqual(1, self._history().estimate(DOMAIN, 0))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
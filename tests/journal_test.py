@@ -0,0 +1,58 @@
+"""Tests for certbot_dns_joker.journal."""
+
+import types
+import unittest
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+def _client(username='user', domain=DOMAIN):
+    return types.SimpleNamespace(endpoint='mock://endpoint', username=username, domain=domain)
+
+
+class JournalTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(JournalTest, self).setUp()
+        from certbot_dns_joker.journal import Journal
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'journal.jsonl')
+        self.journal = Journal(self.path, clock=lambda: 1000)
+
+    def test_outstanding(self):
+        self.journal.publish(_client(), '_acme-challenge', 'a')
+        self.journal.publish(_client(), '_acme-challenge.www', 'b')
+        self.journal.publish(_client('other'), '_acme-challenge', 'c')
+        self.journal.remove(_client(), '_acme-challenge')
+        self.assertEqual([('other', '_acme-challenge', 'c'), ('user', '_acme-challenge.www', 'b')],
+                         sorted((e.username, e.label, e.value)
+                                for e in self.journal.outstanding()))
+
+    def test_compact(self):
+        self.journal.publish(_client(), '_acme-challenge', 'a')
+        self.journal.remove(_client(), '_acme-challenge')
+        self.journal.publish(_client(), '_acme-challenge.www', 'b')
+        with open(self.path, 'a') as f:
+            f.write('not json\n')
+        self.assertEqual(1, len(self.journal.compact()))
+        with open(self.path) as f:
+            self.assertEqual(1, len(f.readlines()))
+        self.assertEqual([('_acme-challenge.www', 'b', 1000)],
+                         [(e.label, e.value, e.time) for e in self.journal.outstanding()])
+
+    def test_torn_line_skipped(self):
+        self.journal.publish(_client(), '_acme-challenge', 'a')
+        with open(self.path, 'a') as f:
+            f.write('{"event": "publish", "endpo')
+        self.journal.publish(_client(), '_acme-challenge.www', 'b')
+        self.assertEqual(['_acme-challenge', '_acme-challenge.www'],
+                         sorted(e.label for e in self.journal.outstanding()))
+
+    def test_empty(self):
+        self.assertEqual([], self.journal.outstanding())
+        self.assertEqual([], self.journal.compact())
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,109 @@
+"""Tests for certbot_dns_joker.metrics."""
+
+import json
+import unittest
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+class MetricsTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(MetricsTest, self).setUp()
+        from certbot_dns_joker.dns_joker import _JokerClient
+        from certbot_dns_joker.metrics import Metrics
+        self.metrics = Metrics(_JokerClient.error)
+        self.metrics.api_call(DOMAIN, '_acme-challenge', 1, 0.07, 503, 'Service Unavailable')
+        self.metrics.api_call(DOMAIN, '_acme-challenge', 2, 0.2, 400, 'dnserr')
+        self.metrics.api_call(DOMAIN, '_acme-challenge', 3, 0.04, 200, 'good')
+        self.metrics.propagation_wait(12.5, True)
+        self.metrics.propagation_wait(120, False)
+
+    def test_as_dict(self):
+        data = self.metrics.as_dict()
+        self.assertEqual({'other': 1, 'dnserr': 1, 'good': 1}, data['api_results'])
+        self.assertEqual({'503': 1, '400': 1, '200': 1}, data['api_statuses'])
+        self.assertEqual(2, data['api_retries'])
+        self.assertEqual(1, data['api_request_seconds']['buckets']['0.05'])
+        self.assertEqual(2, data['api_request_seconds']['buckets']['0.1'])
+        self.assertEqual(3, data['api_request_seconds']['count'])
+        self.assertEqual(2, data['propagation_wait_seconds']['count'])
+        self.assertEqual(1, data['propagation_incomplete'])
+
+    def test_prometheus(self):
+        text = self.metrics.prometheus()
+        self.assertIn('certbot_dns_joker_api_request_seconds_bucket{le="0.25"} 3\n', text)
+        self.assertIn('certbot_dns_joker_api_request_seconds_count 3\n', text)
+        self.assertIn('certbot_dns_joker_api_results_total{result="dnserr"} 1\n', text)
+        self.assertIn('certbot_dns_joker_api_retries_total 2\n', text)
+        self.assertIn('certbot_dns_joker_propagation_wait_seconds_bucket{le="30"} 1\n', text)
+
+    def test_write(self):
+        json_path = os.path.join(self.tempdir, 'metrics.json')
+        prom_path = os.path.join(self.tempdir, 'metrics.prom')
+        self.metrics.write(json_path)
+        self.metrics.write(prom_path)
+        with open(json_path) as f:
+            self.assertEqual(self.metrics.as_dict(), json.load(f))
+        with open(prom_path) as f:
+            self.assertEqual(self.metrics.prometheus(), f.read())
+
+    def test_flush(self):
+        path = os.path.join(self.tempdir, 'metrics.json')
+        self.metrics.flush()
+        self.assertFalse(os.path.exists(path))
+        self.metrics.path = path
+        self.metrics.flush()
+        self.assertTrue(os.path.exists(path))
+
+
+class HooksTest(unittest.TestCase):
+
+    def test_combine(self):
+        from certbot_dns_joker import metrics
+        self.assertEqual(metrics.Hook, type(metrics.combine([])))
+        hook = mock.MagicMock()
+        self.assertIs(hook, metrics.combine([hook]))
+
+        hooks = [mock.MagicMock(), mock.MagicMock()]
+        combined = metrics.combine(hooks)
+        combined.api_call(DOMAIN, '_acme-challenge', 1, 0.1, 200, 'good', sent=10, received=4)
+        combined.propagation_wait(5, None)
+        combined.flush()
+        for hook in hooks:
+            self.assertEqual([
+                mock.call.api_call(DOMAIN, '_acme-challenge', 1, 0.1, 200, 'good',
+                                   sent=10, received=4),
+                mock.call.propagation_wait(5, None),
+                mock.call.flush(),
+            ], hook.mock_calls)
+
+
+class CorrelateTest(unittest.TestCase):
+
+    def test_nested(self):
+        from certbot_dns_joker import metrics
+        self.assertEqual((None, ()), metrics.correlation())
+        with metrics.correlate('perform', ['a']):
+            with metrics.correlate('cleanup', ['b', 'c']):
+                self.assertEqual(('cleanup', ('b', 'c')), metrics.correlation())
+            self.assertEqual(('perform', ('a',)), metrics.correlation())
+        self.assertEqual((None, ()), metrics.correlation())
+
+    def test_correlation_id(self):
+        from certbot_dns_joker import metrics
+        self.assertEqual(metrics.correlation_id('_acme-challenge.' + DOMAIN, 'a'),
+                         metrics.correlation_id('_acme-challenge.' + DOMAIN, 'a'))
+        self.assertNotEqual(metrics.correlation_id('_acme-challenge.' + DOMAIN, 'a'),
+                            metrics.correlation_id('_acme-challenge.' + DOMAIN, 'b'))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
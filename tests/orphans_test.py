@@ -0,0 +1,104 @@
+"""Tests for certbot_dns_joker.orphans."""
+
+import types
+import unittest
+import urllib.parse
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+import requests_mock
+
+from certbot.compat import os
+from certbot.plugins import dns_test_common
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+ENDPOINT = 'mock://endpoint'
+
+
+def _client(username, domain=DOMAIN):
+    return types.SimpleNamespace(endpoint=ENDPOINT, username=username, domain=domain)
+
+
+class OrphanCleanerTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(OrphanCleanerTest, self).setUp()
+        from certbot_dns_joker.journal import Journal
+        self.credentials = os.path.join(self.tempdir, 'joker.ini')
+        dns_test_common.write({'dns_joker_username': 'user', 'dns_joker_password': 'pass'},
+                              self.credentials)
+        self.now = 10000
+        self.journal = Journal(os.path.join(self.tempdir, 'dns-joker', 'journal.jsonl'),
+                               clock=lambda: self.now)
+        self.journal.publish(_client('user'), '_acme-challenge', 'a')
+        self.journal.publish(_client('user'), '_acme-challenge.www', 'b')
+        self.journal.publish(_client('user'), '_acme-challenge.done', 'c')
+        self.journal.remove(_client('user'), '_acme-challenge.done')
+        self.journal.publish(_client('stranger'), '_acme-challenge', 'd')
+        self.now += 3600
+
+        self.mocker = requests_mock.Mocker()
+        self.mocker.start()
+        self.addCleanup(self.mocker.stop)
+
+    def _cleaner(self, min_age=3600):
+        from certbot_dns_joker.dns_joker import RetryPolicy
+        from certbot_dns_joker.orphans import OrphanCleaner
+        return OrphanCleaner(self.tempdir, self.credentials, concurrency=2,
+                             retry=RetryPolicy(attempts=1), min_age=min_age,
+                             clock=lambda: self.now)
+
+    def _posted(self):
+        return sorted((data['label'][0], data['value'][0]) for data in
+                      [urllib.parse.parse_qs(r.text, keep_blank_values=True)
+                       for r in self.mocker.request_history])
+
+    def test_run(self):
+        self.mocker.post(ENDPOINT, text='good')
+        removed, failed, skipped = self._cleaner().run()
+        self.assertEqual([('_acme-challenge', ''), ('_acme-challenge.www', '')], self._posted())
+        self.assertEqual((2, 0), (len(removed), len(failed)))
+        self.assertEqual(['stranger'], [e.username for e in skipped])
+        self.assertEqual(['stranger'], [e.username for e in self.journal.outstanding()])
+
+    def test_run_keeps_recent_records(self):
+        self.now -= 1
+        self.journal.publish(_client('user'), '_acme-challenge.new', 'e')
+        self.now += 1
+        self.mocker.post(ENDPOINT, text='good')
+        removed, _, skipped = self._cleaner().run()
+        self.assertEqual(2, len(removed))
+        self.assertEqual(['_acme-challenge', '_acme-challenge.new'],
+                         sorted(e.label for e in skipped))
+        self.assertEqual(1, len(self._cleaner(min_age=0).run()[0]))
+
+    def test_run_ignores_record_state(self):
+        from certbot_dns_joker.state import RecordState
+        RecordState(os.path.join(self.tempdir, 'dns-joker', 'records.json'), 86400).set(
+            (ENDPOINT, 'user', DOMAIN), '_acme-challenge', '')
+        self.mocker.post(ENDPOINT, text='good')
+        self.assertIsNone(self._cleaner().state)
+        self._cleaner().run()
+        self.assertEqual([('_acme-challenge', ''), ('_acme-challenge.www', '')], self._posted())
+
+    def test_run_failure(self):
+        self.mocker.post(ENDPOINT, text='badauth', status_code=400)
+        removed, failed, _ = self._cleaner().run()
+        self.assertEqual((0, 2), (len(removed), len(failed)))
+        self.assertEqual(3, len(self.journal.outstanding()))
+
+    def test_main_dry_run(self):
+        from certbot_dns_joker.orphans import main
+        with mock.patch('sys.stdout') as stdout:
+            self.assertEqual(0, main(['--credentials', self.credentials,
+                                      '--work-dir', self.tempdir, '--dry-run']))
+        self.assertIn('Would remove 2 orphaned',
+                      ''.join(c[0][0] for c in stdout.write.call_args_list))
+        self.assertEqual([], self.mocker.request_history)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,171 @@
+"""Tests for certbot_dns_joker.propagation."""
+
+import socket
+import threading
+import time
+import unittest
+
+import dns.message
+import dns.rrset
+
+from certbot.plugins.dns_test_common import DOMAIN
+
+RECORD_NAME = '_acme-challenge.' + DOMAIN
+
+
+class StubDNSServer(object):
+    """A UDP DNS server on localhost that answers TXT queries from `records`."""
+
+    def __init__(self, silent=False):
+        self.records = {}
+        self.queries = 0
+        self.names = []
+        self.silent = silent
+        self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.sock.bind(('127.0.0.1', 0))
+        self.sock.settimeout(0.1)
+        self.address = '127.0.0.1:{0}'.format(self.sock.getsockname()[1])
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._serve, daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        self.sock.close()
+
+    def _serve(self):
+        while not self._stop.is_set():
+            try:
+                wire, peer = self.sock.recvfrom(512)
+            except socket.timeout:
+                continue
+            self.queries += 1
+            query = dns.message.from_wire(wire)
+            response = dns.message.make_response(query)
+            name = query.question[0].name.to_text(omit_final_dot=True)
+            self.names.append(name)
+            if self.silent:
+                continue
+            values = self.records.get(name)
+            if values:
+                response.answer.append(dns.rrset.from_text_list(
+                    name + '.', 60, 'IN', 'TXT', ['"{0}"'.format(v) for v in values]))
+            self.sock.sendto(response.to_wire(), peer)
+
+
+class PropagationCheckerTest(unittest.TestCase):
+
+    def setUp(self):
+        self.server = StubDNSServer()
+        self.addCleanup(self.server.close)
+        self.sleeps = []
+
+    def _checker(self, **kwargs):
+        from certbot_dns_joker.propagation import PropagationChecker
+        return PropagationChecker(nameservers=[self.server.address], interval=1,
+                                  query_timeout=1, sleep=self.sleeps.append, **kwargs)
+
+    def test_visible_immediately(self):
+        self.server.records[RECORD_NAME] = ['a', 'b']
+        checker = self._checker()
+        self.assertTrue(checker.wait({(DOMAIN, RECORD_NAME): {'a', 'b'}}, 10))
+        self.assertEqual([], self.sleeps)
+
+    def test_visible_after_polling(self):
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            self.server.records[RECORD_NAME] = ['a']
+        checker = self._checker()
+        checker._sleep = sleep  # pylint: disable=protected-access
+        self.assertTrue(checker.wait({(DOMAIN, RECORD_NAME): {'a'}}, 10))
+        self.assertEqual([1], self.sleeps)
+        self.assertEqual([DOMAIN], list(checker.visible_after))
+
+    def test_timeout(self):
+        now = [0]
+        def sleep(seconds):
+            now[0] += seconds
+        checker = self._checker(clock=lambda: now[0])
+        checker._sleep = sleep  # pylint: disable=protected-access
+        self.server.records[RECORD_NAME] = ['stale']
+        self.assertFalse(checker.wait({(DOMAIN, RECORD_NAME): {'a'}}, 3))
+        self.assertEqual(3, now[0])
+
+    def test_query_all(self):
+        lagging = StubDNSServer()
+        self.addCleanup(lagging.close)
+        silent = StubDNSServer(silent=True)
+        self.addCleanup(silent.close)
+        names = ['_acme-challenge.host{0}.{1}'.format(i, DOMAIN) for i in range(500)]
+        for name in names:
+            self.server.records[name] = ['a']
+        lagging.records[names[0]] = ['stale']
+        from certbot_dns_joker.propagation import parse_server
+        servers = [parse_server(s.address) for s in (self.server, lagging, silent)]
+        checker = self._checker()
+
+        start = time.monotonic()
+        answers = checker.query_all({(server, name) for server in servers for name in names})
+        # Unanswered queries cost one query timeout, not one each.
+        self.assertLess(time.monotonic() - start, 2.5)
+        self.assertEqual(1500, len(answers))
+        # No reply is lost, however many names there are.
+        self.assertEqual([{'a'}] * 500, [answers[(servers[0], name)] for name in names])
+        self.assertEqual({'stale'}, answers[(servers[1], names[0])])
+        self.assertEqual(set(), answers[(servers[1], names[1])])
+        self.assertEqual(set(), answers[(servers[2], names[0])])
+        # A server that doesn't answer isn't asked more than one window's worth.
+        self.assertEqual(checker.max_in_flight, silent.queries)
+
+    def _lagging_secondary(self, policy):
+        lagging = StubDNSServer()
+        self.addCleanup(lagging.close)
+        third = StubDNSServer()
+        self.addCleanup(third.close)
+        self.server.records[RECORD_NAME] = ['a']
+        third.records[RECORD_NAME] = ['a']
+        lagging.records[RECORD_NAME] = ['stale']
+        now = [0]
+        def sleep(seconds):
+            self.sleeps.append(seconds)
+            now[0] += seconds
+        from certbot_dns_joker.propagation import PropagationChecker
+        checker = PropagationChecker(
+            nameservers=[self.server.address, lagging.address, third.address], interval=1,
+            query_timeout=1, policy=policy, clock=lambda: now[0], sleep=sleep)
+        return checker, lagging
+
+    def test_all_waits_for_lagging_secondary(self):
+        checker, lagging = self._lagging_secondary('all')
+        self.assertFalse(checker.wait({(DOMAIN, RECORD_NAME): {'a'}}, 3))
+        # Polled at 0, 1, 2 and 3 seconds.
+        self.assertEqual(4, lagging.queries)
+
+    def test_quorum_ignores_lagging_secondary(self):
+        checker, _ = self._lagging_secondary('quorum')
+        self.assertTrue(checker.wait({(DOMAIN, RECORD_NAME): {'a'}}, 3))
+        self.assertEqual([], self.sleeps)
+
+    def test_one_query_per_server_and_name_per_round(self):
+        self.server.records[RECORD_NAME] = ['a', 'b']
+        checker = self._checker()
+        self.assertTrue(checker.wait({(DOMAIN, RECORD_NAME): {'a', 'b'},
+                                      ('other.' + DOMAIN, RECORD_NAME): {'a'}}, 10))
+        self.assertEqual([RECORD_NAME], self.server.names)
+
+    def test_unknown_policy(self):
+        from certbot_dns_joker.propagation import PropagationChecker
+        with self.assertRaises(ValueError):
+            PropagationChecker(policy='most')
+
+    def test_parse_server(self):
+        from certbot_dns_joker.propagation import parse_server
+        self.assertEqual(('192.0.2.1', 53), parse_server('192.0.2.1'))
+        self.assertEqual(('192.0.2.1', 5353), parse_server('192.0.2.1:5353'))
+        self.assertEqual(('2001:db8::1', 53), parse_server('2001:db8::1'))
+        self.assertEqual(('2001:db8::1', 5353), parse_server('[2001:db8::1]:5353'))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
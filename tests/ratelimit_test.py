@@ -0,0 +1,58 @@
+"""Tests for certbot_dns_joker.ratelimit."""
+
+import unittest
+
+from certbot.compat import filesystem
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+class RateLimiterTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(RateLimiterTest, self).setUp()
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'ratelimit.json')
+        self.now = 1000.0
+        self.sleeps = []
+
+    def _sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+    def _limiter(self, limits):
+        from certbot_dns_joker.ratelimit import RateLimiter
+        return RateLimiter(self.path, limits, clock=lambda: self.now, sleep=self._sleep)
+
+    def test_burst_then_rate_shared_between_limiters(self):
+        # Two limiters on one file stand in for two certbot processes.
+        first = self._limiter({'account': (2, 2)})
+        second = self._limiter({'account': (2, 2)})
+        buckets = [('account', 'user'), ('zone', DOMAIN)]
+        first.acquire(buckets)
+        second.acquire(buckets)
+        self.assertEqual([], self.sleeps)
+        first.acquire(buckets)
+        second.acquire(buckets)
+        self.assertEqual([0.5, 0.5], self.sleeps)
+
+    def test_zone_limit_is_per_zone(self):
+        limiter = self._limiter({'account': (0, 1), 'zone': (1, 1)})
+        limiter.acquire([('account', 'user'), ('zone', DOMAIN)])
+        limiter.acquire([('account', 'user'), ('zone', 'example.org')])
+        self.assertEqual([], self.sleeps)
+        limiter.acquire([('account', 'user'), ('zone', DOMAIN)])
+        self.assertEqual([1.0], self.sleeps)
+        self.assertEqual(1.0, limiter.waited)
+
+    def test_unreadable_state_is_reset(self):
+        filesystem.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('not json')
+        limiter = self._limiter({'account': (1, 1)})
+        limiter.acquire([('account', 'user')])
+        self.assertEqual([], self.sleeps)
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,61 @@
+"""Tests for certbot_dns_joker.registry."""
+
+import unittest
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+
+from certbot.compat import os
+from certbot.tests import util as test_util
+
+
+class RegistryTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(RegistryTest, self).setUp()
+        from certbot_dns_joker.registry import Registry
+        self.registry = Registry()
+        self.path = os.path.join(self.tempdir, 'joker.ini')
+        self._write('dns_joker_username = user\n')
+
+    def _write(self, text):
+        with open(self.path, 'w') as f:
+            f.write(text)
+
+    def test_credentials(self):
+        self.assertIsNone(self.registry.credentials(self.path, 'dns-joker'))
+        self.registry.remember_credentials(self.path, 'dns-joker', 'parsed')
+        self.assertEqual('parsed', self.registry.credentials(self.path, 'dns-joker'))
+        self.assertIsNone(self.registry.credentials(self.path, 'joker'))
+
+    def test_change_invalidates(self):
+        transport = mock.MagicMock()
+        self.registry.remember_credentials(self.path, 'dns-joker', 'parsed')
+        self.assertIs(transport, self.registry.transport(self.path, 'key', lambda: transport))
+        self.assertIs(transport, self.registry.transport(self.path, 'key', mock.MagicMock))
+
+        self._write('dns_joker_username = someone else\n')
+        self.assertIsNone(self.registry.credentials(self.path, 'dns-joker'))
+        transport.close.assert_called_once_with()
+        self.assertIsNot(transport, self.registry.transport(self.path, 'key', mock.MagicMock))
+
+    def test_metrics(self):
+        metrics = mock.MagicMock()
+        self.assertIs(metrics, self.registry.metrics(self.path, lambda: metrics))
+        self.assertIs(metrics, self.registry.metrics(self.path, mock.MagicMock))
+        self.registry.close()
+        self.assertIsNot(metrics, self.registry.metrics(self.path, mock.MagicMock))
+
+    def test_close(self):
+        transport = mock.MagicMock()
+        self.registry.transport(self.path, 'key', lambda: transport)
+        self.registry.remember_credentials(self.path, 'dns-joker', 'parsed')
+        self.registry.close()
+        transport.close.assert_called_once_with()
+        self.assertIsNone(self.registry.credentials(self.path, 'dns-joker'))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,60 @@
+"""Tests for certbot_dns_joker.simulate."""
+
+import json
+import unittest
+from unittest import mock
+
+from certbot.compat import os
+from certbot.tests import util as test_util
+
+
+class SimulationTest(unittest.TestCase):
+
+    def test_run(self):
+        from certbot_dns_joker.fake import FakeJoker
+        from certbot_dns_joker.simulate import Simulation
+        joker = FakeJoker(latency=0.01)
+        report = Simulation(joker, certificates=6, zones=2, names=2, batch_size=4,
+                            options={'concurrency': 3, 'propagation_seconds': 10}).run()
+        self.assertEqual((2, 0), (report['batches'], report['failed_batches']))
+        # One write and one cleanup per name.
+        self.assertEqual(24, report['api_calls'])
+        self.assertEqual({'good': 24}, report['api_results'])
+        self.assertEqual(20, report['propagation_seconds'])
+        self.assertAlmostEqual(report['api_seconds'] + 20, report['projected_seconds'])
+        self.assertTrue(1 < report['peak_concurrency'] <= 3)
+        self.assertEqual({}, joker.records)
+
+    def test_run_stops_server_on_error(self):
+        from certbot_dns_joker.fake import FakeJoker
+        from certbot_dns_joker.fake import FakeJokerServer
+        from certbot_dns_joker.simulate import Simulation
+        simulation = Simulation(FakeJoker(latency=0), certificates=1, zones=1, names=1, http=True)
+        with mock.patch.object(FakeJokerServer, 'stop', autospec=True,
+                               side_effect=FakeJokerServer.stop) as stop:
+            with mock.patch.object(Simulation, '_config', side_effect=RuntimeError):
+                self.assertRaises(RuntimeError, simulation.run)
+        self.assertEqual(1, stop.call_count)
+
+    def test_plugin_defaults(self):
+        from certbot_dns_joker.simulate import plugin_defaults
+        defaults = plugin_defaults()
+        self.assertEqual(120, defaults['dns_joker_propagation_seconds'])
+        self.assertEqual(4, defaults['dns_joker_concurrency'])
+
+
+class MainTest(test_util.TempDirTestCase):
+
+    def test_main(self):
+        from certbot_dns_joker.simulate import main
+        output = os.path.join(self.tempdir, 'report.json')
+        self.assertEqual(0, main(['--certificates', '2', '--zones', '1', '--latency', '0',
+                                  '--jitter', '0', '--http', '--output', output]))
+        with open(output) as f:
+            report = json.load(f)
+        self.assertEqual(8, report['api_calls'])
+        self.assertEqual(2, report['parameters']['certificates'])
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
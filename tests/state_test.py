@@ -0,0 +1,67 @@
+"""Tests for certbot_dns_joker.state."""
+
+import unittest
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+KEY = ('https://svc.joker.com/nic/replace', 'user', DOMAIN)
+
+
+class RecordStateTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(RecordStateTest, self).setUp()
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'records.json')
+        self.now = 1000
+
+    def _state(self, max_age=60):
+        from certbot_dns_joker.state import RecordState
+        return RecordState(self.path, max_age, clock=lambda: self.now)
+
+    def test_persisted(self):
+        state = self._state()
+        self.assertIsNone(state.get(KEY, '_acme-challenge'))
+        state.set(KEY, '_acme-challenge', 'token')
+        state.set(KEY, '_acme-challenge.www', '')
+        reloaded = self._state()
+        self.assertEqual('token', reloaded.get(KEY, '_acme-challenge'))
+        self.assertEqual('', reloaded.get(KEY, '_acme-challenge.www'))
+
+    def test_forget(self):
+        state = self._state()
+        state.set(KEY, '_acme-challenge', 'token')
+        state.forget(KEY, '_acme-challenge')
+        self.assertIsNone(self._state().get(KEY, '_acme-challenge'))
+
+    def test_stale_entries_dropped(self):
+        self._state().set(KEY, '_acme-challenge', 'old')
+        self.now += 30
+        self._state().set(KEY, '_acme-challenge.www', 'new')
+        self.now += 31
+        state = self._state()
+        self.assertIsNone(state.get(KEY, '_acme-challenge'))
+        self.assertEqual('new', state.get(KEY, '_acme-challenge.www'))
+
+    def test_keyed_by_account(self):
+        state = self._state()
+        state.set(KEY, '_acme-challenge', 'token')
+        for other in (('http://localhost:8080/nic/replace',) + KEY[1:],
+                      KEY[:1] + ('other',) + KEY[2:]):
+            self.assertIsNone(state.get(other, '_acme-challenge'))
+
+    def test_concurrent_writers_merged(self):
+        first, second = self._state(), self._state()
+        self.assertIsNone(first.get(KEY, '_acme-challenge'))
+        self.assertIsNone(second.get(KEY, '_acme-challenge.www'))
+        first.set(KEY, '_acme-challenge', 'one')
+        second.set(KEY, '_acme-challenge.www', 'two')
+        first.forget(KEY, '_acme-challenge.mail')
+        for state in (first, second, self._state()):
+            self.assertEqual('one', state.get(KEY, '_acme-challenge'))
+            self.assertEqual('two', state.get(KEY, '_acme-challenge.www'))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,59 @@
+"""Tests for certbot_dns_joker.storage."""
+
+import json
+import unittest
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+
+from certbot.compat import os
+from certbot.tests import util as test_util
+
+
+class LockedJSONTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(LockedJSONTest, self).setUp()
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'state.json')
+
+    def _read(self):
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_round_trip(self):
+        from certbot_dns_joker.storage import LockedJSON
+        with LockedJSON(self.path) as data:
+            data['a'] = 1
+        with LockedJSON(self.path) as data:
+            self.assertEqual({'a': 1}, dict(data))
+            data['b'] = 2
+        self.assertEqual({'a': 1, 'b': 2}, self._read())
+        self.assertTrue(os.path.exists(self.path + '.lock'))
+
+    def test_not_written_on_error(self):
+        from certbot_dns_joker.storage import LockedJSON
+        with LockedJSON(self.path) as data:
+            data['a'] = 1
+        with self.assertRaises(ValueError):
+            with LockedJSON(self.path) as data:
+                data['a'] = 2
+                raise ValueError
+        self.assertEqual({'a': 1}, self._read())
+
+    def test_interrupted_write_keeps_old_contents(self):
+        from certbot_dns_joker.storage import LockedJSON
+        with LockedJSON(self.path) as data:
+            data['a'] = 1
+        with mock.patch('certbot_dns_joker.storage.os.replace', side_effect=OSError):
+            with self.assertRaises(OSError):
+                with LockedJSON(self.path) as data:
+                    data['a'] = 2
+        self.assertEqual({'a': 1}, self._read())
+        self.assertEqual(['state.json', 'state.json.lock'],
+                         sorted(os.listdir(os.path.dirname(self.path))))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
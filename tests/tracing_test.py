@@ -0,0 +1,69 @@
+"""Tests for certbot_dns_joker.tracing."""
+
+import json
+import unittest
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+
+class TracerTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(TracerTest, self).setUp()
+        from certbot_dns_joker.tracing import Tracer
+        self.path = os.path.join(self.tempdir, 'trace', 'trace.jsonl')
+        self.tracer = Tracer(self.path, buffer_size=3, clock=lambda: 1000)
+
+    def _events(self):
+        if not os.path.exists(self.path):
+            return []
+        with open(self.path) as f:
+            return [json.loads(line) for line in f]
+
+    def test_events(self):
+        from certbot_dns_joker import metrics
+        ids = [metrics.correlation_id('_acme-challenge.' + DOMAIN, 'a')]
+        with metrics.correlate('perform', ids):
+            self.tracer.api_call(DOMAIN, '_acme-challenge', 1, 0.25, 200, 'good',
+                                 sent=120, received=4)
+        self.tracer.propagation_wait(12.5, True)
+        self.tracer.flush()
+        self.assertEqual([
+            {'event': 'api_call', 'phase': 'perform', 'correlation_ids': ids, 'time': 1000,
+             'pid': os.getpid(), 'zone': DOMAIN, 'label': '_acme-challenge', 'attempt': 1,
+             'seconds': 0.25, 'status': 200, 'result': 'good', 'bytes_sent': 120,
+             'bytes_received': 4},
+            {'event': 'propagation_wait', 'phase': None, 'correlation_ids': [], 'time': 1000,
+             'pid': os.getpid(), 'seconds': 12.5, 'verified': True},
+        ], self._events())
+
+    def test_buffered(self):
+        for attempt in (1, 2):
+            self.tracer.api_call(DOMAIN, '_acme-challenge', attempt, 0.1, 503, 'other')
+        self.assertEqual([], self._events())
+        self.tracer.api_call(DOMAIN, '_acme-challenge', 3, 0.1, 200, 'good')
+        self.assertEqual([1, 2, 3], [e['attempt'] for e in self._events()])
+        self.tracer.flush()
+        self.assertEqual(3, len(self._events()))
+
+    def test_sampled_by_challenge(self):
+        from certbot_dns_joker import metrics
+        self.tracer.sample_rate = 0.5
+        ids = [metrics.correlation_id('_acme-challenge.' + DOMAIN, str(i)) for i in range(200)]
+        for i in ids:
+            with metrics.correlate('perform', [i]):
+                self.tracer.api_call(DOMAIN, '_acme-challenge', 1, 0.1, 200, 'good')
+            with metrics.correlate('cleanup', [i]):
+                self.tracer.api_call(DOMAIN, '_acme-challenge', 1, 0.1, 200, 'good')
+        self.tracer.flush()
+        events = self._events()
+        traced = {e['correlation_ids'][0] for e in events}
+        self.assertTrue(60 < len(traced) < 140)
+        # Each traced challenge is traced in every phase.
+        self.assertEqual(2 * len(traced), len(events))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
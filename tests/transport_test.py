@@ -0,0 +1,118 @@
+"""Tests for certbot_dns_joker.transport."""
+
+import socket
+import sys
+import threading
+import unittest
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+
+try:
+    import h2
+    import httpx
+except ImportError:  # pragma: no cover
+    h2 = httpx = None
+
+
+class HTTPTransportTest(unittest.TestCase):
+
+    def test_connection_error(self):
+        from certbot_dns_joker.transport import HTTPTransport, TransportError
+        # Nothing listens on a port that was just closed.
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        transport = HTTPTransport('http://127.0.0.1:{0}/nic/replace'.format(port))
+        with self.assertRaises(TransportError):
+            transport.post({'zone': 'example.com'}, timeout=1)
+        transport.close()
+
+
+@unittest.skipIf(httpx is None or h2 is None, 'httpx and h2 are not installed')
+class HTTP2TransportTest(unittest.TestCase):
+
+    def test_multiplexed(self):
+        from certbot_dns_joker.fake import FakeJokerH2Server
+        from certbot_dns_joker.transport import HTTP2Transport
+        server = FakeJokerH2Server(latency=0.1).start()
+        self.addCleanup(server.stop)
+        transport = HTTP2Transport(server.endpoint, prior_knowledge=True)
+        self.addCleanup(transport.close)
+        results = []
+
+        def post(i):
+            results.append(transport.post({'zone': 'example.com', 'label': 'l{0}'.format(i),
+                                           'value': 'v', 'ttl': 60}, timeout=5))
+        threads = [threading.Thread(target=post, args=(i,)) for i in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([(200, 'good')] * 8, results)
+        self.assertEqual({'HTTP/2': 8}, transport.http_versions)
+        self.assertEqual((1, 7), transport.connection_stats())
+        self.assertEqual(1, server.connections)
+        self.assertGreater(server.joker.peak_concurrency, 1)
+
+    def test_http1_fallback(self):
+        from certbot_dns_joker.fake import FakeJokerServer
+        from certbot_dns_joker.transport import HTTP2Transport
+        server = FakeJokerServer().start()
+        self.addCleanup(server.stop)
+        transport = HTTP2Transport(server.endpoint)
+        self.addCleanup(transport.close)
+        self.assertEqual((200, 'good'), transport.post({'zone': 'example.com'}, timeout=5))
+        self.assertEqual({'HTTP/1.1': 1}, transport.http_versions)
+
+    def test_connection_error(self):
+        from certbot_dns_joker.transport import HTTP2Transport, TransportError
+        sock = socket.socket()
+        sock.bind(('127.0.0.1', 0))
+        port = sock.getsockname()[1]
+        sock.close()
+        transport = HTTP2Transport('http://127.0.0.1:{0}/nic/replace'.format(port))
+        with self.assertRaises(TransportError):
+            transport.post({'zone': 'example.com'}, timeout=1)
+        transport.close()
+
+
+class ForEndpointTest(unittest.TestCase):
+
+    def test_http1_by_default(self):
+        from certbot_dns_joker.transport import HTTPTransport, for_endpoint
+        self.assertIsInstance(for_endpoint('http://127.0.0.1/nic/replace'), HTTPTransport)
+
+    def test_http2_needs_extra(self):
+        from certbot_dns_joker.transport import HTTPTransport, for_endpoint
+        with mock.patch.dict(sys.modules, {'httpx': None}):
+            self.assertIsInstance(for_endpoint('http://127.0.0.1/nic/replace', http2=True),
+                                  HTTPTransport)
+
+    @unittest.skipIf(httpx is None or h2 is None, 'httpx and h2 are not installed')
+    def test_http2(self):
+        from certbot_dns_joker.transport import HTTP2Transport, for_endpoint
+        transport = for_endpoint('http://127.0.0.1/nic/replace', http2=True)
+        self.assertIsInstance(transport, HTTP2Transport)
+        transport.close()
+
+
+class MemoryTransportTest(unittest.TestCase):
+
+    def test_post(self):
+        from certbot_dns_joker.fake import FakeJoker
+        from certbot_dns_joker.transport import MemoryTransport
+        joker = FakeJoker()
+        transport = MemoryTransport(joker)
+        self.assertEqual((200, 'good'), transport.post(
+            {'zone': 'example.com', 'label': '_acme-challenge', 'value': 'a', 'ttl': 60}))
+        self.assertEqual(['a'], joker.txt('_acme-challenge.example.com'))
+        self.assertEqual((0, 0), transport.connection_stats())
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover
@@ -0,0 +1,98 @@
+"""Tests for certbot_dns_joker.zones."""
+
+import unittest
+
+try:
+    import mock
+except ImportError: # pragma: no cover
+    from unittest import mock # type: ignore
+import dns.exception
+import dns.name
+import dns.resolver
+
+from certbot.compat import os
+from certbot.plugins.dns_test_common import DOMAIN
+from certbot.tests import util as test_util
+
+RECORD_NAME = '_acme-challenge.sub.' + DOMAIN
+
+
+class ZoneCacheTest(test_util.TempDirTestCase):
+
+    def setUp(self):
+        super(ZoneCacheTest, self).setUp()
+        self.path = os.path.join(self.tempdir, 'dns-joker', 'zones.json')
+        self.lookups = []
+        self.now = 1000
+
+    def _lookup(self, name):
+        self.lookups.append(name)
+        return DOMAIN
+
+    def _cache(self, ttl=60):
+        from certbot_dns_joker.zones import ZoneCache
+        return ZoneCache(self.path, ttl, lookup=self._lookup, clock=lambda: self.now)
+
+    def test_lookup_cached_across_runs(self):
+        self.assertEqual(DOMAIN, self._cache().zone_for(RECORD_NAME))
+        self.assertEqual(DOMAIN, self._cache().zone_for(RECORD_NAME + '.'))
+        self.assertEqual([RECORD_NAME], self.lookups)
+
+    def test_expired_entry_is_looked_up_again(self):
+        self._cache().zone_for(RECORD_NAME)
+        self.now += 61
+        self._cache().zone_for(RECORD_NAME)
+        self.assertEqual([RECORD_NAME, RECORD_NAME], self.lookups)
+
+    def test_failed_lookup_not_cached(self):
+        from certbot_dns_joker.zones import ZoneCache
+        cache = ZoneCache(self.path, 60, lookup=lambda name: None)
+        self.assertIsNone(cache.zone_for(RECORD_NAME))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_concurrent_writers_merged(self):
+        names = ['_acme-challenge.{0}.{1}'.format(host, DOMAIN) for host in ('a', 'b', 'c')]
+        first, second = self._cache(), self._cache()
+        first.zone_for(names[0])
+        second.zone_for(names[1])
+        first.zone_for(names[2])
+        for name in names:
+            self._cache().zone_for(name)
+        self.assertEqual(names, self.lookups)
+
+    def test_negative_entries_expire_sooner(self):
+        from certbot_dns_joker.zones import NameCache
+        lookups = []
+        cache = NameCache(self.path, 60, lambda name: lookups.append(name) or name,
+                          clock=lambda: self.now, negative_ttl=10)
+        cache.get(RECORD_NAME)
+        self.now += 11
+        cache.get(RECORD_NAME)
+        self.assertEqual([RECORD_NAME, RECORD_NAME], lookups)
+
+
+class FollowCnamesTest(unittest.TestCase):
+
+    @mock.patch('dns.resolver.resolve')
+    def test_chain(self, resolve):
+        from certbot_dns_joker.zones import follow_cnames
+        chain = {RECORD_NAME: 'a.challenges.example.net', 'a.challenges.example.net': 'b.example.net'}
+
+        def answer(name, unused_rdtype):
+            if name not in chain:
+                raise dns.resolver.NoAnswer()
+            return [mock.MagicMock(target=dns.name.from_text(chain[name]))]
+        resolve.side_effect = answer
+        self.assertEqual('b.example.net', follow_cnames(RECORD_NAME))
+
+    @mock.patch('dns.resolver.resolve')
+    def test_not_a_cname(self, resolve):
+        from certbot_dns_joker.zones import follow_cnames
+        resolve.side_effect = dns.resolver.NoAnswer()
+        self.assertEqual(RECORD_NAME, follow_cnames(RECORD_NAME))
+        resolve.side_effect = dns.exception.Timeout()
+        self.assertIsNone(follow_cnames(RECORD_NAME))
+
+
+if __name__ == "__main__":
+    unittest.main()  # pragma: no cover